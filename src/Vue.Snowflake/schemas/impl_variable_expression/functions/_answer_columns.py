@@ -0,0 +1,135 @@
+import base64
+import sys
+from array import array
+from typing import Any, List, Optional, Sequence, Union
+
+# Answers arrive as [asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_value]
+ANSWER_WIDTH = 4
+VALUE_INDEX = ANSWER_WIDTH - 1
+# Stands for null in packed answers, so it can't be an answer itself (see _variable_answer_arrays)
+PACKED_NULL = -2**31
+
+
+def compact_column(values: Sequence[Any]) -> Optional[Sequence[Any]]:
+    """
+    Store a column of answer data as compactly as possible.
+    A Python list of ints costs a pointer plus an int object per element, an array is 4 (or 8) bytes per element.
+
+    Returns:
+        None if every value is None, an array('i') or array('q') if all values are ints that fit, otherwise a list
+    """
+    for typecode in ('i', 'q'):
+        try:
+            return array(typecode, values)
+        except OverflowError:
+            continue
+        except TypeError:
+            # Contains None (or something else that isn't an int)
+            break
+    if all(value is None for value in values):
+        return None
+    return list(values)
+
+
+class AnswerColumns:
+    """
+    A respondent's answers for one variable stored as parallel columns rather than a list of 4 element lists.
+    Columns that are None for every answer (i.e. the variable doesn't have that entity) aren't stored at all.
+
+    Examples:
+        >>> columns = AnswerColumns.from_answer_arrays([[1, None, None, 5], [2, None, None, 7]])
+        >>> columns.populated_indices
+        [0, 3]
+        >>> list(columns.column(0)), list(columns.values)
+        ([1, 2], [5, 7])
+    """
+    __slots__ = ('_columns', '_length')
+
+    def __init__(self, columns: List[Optional[Sequence[Any]]], length: int):
+        """
+        Args:
+            columns: ANSWER_WIDTH columns as returned by compact_column, each of the given length (or None)
+            length: Number of answers
+        """
+        self._columns = columns
+        self._length = length
+
+    @classmethod
+    def from_answer_arrays(cls, answers: List[List[Any]]) -> 'AnswerColumns':
+        """Build from answers as deserialized from Snowflake: [[asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_value], ...]"""
+        columns = [compact_column([answer[i] for answer in answers]) for i in range(ANSWER_WIDTH)]
+        return cls(columns, len(answers))
+
+    @classmethod
+    def from_packed(cls, packed: Union[str, bytes]) -> 'AnswerColumns':
+        """
+        Build from answers packed by _variable_answer_arrays (see pack_answer_arrays), base64 text or the raw bytes.
+        Little-endian int32s: a bitmask of the populated columns, then each populated column in turn, PACKED_NULL for null.
+        """
+        data = base64.b64decode(packed) if isinstance(packed, str) else packed
+        ints = array('i')
+        ints.frombytes(data)
+        if sys.byteorder == 'big':
+            ints.byteswap()
+        populated_indices = [i for i in range(ANSWER_WIDTH) if ints[0] >> i & 1]
+        length = (len(ints) - 1) // len(populated_indices) if populated_indices else 0
+        columns = [None] * ANSWER_WIDTH
+        for position, index in enumerate(populated_indices):
+            column = ints[1 + position * length:1 + (position + 1) * length]
+            if PACKED_NULL in column:
+                column = compact_column([None if value == PACKED_NULL else value for value in column])
+            columns[index] = column
+        return cls(columns, length)
+
+    @property
+    def populated_indices(self) -> List[int]:
+        """Indices of columns with any non-None values"""
+        return [i for i, column in enumerate(self._columns) if column is not None]
+
+    def first_answer(self) -> Optional[List[Any]]:
+        """The first answer as [asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_value], None if there are no answers"""
+        if not self._length:
+            return None
+        return [column[0] if column is not None else None for column in self._columns]
+
+    def column(self, index: int) -> Sequence[Any]:
+        column = self._columns[index]
+        return column if column is not None else [None] * self._length
+
+    @property
+    def values(self) -> Sequence[Any]:
+        return self.column(VALUE_INDEX)
+
+    def rows(self, key_indices: List[int]):
+        """Iterate (key_1, ..., key_n, value) tuples for the given key columns, e.g. to build a NestedDict"""
+        return zip(*(self.column(i) for i in key_indices), self.values)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __repr__(self) -> str:
+        return f"AnswerColumns(length={self._length}, populated_indices={self.populated_indices})"
+
+
+def pack_answer_arrays(answers: List[List[Any]]) -> Optional[str]:
+    """
+    The packed form AnswerColumns.from_packed reads, as _variable_answer_arrays builds it in SQL.
+    None if any answer doesn't fit, which _variable_answer_arrays ships as answer arrays instead.
+
+    Examples:
+        >>> list(AnswerColumns.from_packed(pack_answer_arrays([[1, None, None, 5]])).values)
+        [5]
+    """
+    populated_indices = [i for i in range(ANSWER_WIDTH) if any(answer[i] is not None for answer in answers)]
+    ints = array('i', [sum(1 << i for i in populated_indices)])
+    for index in populated_indices:
+        for answer in answers:
+            value = answer[index]
+            if value is None:
+                value = PACKED_NULL
+            elif not isinstance(value, int) or not PACKED_NULL < value <= 2**31 - 1:
+                return None
+            ints.append(value)
+    if sys.byteorder == 'big':
+        ints.byteswap()
+    return base64.b64encode(ints.tobytes()).decode('ascii')
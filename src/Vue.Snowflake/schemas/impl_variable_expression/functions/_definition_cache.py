@@ -0,0 +1,66 @@
+import hashlib
+import json
+from typing import Any, Callable, Dict, Iterator, Sequence, Tuple
+
+from _lru_cache import LruCache
+
+
+def definition_hash(definition) -> str:
+    """Stable hash of a variable definition object, the same for equal definitions however their keys are ordered"""
+    return hashlib.sha256(json.dumps(definition, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class DefinitionCache:
+    """
+    Whatever is parsed from a variable definition (e.g. a wave index), once per distinct definition.
+    Snowflake deserializes the definition afresh for every row, so entries are keyed by a hash of its content,
+    in a bounded LRU cache. Consecutive rows are nearly always the same variable's, so the last definition is
+    compared first: comparing dicts is far cheaper than serializing them to hash.
+
+    Examples:
+        >>> cache = DefinitionCache(max_size=10, parse=lambda definition: len(definition['Groups']))
+        >>> cache.get({'Groups': [1, 2]})
+        2
+        >>> cache.get({'Groups': [1, 2]})  # Equal to the last, not even hashed
+        2
+    """
+
+    def __init__(self, max_size: int, parse: Callable[[Any], Any]):
+        self._parse = parse
+        self._cache = LruCache(max_size)
+        # (definition, parsed), replaced as a whole so it's never half updated
+        self._last = (None, None)
+
+    def get(self, definition):
+        last_definition, parsed = self._last
+        if parsed is not None and definition == last_definition:
+            return parsed
+        parsed = self._cache.get_or_create(definition_hash(definition), lambda: self._parse(definition))
+        self._last = (definition, parsed)
+        return parsed
+
+    def clear(self) -> None:
+        self._last = (None, None)
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return self._cache.stats()
+
+
+def definition_runs(definitions: Sequence, requested_entity_ids: Sequence) -> Iterator[Tuple[int, int, Any, Any]]:
+    """
+    (start, end, definition, requested entity IDs) of each run of consecutive rows of a batch with the same definition
+    and requested entity IDs, i.e. the same variable, so each run can be evaluated in one call.
+    """
+    run_start = 0
+    while run_start < len(definitions):
+        definition = definitions[run_start]
+        requested = requested_entity_ids[run_start]
+        run_end = run_start + 1
+        while (
+            run_end < len(definitions)
+            and definitions[run_end] == definition and requested_entity_ids[run_end] == requested
+        ):
+            run_end += 1
+        yield run_start, run_end, definition, requested
+        run_start = run_end
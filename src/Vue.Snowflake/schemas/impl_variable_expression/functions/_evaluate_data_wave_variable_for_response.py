@@ -0,0 +1,311 @@
+import logging
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+import numpy
+import pandas
+from _definition_cache import DefinitionCache, definition_runs
+
+try:
+    # Only available inside Snowflake's Python runtime
+    from _snowflake import vectorized
+except ImportError:
+    def vectorized(**kwargs):
+        return lambda func: func
+
+logger = logging.getLogger(__name__)
+
+# One per data wave variable being evaluated, each only a few hundred waves
+WAVE_INDEX_CACHE_SIZE = 256
+
+@dataclass
+class DateRangeComponent:
+    """Represents a DateRangeVariableComponent from C#"""
+    MinDate: str
+    MaxDate: str
+
+    @property
+    def min_datetime(self) -> datetime:
+        return datetime.fromisoformat(self.MinDate.replace('Z', '+00:00'))
+
+    @property
+    def max_datetime(self) -> datetime:
+        return datetime.fromisoformat(self.MaxDate.replace('Z', '+00:00'))
+
+@dataclass
+class WaveGroup:
+    """Represents a VariableGrouping from GroupedVariableDefinition"""
+    ToEntityInstanceId: int
+    Component: dict  # Will be converted to DateRangeComponent
+
+    def __post_init__(self):
+        # Auto-convert Component dict to DateRangeComponent
+        if isinstance(self.Component, dict):
+            self.Component = DateRangeComponent(**self.Component)
+
+@dataclass
+class Wave:
+    """Represents a single wave with date range and entity ID, optimized for lookup"""
+    entity_id: int
+    min_timestamp: float
+    max_timestamp: float
+
+    @classmethod
+    def from_group(cls, group: WaveGroup) -> 'Wave':
+        """Create Wave from WaveGroup with timestamp caching"""
+        component = group.Component
+        min_dt = component.min_datetime
+        max_dt = component.max_datetime
+        return cls(
+            entity_id=group.ToEntityInstanceId,
+            min_timestamp=min_dt.timestamp(),
+            max_timestamp=max_dt.timestamp()
+        )
+
+def parse_wave_definition(definition):
+    """
+    Parse GroupedVariableDefinition to extract wave configurations.
+
+    Args:
+        definition: Object with Groups array, each containing:
+            - ToEntityInstanceId: integer wave entity ID
+            - Component: Object with MinDate and MaxDate
+
+    Returns:
+        List of Wave objects sorted by max_date, then min_date
+    """
+    if not definition or 'Groups' not in definition:
+        logger.error(f"Invalid definition: missing Groups. Definition: {definition}")
+        return []
+
+    groups_data = definition['Groups']
+    if not groups_data:
+        return []
+
+    waves = []
+    for group_dict in groups_data:
+        try:
+            # Deserialize directly to dataclass
+            group = WaveGroup(**group_dict)
+            wave = Wave.from_group(group)
+            waves.append(wave)
+
+        except Exception as e:
+            logger.error(f"Failed to parse wave group: {group_dict}")
+            logger.exception(e)
+            continue
+
+    # Sort by max_date (primary), then min_date (secondary) for binary search optimization
+    waves.sort(key=lambda w: (w.max_timestamp, w.min_timestamp))
+
+    return waves
+
+class WaveIndex:
+    """
+    The parsed waves of a definition, with the sorted bounds needed to search them,
+    built once per definition rather than on every row.
+    """
+    __slots__ = ('waves', 'max_timestamps', 'min_timestamp_array', 'max_timestamp_array', 'entity_id_array')
+
+    def __init__(self, waves: List[Wave]):
+        self.waves = waves
+        self.max_timestamps = [w.max_timestamp for w in waves]
+        self.min_timestamp_array = numpy.array([w.min_timestamp for w in waves], dtype=float)
+        self.max_timestamp_array = numpy.array(self.max_timestamps, dtype=float)
+        self.entity_id_array = numpy.array([w.entity_id for w in waves], dtype=object)
+
+    def assign_waves(self, timestamps, requested_wave_ids=None) -> List[List[int]]:
+        """
+        The matching wave entity IDs for each of a batch of timestamps (as seconds since the epoch, NaN for null),
+        the same as find_matching_waves gives for each one.
+        Uses searchsorted for the whole batch, then steps every timestamp along the waves at once,
+        so there's one iteration per overlapping wave rather than per timestamp.
+        """
+        timestamps = numpy.asarray(timestamps, dtype=float)
+        matching_waves = [[] for _ in range(len(timestamps))]
+        if not self.waves:
+            return matching_waves
+
+        # First wave where max_date >= timestamp, as bisect_left in find_matching_waves
+        indexes = numpy.searchsorted(self.max_timestamp_array, timestamps, side='left')
+        # As find_matching_waves, stops at the first wave after that which starts after the timestamp
+        searching = ~numpy.isnan(timestamps) & (indexes < len(self.waves))
+        while searching.any():
+            positions = numpy.flatnonzero(searching)
+            wave_indexes = indexes[positions]
+            # Every wave from the start index ends at or after the timestamp, so it matches if it has started
+            started = self.min_timestamp_array[wave_indexes] <= timestamps[positions]
+            for position, wave_id in zip(positions[started], self.entity_id_array[wave_indexes[started]]):
+                if requested_wave_ids is None or wave_id in requested_wave_ids:
+                    matching_waves[position].append(wave_id)
+            searching[positions[~started]] = False
+            indexes += 1
+            searching &= indexes < len(self.waves)
+        return matching_waves
+
+_wave_index_cache = DefinitionCache(WAVE_INDEX_CACHE_SIZE, lambda definition: WaveIndex(parse_wave_definition(definition)))
+
+def get_wave_index(definition) -> WaveIndex:
+    """The WaveIndex for a definition, parsed once per distinct definition"""
+    return _wave_index_cache.get(definition)
+
+def clear_wave_index_cache():
+    """Forget every parsed definition, e.g. between tests"""
+    _wave_index_cache.clear()
+
+def wave_index_cache_stats():
+    """Hit/miss/eviction counters of the wave index cache, for tuning WAVE_INDEX_CACHE_SIZE"""
+    return _wave_index_cache.stats()
+
+def find_matching_waves(response_timestamp, waves, requested_wave_ids=None, max_timestamps=None):
+    """
+    Find all waves that contain the given timestamp.
+    Uses binary search to find first candidate wave efficiently.
+
+    Args:
+        response_timestamp: Timestamp to check
+        waves: Sorted list of Wave objects
+        requested_wave_ids: Set of wave entity IDs to filter results (or None for all)
+        max_timestamps: The waves' max timestamps, if already extracted (e.g. WaveIndex.max_timestamps)
+
+    Returns:
+        List of matching wave entity IDs
+    """
+    if not waves:
+        return []
+
+    # Convert timestamp to comparable format
+    if isinstance(response_timestamp, datetime):
+        ts = response_timestamp.timestamp()
+    else:
+        ts = response_timestamp
+
+    # Extract max_date timestamps for binary search
+    if max_timestamps is None:
+        max_timestamps = [w.max_timestamp for w in waves]
+
+    # Binary search: find first wave where max_date >= response_timestamp
+    # This is the C# GetIndexOfFirstWaveWithMaxDateExceeding logic
+    start_index = bisect_left(max_timestamps, ts)
+
+    matching_waves = []
+
+    # Check all waves from start_index onwards
+    for i in range(start_index, len(waves)):
+        wave = waves[i]
+
+        # Check if timestamp falls within [min_date, max_date]
+        if wave.min_timestamp <= ts <= wave.max_timestamp:
+            # Apply filter if requested_wave_ids specified
+            if requested_wave_ids is None or wave.entity_id in requested_wave_ids:
+                matching_waves.append(wave.entity_id)
+        elif wave.min_timestamp > ts:
+            # Since waves are sorted by max_date, we can stop once min_date exceeds timestamp
+            break
+
+    return matching_waves
+
+def _answer_array(matching_wave_ids) -> Optional[list]:
+    # Data wave variables have no asked entities (first 3 are None)
+    # The answer_entity_id and answer_value are both the wave entity ID
+    if not matching_wave_ids:
+        return None
+    return [[None, None, None, wave_id, wave_id] for wave_id in matching_wave_ids]
+
+def evaluate_data_wave_variable_for_response(
+    response_id, response_timestamp, definition, requested_wave_entity_ids
+):
+    """
+    Evaluate data wave variable for a single response.
+
+    Args:
+        response_id: Integer response ID (for logging)
+        response_timestamp: Timestamp of the response
+        definition: GroupedVariableDefinition object with wave configurations
+        requested_wave_entity_ids: Array of wave entity IDs to evaluate (or None for all)
+
+    Returns:
+        Array of answer arrays: [[None, None, None, wave_entity_id, wave_entity_id], ...]
+        Each matching wave returns an answer where:
+        - First 3 elements are None (no asked entities for data wave variables)
+        - 4th element is the wave entity ID (answer_entity_id)
+        - 5th element is the wave entity ID as the answer value
+
+        Returns None if no waves match
+    """
+    try:
+        # Parsed once per definition, the same for every respondent of the variable
+        wave_index = get_wave_index(definition)
+
+        if not wave_index.waves:
+            logger.warning(f"No valid waves found in definition for response {response_id}")
+            return None
+
+        # Convert requested_wave_entity_ids to set for O(1) lookup
+        requested_wave_set = set(requested_wave_entity_ids) if requested_wave_entity_ids else None
+
+        # Find all matching waves for this timestamp
+        matching_wave_ids = find_matching_waves(
+            response_timestamp, wave_index.waves, requested_wave_set, wave_index.max_timestamps
+        )
+
+        return _answer_array(matching_wave_ids)
+
+    except Exception as e:
+        logger.error(f"Failed to evaluate data wave variable for response {response_id}")
+        logger.error(f"response_timestamp: {response_timestamp}, definition: {definition}")
+        logger.exception(e)
+        return None
+
+def _epoch_seconds(timestamps: pandas.Series) -> numpy.ndarray:
+    """Seconds since the epoch of naive timestamps (UTC, as in Snowflake's Python runtime), NaN for null"""
+    timestamps = pandas.to_datetime(timestamps)
+    seconds = timestamps.to_numpy(dtype='datetime64[ns]').astype('int64') / 1e9
+    seconds[timestamps.isna().to_numpy()] = numpy.nan
+    return seconds
+
+def evaluate_data_wave_variable_for_responses_batch(
+    response_ids, response_timestamps, definitions, requested_wave_entity_ids
+) -> List[Optional[list]]:
+    """
+    Evaluate data wave variables for a batch of responses, giving the same answer arrays as
+    evaluate_data_wave_variable_for_response does for each one.
+    Consecutive rows with the same definition and requested waves (all of a variable's respondents) are assigned
+    their waves in one call.
+    """
+    response_ids = pandas.Series(response_ids).reset_index(drop=True)
+    seconds = _epoch_seconds(pandas.Series(response_timestamps).reset_index(drop=True))
+    definitions = list(definitions)
+    requested_wave_entity_ids = list(requested_wave_entity_ids)
+
+    answer_arrays = [None] * len(definitions)
+    for run_start, run_end, definition, requested in definition_runs(definitions, requested_wave_entity_ids):
+        try:
+            wave_index = get_wave_index(definition)
+            if not wave_index.waves:
+                logger.warning(f"No valid waves found in definition for responses {response_ids.iloc[run_start]}..{response_ids.iloc[run_end - 1]}")
+                continue
+            requested_wave_set = set(requested) if requested else None
+            for position, matching_wave_ids in enumerate(
+                wave_index.assign_waves(seconds[run_start:run_end], requested_wave_set), run_start
+            ):
+                answer_arrays[position] = _answer_array(matching_wave_ids)
+        except Exception as e:
+            logger.error(f"Failed to evaluate data wave variable for responses {response_ids.iloc[run_start]}..{response_ids.iloc[run_end - 1]}")
+            logger.error(f"definition: {definition}")
+            logger.exception(e)
+    return answer_arrays
+
+@vectorized(input=pandas.DataFrame)
+def evaluate_data_wave_variable_for_responses(df):
+    """
+    Vectorized UDF handler for impl_variable_expression._evaluate_data_wave_variable_for_responses.
+    Same arguments and results as _evaluate_data_wave_variable_for_response, a batch of rows at a time.
+    """
+    # Columns are positional, matching the SQL function's argument order
+    response_ids, response_timestamps, definitions, requested_wave_entity_ids = (df.iloc[:, i] for i in range(4))
+    return pandas.Series(evaluate_data_wave_variable_for_responses_batch(
+        response_ids, response_timestamps, definitions, requested_wave_entity_ids
+    ))
@@ -0,0 +1,22 @@
+-- Vectorized scalar UDF for evaluating data wave variables, a batch of respondents at a time
+-- Same arguments and results as _evaluate_data_wave_variable_for_response, but assigns the waves of every respondent
+-- in a batch with one searchsorted over the definition's sorted wave bounds
+
+-- To stage the Python files (creates a zip bundle with all .py files in the directory):
+-- uv run stage_python.py dev schemas/impl_variable_expression/functions/
+
+-- Create the UDF referencing the uploaded Python bundle
+create or replace function impl_variable_expression._evaluate_data_wave_variable_for_responses(
+    response_id integer,
+    response_timestamp timestamp_ntz,
+    definition object,
+    requested_wave_entity_ids array  -- Array of wave entity IDs to evaluate (or null for all waves)
+)
+returns array  -- Array of arrays: [[asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_entity_id, answer_value], ...]
+language python
+immutable
+runtime_version = '3.13'
+packages = ('snowflake-snowpark-python', 'pandas')
+imports = ('@impl_variable_expression.udf_stage/schemas/impl_variable_expression/functions/functions_bundle.zip')
+handler = '_evaluate_data_wave_variable_for_response.evaluate_data_wave_variable_for_responses'
+;
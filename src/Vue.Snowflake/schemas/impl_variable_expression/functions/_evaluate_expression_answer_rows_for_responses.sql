@@ -0,0 +1,34 @@
+-- Vectorized UDTF for evaluating variable expressions for a whole partition of respondents, one typed row per answer
+-- Same arguments and partitioning as _evaluate_expression_for_responses (`over (partition by response_set_id, variable_identifier)`),
+-- but returns the rows _uncached_derived_answers would flatten and cast from its answer arrays,
+-- so there's no VARIANT array to build and no lateral flatten or casts, which for grid questions is most of the cost
+
+-- To stage the Python files (creates a zip bundle with all .py files in the directory):
+-- uv run stage_python.py dev schemas/impl_variable_expression/functions/
+
+create or replace function impl_variable_expression._evaluate_expression_answer_rows_for_responses(
+    response_set_id integer,
+    variable_identifier string,
+    response_id integer,
+    variable_expression string,
+    entity_names array,
+    entity_instance_arrays array,  -- Array of arrays for each entity dimension
+    dependency_shapes object,
+    dependency_answers object
+)
+returns table (
+    response_set_id integer,
+    variable_identifier string,
+    response_id integer,
+    asked_entity_id_1 integer,
+    asked_entity_id_2 integer,
+    asked_entity_id_3 integer,
+    answer_value integer
+)
+language python
+immutable
+runtime_version = '3.13'
+packages = ('snowflake-snowpark-python', 'pandas')
+imports = ('@impl_variable_expression.udf_stage/schemas/impl_variable_expression/functions/functions_bundle.zip')
+handler = '_evaluate_expression_for_response.EvaluateExpressionAnswerRowsForResponses'
+;
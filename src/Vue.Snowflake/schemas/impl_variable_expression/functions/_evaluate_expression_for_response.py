@@ -1,11 +1,38 @@
 import logging
+import math
+from abc import ABC, abstractmethod
+from array import array
 from itertools import product
-from _nested_dict import NestedDict
+from time import perf_counter
+
+import pandas
+from _answer_columns import VALUE_INDEX, AnswerColumns
+from _evaluation_stats import EvaluationStats
+from _expression_plan_cache import EXPRESSION_PLAN_CACHE_SIZE, ExpressionPlanCache
+from _lru_cache import LruCache
+from _nested_dict import NestedDict, SortedIndex
+from _parse_python_expression import hoist_result_invariants
+
+try:
+    # Only available inside Snowflake's Python runtime
+    from _snowflake import vectorized
+except ImportError:
+    def vectorized(**kwargs):
+        return lambda func: func
 
 logger = logging.getLogger(__name__)
 
+# A batch usually only contains a handful of distinct expressions, but a backfill passes through many
+COMPILED_EXPRESSION_CACHE_SIZE = 1024
+_compiled_expression_cache = LruCache(COMPILED_EXPRESSION_CACHE_SIZE)
+# One per distinct set of entity names of the variables evaluated, far fewer than there are expressions
+RESULT_CLASS_CACHE_SIZE = 256
+_result_class_cache = LruCache(RESULT_CLASS_CACHE_SIZE)
+# Fast path evaluators shared by every expression of the same shape
+_expression_plan_cache = ExpressionPlanCache(EXPRESSION_PLAN_CACHE_SIZE)
+
 class Response:
-    def __init__(self, dependency_shapes, dependency_answers):
+    def __init__(self, dependency_shapes, dependency_answers, stats=None):
         """
         Build a Response object with QuestionVariable attributes.
         For each dependency adds a callable QuestionVariable attribute to allow response.Positive_buzz(...)
@@ -13,34 +40,50 @@ class Response:
         Args:
             dependency_shapes: dict mapping variable names to entity types
             dependency_answers: dict mapping variable names to answer data
+            stats: Optional EvaluationStats to count index builds and lookups into
         """
         for var_name, var_data in dependency_answers.items():
             if var_data is not None and var_name in dependency_shapes:
                 entity_types = dependency_shapes[var_name]
-                setattr(self, var_name, QuestionVariable(entity_types, var_data))
+                if stats is None:
+                    question_variable = QuestionVariable(entity_types, var_data)
+                else:
+                    question_variable = _CountingQuestionVariable(entity_types, var_data, stats)
+                setattr(self, var_name, question_variable)
 
 
 class QuestionVariable:
+    # Many of these are alive at once (one per dependency per respondent) so avoid a __dict__ each
+    __slots__ = ('entity_types', 'answer_columns', 'index_from_entity', '_cache_by_kwargs', '_index_by_keywords')
+
     def __init__(self, entity_types, answers):
+        """
+        Args:
+            entity_types: entity type names of the variable, in order
+            answers: list of [asked_entity_1, asked_entity_2, asked_entity_3, answer_entity], packed answers, or AnswerColumns
+        """
         self.entity_types = entity_types
-        self.answers = answers
+        # Parallel int arrays are far smaller than a list of 4 element lists of int objects
+        self.answer_columns = decode_answers(answers)
 
         # Line up the entities with answer shape skipping Nones.
         # Answers are of shape [asked_entity_1, asked_entity_2, asked_entity_3, answer_entity].
-        example_answer = answers and answers[0] or [0, 0, 0, 0]
+        example_answer = self.answer_columns.first_answer() or [0, 0, 0, 0]
         populated_indices = [i for i, v in enumerate(example_answer) if v is not None]
         self.index_from_entity = {dim: idx for dim, idx in zip(self.entity_types, populated_indices)}
         
-        # Cache for adaptive O(1) lookups: maps kwarg signature to NestedDict
-        # Structure: {(kwarg_entity1, kwarg_entity2, ...): NestedDict}
+        # Cache for adaptive lookups: maps kwarg signature to NestedDict or SortedIndex
+        # Structure: {(kwarg_entity1, kwarg_entity2, ...): NestedDict | SortedIndex}
         self._cache_by_kwargs = {}
+        # For index_for: {keywords in the caller's order: (NestedDict | SortedIndex, keyword positions in index order)}
+        self._index_by_keywords = {}
     
     def __call__(self, **kwargs):
         """
         Makes this object callable like a function with keyword arguments. e.g. Positive_buzz(brand=[3,4], product = 5)
         """
         if not kwargs:
-            return [answer[-1] for answer in self.answers]
+            return list(self.answer_columns.values)
 
         # Need a consistent order. Doesn't matter what it is, but nice to be consistent with the variable's entity order.
         kwarg_signature = tuple(sorted(kwargs.keys(), key=lambda k: self.index_from_entity[k]))
@@ -51,48 +94,285 @@ class QuestionVariable:
             for kw in kwarg_signature
         ]
 
+        return self._index_for_signature(kwarg_signature)[filter_instances]
+
+    def _index_for_signature(self, kwarg_signature):
         # Build cache for this kwarg combination if not yet created
         if kwarg_signature not in self._cache_by_kwargs:
             # kwarg_signature is the ordered tuple of kwarg names used as the cache key
             kwarg_indices = [self.index_from_entity[kw] for kw in kwarg_signature]
-            self._cache_by_kwargs[kwarg_signature] = NestedDict(self.answers, kwarg_indices)
-        answers = self._cache_by_kwargs[kwarg_signature]
-        
-        return answers[filter_instances]
+            self._cache_by_kwargs[kwarg_signature] = self._build_index(kwarg_indices)
+        return self._cache_by_kwargs[kwarg_signature]
 
+    def index_for(self, keywords):
+        """
+        The index that __call__ looks up these keyword arguments in, and the positions of the keywords in its key order.
+        For fast paths that pass the same keywords for every entity combination, to skip normalizing them on every call:
+        index[[values[i] for i in keyword_positions]] gives the same answers as self(**dict(zip(keywords, values)))
+        where each of values is a list.
 
-class Result:
-    def __init__(self, entity_combination, entity_names):
+        Args:
+            keywords: tuple of entity type names
+        """
+        index_and_positions = self._index_by_keywords.get(keywords)
+        if index_and_positions is None:
+            keyword_positions = sorted(range(len(keywords)), key=lambda i: self.index_from_entity[keywords[i]])
+            kwarg_signature = tuple(keywords[i] for i in keyword_positions)
+            index_and_positions = self._index_by_keywords[keywords] = (
+                self._index_for_signature(kwarg_signature), keyword_positions
+            )
+        return index_and_positions
+
+    def _build_index(self, kwarg_indices):
+        """
+        Index the answers by the given answer indices.
+        _variable_answer_arrays orders answers by asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, so when the
+        kwargs are a prefix of that order the columns can be binary searched as they are rather than building a NestedDict.
+        """
+        columns = self.answer_columns
+        key_columns = [columns.column(i) for i in kwarg_indices]
+        sort_prefix = [i for i in columns.populated_indices if i != VALUE_INDEX][:len(kwarg_indices)]
+        # Columns containing None aren't arrays, and None sorts last in Snowflake but can't be compared in Python
+        if kwarg_indices == sort_prefix and all(isinstance(column, array) for column in key_columns):
+            return SortedIndex(key_columns, columns.values)
+        return NestedDict(list(columns.rows(kwarg_indices)), list(range(len(kwarg_indices))))
+
+    def answered_entity_ids(self, entity_type):
+        """Set of entity ids of the given type that this respondent has any answer for"""
+        index = self.index_from_entity[entity_type]
+        return set(self.answer_columns.column(index))
+
+
+def decode_answers(answers) -> AnswerColumns:
+    """
+    A dependency's answers in whichever form _dependency_answers ships them: packed into a base64 string of int32s
+    (or the raw bytes), which skips deserializing a VARIANT array per answer, or answer arrays when they don't fit.
+    """
+    if isinstance(answers, AnswerColumns):
+        return answers
+    if isinstance(answers, (str, bytes, bytearray)):
+        return AnswerColumns.from_packed(answers)
+    return AnswerColumns.from_answer_arrays(answers)
+
+
+class _CountingQuestionVariable(QuestionVariable):
+    """QuestionVariable that counts its index builds and lookups into EvaluationStats"""
+    __slots__ = ('_stats',)
+
+    def __init__(self, entity_types, answers, stats):
+        super().__init__(entity_types, answers)
+        self._stats = stats
+
+    def __call__(self, **kwargs):
+        if kwargs:
+            self._stats.index_lookups += 1
+        return super().__call__(**kwargs)
+
+    def index_for(self, keywords):
+        # Fast paths call this once per lookup
+        self._stats.index_lookups += 1
+        return super().index_for(keywords)
+
+    def _build_index(self, kwarg_indices):
+        index = super()._build_index(kwarg_indices)
+        if isinstance(index, SortedIndex):
+            self._stats.sorted_index_builds += 1
+        else:
+            self._stats.nested_dict_builds += 1
+        return index
+
+
+class Result(ABC):
+    """
+    Base for result objects with an attribute for each entity, e.g. result.brand if brand is in entity_names.
+    Entities that are None in the combination aren't set, so accessing them raises AttributeError.
+
+    Subclasses are generated per entity_names by result_class, with __slots__ for the entity names.
+    A single instance is updated in place for every entity combination, rather than allocating one per combination.
+    """
+    __slots__ = ()
+
+    @abstractmethod
+    def set_entity_combination(self, entity_combination):
         """
-        Build a Result object with an attribute for each entity
-        Allows accessing like result.brand if brand is in entity_names for example
-        
         Args:
-            entity_combination: tuple of entity IDs for this combination
-            entity_names: array of entity dimension names
+            entity_combination: tuple of entity IDs for this combination, in the same order as entity_names
         """
-        entity_values = list(entity_combination)
-        for key, value in zip(entity_names, entity_values):
-            if value is not None:
-                setattr(self, key, value)
+
+
+def _create_result_class(entity_names):
+    unique_entity_names = tuple(dict.fromkeys(entity_names))
+    # Slot names must be identifiers, and ones starting with __ would get name mangled
+    can_use_slots = all(name.isidentifier() and not name.startswith('__') for name in unique_entity_names)
+
+    def set_entity_value(result, name, value):
+        if value is not None:
+            setattr(result, name, value)
+        else:
+            try:
+                delattr(result, name)
+            except AttributeError:
+                pass
+
+    if len(unique_entity_names) == len(entity_names):
+        def set_entity_combination(self, entity_combination):
+            for name, value in zip(entity_names, entity_combination):
+                set_entity_value(self, name, value)
+    else:
+        def set_entity_combination(self, entity_combination):
+            # Same as setting each in turn skipping Nones: the last non-None value for a repeated name wins
+            entity_values = {}
+            for name, value in zip(entity_names, entity_combination):
+                if value is not None:
+                    entity_values[name] = value
+            for name in unique_entity_names:
+                set_entity_value(self, name, entity_values.get(name))
+
+    return type('Result', (Result,), {
+        '__slots__': unique_entity_names if can_use_slots else ('__dict__',),
+        'set_entity_combination': set_entity_combination,
+    })
+
+
+def result_class(entity_names):
+    """
+    Result subclass for the given entity names, generated once and cached by signature.
+
+    Examples:
+        >>> result = result_class(["brand", "product"])()
+        >>> result.set_entity_combination((3, 10, None, None))
+        >>> result.brand, result.product
+        (3, 10)
+    """
+    signature = tuple(entity_names)
+    return _result_class_cache.get_or_create(signature, lambda: _create_result_class(signature))
+
+
+class InvariantValues:
+    """
+    Lazily evaluates and memoizes the result-independent parts of an expression for one respondent.
+    Lazy so that a part is still only evaluated if the original expression would have evaluated it.
+    """
+    __slots__ = ('_response', '_evaluators', '_values')
+    _NOT_EVALUATED = object()
+
+    def __init__(self, response, evaluators):
+        self._response = response
+        self._evaluators = evaluators
+        self._values = [self._NOT_EVALUATED] * len(evaluators)
+
+    def __call__(self, index):
+        value = self._values[index]
+        if value is self._NOT_EVALUATED:
+            value = self._values[index] = self._evaluators[index](self._response)
+        return value
+
+
+class CompiledExpression:
+    """
+    A variable expression compiled ready to evaluate for every entity combination of a respondent.
+    Parts that don't depend on `result` are evaluated once per respondent via InvariantValues.
+    Callable like the original expression: compiled(response, result)
+    """
+    __slots__ = (
+        'variable_expression', 'evaluate', 'invariant_evaluators', 'guard_index', 'depends_on_result', 'required_answer_bindings'
+    )
+
+    def __init__(
+        self, variable_expression, evaluate, invariant_evaluators=(), guard_index=None, depends_on_result=True,
+        required_answer_bindings=()
+    ):
+        self.variable_expression = variable_expression
+        # Takes (response, result, invariant_values)
+        self.evaluate = evaluate
+        self.invariant_evaluators = invariant_evaluators
+        # When set, the expression is None for the whole respondent unless this invariant is truthy
+        self.guard_index = guard_index
+        self.depends_on_result = depends_on_result
+        # When set, only entity combinations with matching answers can be anything but None. See required_answer_bindings
+        self.required_answer_bindings = required_answer_bindings
+
+    def invariant_values(self, response):
+        return InvariantValues(response, self.invariant_evaluators)
+
+    def __call__(self, response, result):
+        invariant_values = self.invariant_values(response)
+        if self.guard_index is not None and not invariant_values(self.guard_index):
+            return None
+        return self.evaluate(response, result, invariant_values)
+
+
+def _compile_lambda(arguments, variable_expression):
+    try:
+        return eval(f'lambda {arguments}: {variable_expression}')
+    except Exception as e:
+        logger.error(f"Failed to compile expression: {variable_expression}")
+        logger.exception(e)
+        raise e
+
+
+def _compile_expression_uncached(variable_expression):
+    hoisted = hoist_result_invariants(variable_expression)
+    if hoisted is None:
+        # Can't analyse it, so evaluate exactly as written
+        evaluate_expression = _compile_lambda('response, result', variable_expression)
+        return CompiledExpression(
+            variable_expression,
+            lambda response, result, invariant_values: evaluate_expression(response, result)
+        )
+
+    # PERF: Common shapes (e.g. metrics) get a purpose-built evaluator rather than eval'd source
+    evaluate = _expression_plan_cache.fast_evaluator(hoisted.expression)
+    if evaluate is None:
+        evaluate = _compile_lambda(f'response, result, {hoisted.invariant_name}', hoisted.expression)
+    return CompiledExpression(
+        variable_expression,
+        evaluate,
+        [_compile_lambda('response', invariant) for invariant in hoisted.invariant_expressions],
+        hoisted.guard_index,
+        hoisted.depends_on_result,
+        hoisted.required_answer_bindings,
+    )
 
 
 def compile_expression(variable_expression):
     """
-    Compile a variable expression into a callable lambda.
+    Compile a variable expression into a callable CompiledExpression.
+    Compiled expressions are cached by expression text, since the same few expressions are evaluated for every respondent.
     
     Args:
         variable_expression: string expression to evaluate
     
     Returns:
-        Function to evaluate the expression with response and result args
+        CompiledExpression to evaluate the expression with response and result args
     """    
-    try:
-        return eval(f'lambda response, result: {variable_expression}')
-    except Exception as e:
-        logger.error(f"Failed to compile expression: {variable_expression}")
-        logger.exception(e)
-        raise e
+    return _compiled_expression_cache.get_or_create(
+        variable_expression, lambda: _compile_expression_uncached(variable_expression)
+    )
+
+
+def _compile_expression_with_stats(variable_expression, stats):
+    if stats is None:
+        return compile_expression(variable_expression)
+    start = perf_counter()
+    compiled_expression = compile_expression(variable_expression)
+    stats.add_phase_time('compile', start)
+    return compiled_expression
+
+
+def expression_plan_cache_stats():
+    """Debug helper: the expression shapes seen, and which have a fast path rather than falling back to eval."""
+    return _expression_plan_cache.stats()
+
+
+def configure_compiled_expression_cache(max_size):
+    """Change how many compiled expressions are kept, e.g. to trade memory for hit rate on a large backfill."""
+    _compiled_expression_cache.resize(max_size)
+
+
+def compiled_expression_cache_stats():
+    """Debug helper: size, max_size, hits, misses and evictions of the compiled expression cache."""
+    return _compiled_expression_cache.stats()
 
 
 def normalize_inputs(entity_names, entity_instance_arrays, dependency_shapes, dependency_answers):
@@ -116,9 +396,132 @@ def normalize_inputs(entity_names, entity_instance_arrays, dependency_shapes, de
     return (entity_names, entity_instance_arrays, dependency_shapes, dependency_answers)
 
 
+def answered_entity_instance_arrays(compiled_expression, response, entity_names, entity_instance_arrays):
+    """
+    Narrow each entity dimension down to the instances the respondent answered for, where the expression is
+    provably None for all other instances. e.g. Most respondents only rate a few of the brands in a brand list.
+    Keeps the original order, so the same answers come out in the same order as iterating every combination.
+    """
+    restricted_instance_arrays = list(entity_instance_arrays)
+    for variable_identifier, entity_bindings in compiled_expression.required_answer_bindings:
+        question_variable = getattr(response, variable_identifier, None)
+        if question_variable is None:
+            continue  # Evaluation will raise just as before
+        for variable_entity, result_entity in entity_bindings:
+            if entity_names.count(result_entity) != 1 or variable_entity not in question_variable.index_from_entity:
+                continue
+            dimension = entity_names.index(result_entity)
+            answered_ids = question_variable.answered_entity_ids(variable_entity)
+            restricted_instance_arrays[dimension] = [
+                # None isn't set on the result so evaluation would raise, leave that behaviour alone
+                instance_id for instance_id in restricted_instance_arrays[dimension]
+                if instance_id is None or instance_id in answered_ids
+            ]
+    return restricted_instance_arrays
+
+
+def evaluate_compiled_expression_for_response(
+    compiled_expression, entity_names, entity_instance_arrays,
+    dependency_shapes, dependency_answers, stats=None
+):
+    """
+    Evaluate an already compiled expression for a single respondent.
+    Inputs must already have been through normalize_inputs.
+
+    Returns:
+        Array of arrays: [[asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_entity_id, answer_value], ...]
+    """
+    phase_start = perf_counter() if stats is not None else None
+    response = Response(dependency_shapes, dependency_answers, stats)
+    if stats is not None:
+        stats.add_phase_time('build_response', phase_start)
+    return evaluate_compiled_expression_against_response(
+        compiled_expression, response, entity_names, entity_instance_arrays, stats
+    )
+
+
+def evaluate_compiled_expression_against_response(
+    compiled_expression, response, entity_names, entity_instance_arrays, stats=None
+):
+    """
+    Evaluate an already compiled expression against a Response, which may be shared with other expressions.
+    entity_names and entity_instance_arrays must already have been through normalize_inputs.
+
+    Args:
+        stats: Optional EvaluationStats to accumulate phase timings and combination counts into
+
+    Returns:
+        Array of arrays: [[asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_entity_id, answer_value], ...]
+    """
+    if stats is not None:
+        stats.respondents += 1
+        phase_start = perf_counter()
+    invariant_values = compiled_expression.invariant_values(response)
+    evaluate_expression_core = compiled_expression.evaluate
+
+    # e.g. A metric's base: No need to look at any entity combinations when the respondent isn't in it
+    guarded = compiled_expression.guard_index is not None and not invariant_values(compiled_expression.guard_index)
+    if stats is not None:
+        phase_start = stats.add_phase_time('evaluate_expression', phase_start)
+        stats.guarded_respondents += guarded
+    if guarded:
+        return []
+
+    if not compiled_expression.depends_on_result:
+        # Every combination would get the same answer, so only evaluate it once, if there are any combinations at all
+        if not all(entity_instance_arrays):
+            if stats is not None:
+                stats.add_phase_time('evaluate_expression', phase_start)
+            return []
+        answer_value = evaluate_expression_core(response, None, invariant_values)
+        if answer_value is None:
+            respondent_answers = []
+        else:
+            answer_value = int(answer_value)
+            respondent_answers = [list(entity_combination) + [answer_value] for entity_combination in product(*entity_instance_arrays)]
+        if stats is not None:
+            stats.combinations_tried += 1
+            stats.combinations_emitted += len(respondent_answers)
+            stats.add_phase_time('evaluate_expression', phase_start)
+        return respondent_answers
+
+    if compiled_expression.required_answer_bindings:
+        entity_instance_arrays = answered_entity_instance_arrays(
+            compiled_expression, response, entity_names, entity_instance_arrays
+        )
+        if stats is not None:
+            phase_start = stats.add_phase_time('restrict_combinations', phase_start)
+    
+    # Expressions can't keep hold of result beyond their own evaluation, so one instance is safely reused
+    result = result_class(entity_names)()
+    set_entity_combination = result.set_entity_combination
+
+    def eval_for_entity_combination(entity_combination):
+        set_entity_combination(entity_combination)
+        return evaluate_expression_core(response, result, invariant_values)
+
+    if stats is not None:
+        eval_for_entity_combination = stats.timed_evaluation(eval_for_entity_combination)
+        evaluate_seconds_before = stats.phase_seconds['evaluate_expression']
+    
+    respondent_answers = [
+        list(entity_combination) + [int(answer_value)]
+        for entity_combination in product(*entity_instance_arrays)
+        # answer_value of None means "no answer"
+        if (answer_value := eval_for_entity_combination(entity_combination)) is not None
+    ]
+
+    if stats is not None:
+        stats.combinations_emitted += len(respondent_answers)
+        evaluate_seconds = stats.phase_seconds['evaluate_expression'] - evaluate_seconds_before
+        stats.phase_seconds['iterate_combinations'] += perf_counter() - phase_start - evaluate_seconds
+    
+    return respondent_answers
+
+
 def evaluate_expression_core_for_response(
     response_id, variable_expression, entity_names, entity_instance_arrays,
-    dependency_shapes, dependency_answers
+    dependency_shapes, dependency_answers, stats=None
 ):
     """
     Process a single respondent and return array of answer arrays.
@@ -130,6 +533,7 @@ def evaluate_expression_core_for_response(
         entity_instance_arrays: array of arrays, one per entity dimension
         dependency_shapes: object mapping variable names to entity types
         dependency_answers: object mapping variable names to answer data
+        stats: Optional EvaluationStats to accumulate phase timings and counts into, for debugging slow expressions
     
     Returns:
         Array of arrays: [[asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_entity_id, answer_value], ...]
@@ -138,18 +542,317 @@ def evaluate_expression_core_for_response(
         entity_names, entity_instance_arrays, dependency_shapes, dependency_answers
     )
 
-    evaluate_expression_core = compile_expression(variable_expression)
-    response = Response(dependency_shapes, dependency_answers)
-    
-    def eval_for_entity_combination(entity_combination):
-        result = Result(entity_combination, entity_names)
-        return evaluate_expression_core(response, result)
+    compiled_expression = _compile_expression_with_stats(variable_expression, stats)
+    return evaluate_compiled_expression_for_response(
+        compiled_expression, entity_names, entity_instance_arrays, dependency_shapes, dependency_answers, stats
+    )
+
+
+def evaluate_expression_core_for_responses(
+    variable_expression, entity_names, entity_instance_arrays,
+    dependency_shapes, response_ids, dependency_answers_by_response, stats=None
+):
+    """
+    Process many respondents of the same variable, compiling the expression once.
     
-    respondent_answers = [
-        list(entity_combination) + [int(answer_value)]
-        for entity_combination in product(*entity_instance_arrays)
-        # answer_value of None means "no answer"
-        if (answer_value := eval_for_entity_combination(entity_combination)) is not None
-    ]
+    Args:
+        variable_expression: string expression to evaluate
+        entity_names: array of entity dimension names
+        entity_instance_arrays: array of arrays, one per entity dimension
+        dependency_shapes: object mapping variable names to entity types
+        response_ids: iterable of integer response_ids
+        dependency_answers_by_response: iterable (parallel to response_ids) of objects mapping variable names to answer data
+        stats: Optional EvaluationStats to accumulate phase timings and counts into, for debugging slow expressions
     
-    return respondent_answers
+    Yields:
+        (response_id, answer_arrays) for each respondent with at least one answer
+    """
+    (entity_names, entity_instance_arrays, dependency_shapes, _) = normalize_inputs(
+        entity_names, entity_instance_arrays, dependency_shapes, None
+    )
+
+    compiled_expression = _compile_expression_with_stats(variable_expression, stats)
+    for response_id, dependency_answers in zip(response_ids, dependency_answers_by_response):
+        respondent_answers = evaluate_compiled_expression_for_response(
+            compiled_expression, entity_names, entity_instance_arrays, dependency_shapes, dependency_answers or {}, stats
+        )
+        # Empty arrays would be dropped by the lateral flatten anyway, so don't ship them
+        if respondent_answers:
+            yield response_id, respondent_answers
+
+
+def evaluate_expressions_core_for_response(response_id, expressions, dependency_shapes, dependency_answers):
+    """
+    Process a single respondent for several variables, sharing one Response (and its lookup indexes) between them.
+
+    Args:
+        response_id: integer response_id
+        expressions: array of [variable_identifier, python_expression, entity_names, entity_instance_arrays]
+        dependency_shapes: object mapping variable names to entity types, for the dependencies of all the expressions
+        dependency_answers: object mapping variable names to answer data, for the dependencies of all the expressions
+
+    Returns:
+        Array of [variable_identifier, answer_arrays] for each variable with at least one answer
+    """
+    response = Response(dependency_shapes or {}, dependency_answers or {})
+    variable_answers = []
+    for variable_identifier, variable_expression, entity_names, entity_instance_arrays in expressions:
+        (entity_names, entity_instance_arrays, _, _) = normalize_inputs(entity_names, entity_instance_arrays, None, None)
+        respondent_answers = evaluate_compiled_expression_against_response(
+            compile_expression(variable_expression), response, entity_names, entity_instance_arrays
+        )
+        if respondent_answers:
+            variable_answers.append([variable_identifier, respondent_answers])
+    return variable_answers
+
+
+def evaluate_expressions_core_for_responses(expressions, dependency_shapes, response_ids, dependency_answers_by_response):
+    """
+    Process many respondents for several variables, building one Response per respondent for all of them.
+    A variable whose expression raises gets an error message instead of answers, without affecting the other variables.
+
+    Args:
+        expressions: iterable of (variable_identifier, python_expression, entity_names, entity_instance_arrays)
+        dependency_shapes: object mapping variable names to entity types, for the dependencies of all the expressions
+        response_ids: iterable of integer response_ids
+        dependency_answers_by_response: iterable (parallel to response_ids) of objects mapping variable names to answer data
+
+    Returns:
+        (answers_by_variable, error_message_by_variable)
+        answers_by_variable maps each variable without an error to [(response_id, answer_arrays), ...] for respondents with answers
+    """
+    compiled_expressions = []
+    error_message_by_variable = {}
+    for variable_identifier, variable_expression, entity_names, entity_instance_arrays in expressions:
+        (entity_names, entity_instance_arrays, _, _) = normalize_inputs(entity_names, entity_instance_arrays, None, None)
+        try:
+            compiled_expression = compile_expression(variable_expression)
+        except Exception as e:
+            error_message_by_variable[variable_identifier] = f"{type(e).__name__}: {e}"
+            continue
+        compiled_expressions.append((variable_identifier, compiled_expression, entity_names, entity_instance_arrays))
+
+    answers_by_variable = {variable_identifier: [] for variable_identifier, *_ in compiled_expressions}
+    for response_id, dependency_answers in zip(response_ids, dependency_answers_by_response):
+        response = Response(dependency_shapes or {}, dependency_answers or {})
+        for variable_identifier, compiled_expression, entity_names, entity_instance_arrays in compiled_expressions:
+            if variable_identifier in error_message_by_variable:
+                continue
+            try:
+                respondent_answers = evaluate_compiled_expression_against_response(
+                    compiled_expression, response, entity_names, entity_instance_arrays
+                )
+            except Exception as e:
+                error_message_by_variable[variable_identifier] = f"response_id {response_id}: {type(e).__name__}: {e}"
+                del answers_by_variable[variable_identifier]
+                continue
+            if respondent_answers:
+                answers_by_variable[variable_identifier].append((response_id, respondent_answers))
+
+    return answers_by_variable, error_message_by_variable
+
+
+def snowflake_integer(value):
+    """An answer array element as `value::integer` casts it in Snowflake: numbers round half away from zero"""
+    if value is None or type(value) is int:
+        return value
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        return int(math.copysign(math.floor(abs(value) + 0.5), value))
+    return int(value)
+
+
+def answer_rows(respondent_answers):
+    """
+    (response_id, asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_value) for each answer of
+    (response_id, answer_arrays) pairs, typed as _uncached_derived_answers' lateral flatten and casts give them.
+    answer_entity_id is left out, as it always matches answer_value when set.
+    """
+    for response_id, answer_arrays in respondent_answers:
+        for answer in answer_arrays:
+            yield (
+                response_id,
+                snowflake_integer(answer[0]),
+                snowflake_integer(answer[1]),
+                snowflake_integer(answer[2]),
+                snowflake_integer(answer[4]),
+            )
+
+
+def _answer_rows_frame(response_set_id, variable_identifiers, rows, error_messages=None):
+    """Typed answer rows as a UDTF result, with nullable integer columns"""
+    columns = {
+        'response_set_id': [response_set_id] * len(rows),
+        'variable_identifier': variable_identifiers,
+        'response_id': pandas.array([row[0] for row in rows], dtype='Int64'),
+        'asked_entity_id_1': pandas.array([row[1] for row in rows], dtype='Int64'),
+        'asked_entity_id_2': pandas.array([row[2] for row in rows], dtype='Int64'),
+        'asked_entity_id_3': pandas.array([row[3] for row in rows], dtype='Int64'),
+        'answer_value': pandas.array([row[4] for row in rows], dtype='Int64'),
+    }
+    if error_messages is not None:
+        columns['error_message'] = error_messages
+    return pandas.DataFrame(columns)
+
+
+def _partition_columns(df, count):
+    """The first count columns of a UDTF partition, which are positional, matching the SQL function's argument order"""
+    return tuple(df.iloc[:, i] for i in range(count))
+
+
+class _ExpressionPartitionHandler:
+    """
+    Base for the UDTF handlers called with one partition per (response_set_id, variable_identifier), whose arguments are
+    (response_set_id, variable_identifier, response_id, variable_expression, entity_names, entity_instance_arrays,
+    dependency_shapes, dependency_answers). Everything except the response and its answers is the same on every row,
+    so the expression is compiled once.
+    """
+
+    @staticmethod
+    def _evaluate(df, stats=None):
+        """(response_set_id, variable_identifier, (response_id, answer_array) for each respondent with answers)"""
+        (response_set_ids, variable_identifiers, response_ids, variable_expressions,
+         entity_names, entity_instance_arrays, dependency_shapes, dependency_answers) = _partition_columns(df, 8)
+
+        respondent_answers = evaluate_expression_core_for_responses(
+            variable_expressions.iloc[0],
+            entity_names.iloc[0],
+            entity_instance_arrays.iloc[0],
+            dependency_shapes.iloc[0],
+            response_ids,
+            dependency_answers,
+            stats,
+        )
+        return response_set_ids.iloc[0], variable_identifiers.iloc[0], respondent_answers
+
+
+class _ExpressionsPartitionHandler:
+    """
+    Base for the UDTF handlers called with one partition per response_set_id (and bucket of respondents) containing
+    two kinds of row, so nothing is shipped more than once. Their arguments are
+    (response_set_id, response_id, dependency_answers, variable_identifier, variable_expression, entity_names,
+    entity_instance_arrays, dependency_shapes):
+    - One per respondent: response_id and the union of the dependency answers of all the variables
+    - One per variable: variable_identifier, expression, entity_names, entity_instance_arrays and dependency_shapes
+    """
+
+    @staticmethod
+    def _evaluate(df):
+        """(response_set_id, answers_by_variable, error_message_by_variable), see evaluate_expressions_core_for_responses"""
+        (response_set_ids, response_ids, dependency_answers, variable_identifiers, variable_expressions,
+         entity_names, entity_instance_arrays, dependency_shapes) = _partition_columns(df, 8)
+
+        is_variable_row = variable_identifiers.notna()
+        dependency_shapes_union = {}
+        for shapes in dependency_shapes[is_variable_row]:
+            dependency_shapes_union.update(shapes or {})
+        expressions = zip(
+            variable_identifiers[is_variable_row],
+            variable_expressions[is_variable_row],
+            entity_names[is_variable_row],
+            entity_instance_arrays[is_variable_row],
+        )
+        answers_by_variable, error_message_by_variable = evaluate_expressions_core_for_responses(
+            expressions,
+            dependency_shapes_union,
+            # Nulls on the variable rows can make pandas store these as floats
+            (int(response_id) for response_id in response_ids[~is_variable_row]),
+            dependency_answers[~is_variable_row],
+        )
+        return response_set_ids.iloc[0], answers_by_variable, error_message_by_variable
+
+
+class EvaluateExpressionForResponses(_ExpressionPartitionHandler):
+    """Vectorized UDTF handler for impl_variable_expression._evaluate_expression_for_responses"""
+
+    @vectorized(input=pandas.DataFrame)
+    def end_partition(self, df):
+        response_set_id, variable_identifier, respondent_answers = self._evaluate(df)
+        rows = list(respondent_answers)
+        return pandas.DataFrame({
+            'response_set_id': [response_set_id] * len(rows),
+            'variable_identifier': [variable_identifier] * len(rows),
+            'response_id': [response_id for response_id, _ in rows],
+            'answer_array': [answer_array for _, answer_array in rows],
+        })
+
+
+class EvaluateExpressionAnswerRowsForResponses(_ExpressionPartitionHandler):
+    """
+    Vectorized UDTF handler for impl_variable_expression._evaluate_expression_answer_rows_for_responses.
+    Same arguments and partitioning as _evaluate_expression_for_responses, but returns one typed row per answer
+    rather than an answer array per respondent, so there's no VARIANT array to build, flatten and cast.
+    """
+
+    @vectorized(input=pandas.DataFrame)
+    def end_partition(self, df):
+        response_set_id, variable_identifier, respondent_answers = self._evaluate(df)
+        rows = list(answer_rows(respondent_answers))
+        return _answer_rows_frame(response_set_id, [variable_identifier] * len(rows), rows)
+
+
+class EvaluateExpressionsForResponses(_ExpressionsPartitionHandler):
+    """Vectorized UDTF handler for impl_variable_expression._evaluate_expressions_for_responses"""
+
+    @vectorized(input=pandas.DataFrame)
+    def end_partition(self, df):
+        response_set_id, answers_by_variable, error_message_by_variable = self._evaluate(df)
+        rows = [
+            (variable_identifier, response_id, answer_array, None)
+            for variable_identifier, respondent_answers in answers_by_variable.items()
+            for response_id, answer_array in respondent_answers
+        ] + [
+            (variable_identifier, None, None, error_message)
+            for variable_identifier, error_message in error_message_by_variable.items()
+        ]
+        return pandas.DataFrame({
+            'response_set_id': [response_set_id] * len(rows),
+            'variable_identifier': [variable_identifier for variable_identifier, _, _, _ in rows],
+            'response_id': [response_id for _, response_id, _, _ in rows],
+            'answer_array': [answer_array for _, _, answer_array, _ in rows],
+            'error_message': [error_message for _, _, _, error_message in rows],
+        })
+
+
+class EvaluateExpressionsAnswerRowsForResponses(_ExpressionsPartitionHandler):
+    """
+    Vectorized UDTF handler for impl_variable_expression._evaluate_expressions_answer_rows_for_responses.
+    Same arguments and partitioning as _evaluate_expressions_for_responses, but returns one typed row per answer
+    rather than an answer array per respondent, and a row with only an error_message for a variable that raised.
+    """
+
+    @vectorized(input=pandas.DataFrame)
+    def end_partition(self, df):
+        response_set_id, answers_by_variable, error_message_by_variable = self._evaluate(df)
+        rows = []
+        row_variable_identifiers = []
+        for variable_identifier, respondent_answers in answers_by_variable.items():
+            rows.extend(answer_rows(respondent_answers))
+            row_variable_identifiers.extend([variable_identifier] * (len(rows) - len(row_variable_identifiers)))
+        error_messages = [None] * len(rows)
+        for variable_identifier, error_message in error_message_by_variable.items():
+            rows.append((None, None, None, None, None))
+            row_variable_identifiers.append(variable_identifier)
+            error_messages.append(error_message)
+        return _answer_rows_frame(response_set_id, row_variable_identifiers, rows, error_messages)
+
+
+class EvaluateExpressionStatsForResponses(_ExpressionPartitionHandler):
+    """
+    Vectorized UDTF handler for impl_variable_expression._evaluate_expression_stats_for_responses.
+    Takes the same arguments and partitioning as _evaluate_expression_for_responses, but rather than the answers
+    returns one row per partition with the EvaluationStats of calculating them.
+    """
+
+    @vectorized(input=pandas.DataFrame)
+    def end_partition(self, df):
+        stats = EvaluationStats()
+        response_set_id, variable_identifier, respondent_answers = self._evaluate(df, stats)
+        for _ in respondent_answers:
+            pass
+        return pandas.DataFrame({
+            'response_set_id': [response_set_id],
+            'variable_identifier': [variable_identifier],
+            'evaluation_stats': [stats.to_dict()],
+        })
@@ -19,7 +19,7 @@ returns array  -- Array of arrays: [[asked_entity_id_1, asked_entity_id_2, asked
 language python
 immutable
 runtime_version = '3.13'
-packages = ('snowflake-snowpark-python')
+packages = ('snowflake-snowpark-python', 'pandas')
 imports = ('@impl_variable_expression.udf_stage/schemas/impl_variable_expression/functions/functions_bundle.zip')
 handler = '_evaluate_expression_for_response.evaluate_expression_core_for_response'
 ;
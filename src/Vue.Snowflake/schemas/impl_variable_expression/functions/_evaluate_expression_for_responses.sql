@@ -0,0 +1,31 @@
+-- Vectorized UDTF for evaluating variable expressions for a whole partition of respondents
+-- Call with `over (partition by response_set_id, variable_identifier)` so the expression is compiled once per partition
+-- rather than once per respondent as in the scalar _evaluate_expression_for_response
+-- Returns one row per respondent that has any answers
+
+-- To stage the Python files (creates a zip bundle with all .py files in the directory):
+-- uv run stage_python.py dev schemas/impl_variable_expression/functions/
+
+create or replace function impl_variable_expression._evaluate_expression_for_responses(
+    response_set_id integer,
+    variable_identifier string,
+    response_id integer,
+    variable_expression string,
+    entity_names array,
+    entity_instance_arrays array,  -- Array of arrays for each entity dimension
+    dependency_shapes object,
+    dependency_answers object
+)
+returns table (
+    response_set_id integer,
+    variable_identifier string,
+    response_id integer,
+    answer_array array  -- Array of arrays: [[asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_entity_id, answer_value], ...]
+)
+language python
+immutable
+runtime_version = '3.13'
+packages = ('snowflake-snowpark-python', 'pandas')
+imports = ('@impl_variable_expression.udf_stage/schemas/impl_variable_expression/functions/functions_bundle.zip')
+handler = '_evaluate_expression_for_response.EvaluateExpressionForResponses'
+;
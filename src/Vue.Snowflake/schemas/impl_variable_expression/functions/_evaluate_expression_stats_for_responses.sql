@@ -0,0 +1,30 @@
+-- Companion to _evaluate_expression_for_responses for finding out where a slow variable's time goes
+-- Takes the same arguments and `over (partition by response_set_id, variable_identifier)`, but rather than answers
+-- returns one row per partition with phase timings, entity combinations tried vs emitted and index build/lookup counts
+-- See EvaluationStats in _evaluation_stats.py, and _record_derived_variable_evaluation_stats to store them
+
+-- To stage the Python files (creates a zip bundle with all .py files in the directory):
+-- uv run stage_python.py dev schemas/impl_variable_expression/functions/
+
+create or replace function impl_variable_expression._evaluate_expression_stats_for_responses(
+    response_set_id integer,
+    variable_identifier string,
+    response_id integer,
+    variable_expression string,
+    entity_names array,
+    entity_instance_arrays array,  -- Array of arrays for each entity dimension
+    dependency_shapes object,
+    dependency_answers object
+)
+returns table (
+    response_set_id integer,
+    variable_identifier string,
+    evaluation_stats object
+)
+language python
+immutable
+runtime_version = '3.13'
+packages = ('snowflake-snowpark-python', 'pandas')
+imports = ('@impl_variable_expression.udf_stage/schemas/impl_variable_expression/functions/functions_bundle.zip')
+handler = '_evaluate_expression_for_response.EvaluateExpressionStatsForResponses'
+;
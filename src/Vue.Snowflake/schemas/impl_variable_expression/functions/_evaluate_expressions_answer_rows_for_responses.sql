@@ -0,0 +1,36 @@
+-- Vectorized UDTF for evaluating many variable expressions for a whole response set, one typed row per answer
+-- Same arguments and partitioning as _evaluate_expressions_for_responses (`over (partition by response_set_id, <respondent bucket>)`,
+-- one input row per respondent and one per variable in every partition), but returns rows ready to insert into derived_variable_answers
+-- rather than answer arrays to flatten and cast.
+-- A variable whose expression raised gets a single row with an error_message (and no answers) instead
+
+-- To stage the Python files (creates a zip bundle with all .py files in the directory):
+-- uv run stage_python.py dev schemas/impl_variable_expression/functions/
+
+create or replace function impl_variable_expression._evaluate_expressions_answer_rows_for_responses(
+    response_set_id integer,
+    response_id integer,
+    dependency_answers object,
+    variable_identifier string,
+    variable_expression string,
+    entity_names array,
+    entity_instance_arrays array,  -- Array of arrays for each entity dimension
+    dependency_shapes object
+)
+returns table (
+    response_set_id integer,
+    variable_identifier string,
+    response_id integer,
+    asked_entity_id_1 integer,
+    asked_entity_id_2 integer,
+    asked_entity_id_3 integer,
+    answer_value integer,
+    error_message string
+)
+language python
+immutable
+runtime_version = '3.13'
+packages = ('snowflake-snowpark-python', 'pandas')
+imports = ('@impl_variable_expression.udf_stage/schemas/impl_variable_expression/functions/functions_bundle.zip')
+handler = '_evaluate_expression_for_response.EvaluateExpressionsAnswerRowsForResponses'
+;
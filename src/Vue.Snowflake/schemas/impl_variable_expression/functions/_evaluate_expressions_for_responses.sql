@@ -0,0 +1,35 @@
+-- Vectorized UDTF for evaluating many variable expressions for a whole response set, sharing one Response per respondent
+-- Call with `over (partition by response_set_id, <respondent bucket>)` and two kinds of input row, so no respondent's answers are shipped more than once
+-- (buckets keep partitions to a size one Python process can hold, and every bucket needs all the variable rows):
+-- * One per respondent: response_id and dependency_answers for the union of all the variables' dependencies, other arguments null
+-- * One per variable: variable_identifier, variable_expression, entity_names, entity_instance_arrays and dependency_shapes, other arguments null
+-- Returns one row per variable and respondent that has any answers,
+-- or a single row with an error_message (and no answers) for a variable whose expression raised
+
+-- To stage the Python files (creates a zip bundle with all .py files in the directory):
+-- uv run stage_python.py dev schemas/impl_variable_expression/functions/
+
+create or replace function impl_variable_expression._evaluate_expressions_for_responses(
+    response_set_id integer,
+    response_id integer,
+    dependency_answers object,
+    variable_identifier string,
+    variable_expression string,
+    entity_names array,
+    entity_instance_arrays array,  -- Array of arrays for each entity dimension
+    dependency_shapes object
+)
+returns table (
+    response_set_id integer,
+    variable_identifier string,
+    response_id integer,
+    answer_array array,  -- Array of arrays: [[asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_entity_id, answer_value], ...]
+    error_message string
+)
+language python
+immutable
+runtime_version = '3.13'
+packages = ('snowflake-snowpark-python', 'pandas')
+imports = ('@impl_variable_expression.udf_stage/schemas/impl_variable_expression/functions/functions_bundle.zip')
+handler = '_evaluate_expression_for_response.EvaluateExpressionsForResponses'
+;
@@ -0,0 +1,236 @@
+import logging
+from dataclasses import dataclass, fields
+from typing import Dict, List, Optional, Tuple
+
+import pandas
+from _definition_cache import DefinitionCache, definition_runs
+
+try:
+    # Only available inside Snowflake's Python runtime
+    from _snowflake import vectorized
+except ImportError:
+    def vectorized(**kwargs):
+        return lambda func: func
+
+logger = logging.getLogger(__name__)
+
+# One per survey ID variable being evaluated
+SURVEY_ID_LOOKUP_CACHE_SIZE = 256
+
+@dataclass
+class SurveyIdComponent:
+    """Represents a SurveyIdVariableComponent from C#"""
+    SurveyIds: List[int]
+
+@dataclass
+class SurveyGroup:
+    """Represents a VariableGrouping from GroupedVariableDefinition"""
+    ToEntityInstanceId: int
+    Component: dict  # Will be converted to SurveyIdComponent
+
+    def __post_init__(self):
+        # Auto-convert Component dict to SurveyIdComponent
+        if isinstance(self.Component, dict):
+            self.Component = SurveyIdComponent(**_known_fields(SurveyIdComponent, self.Component))
+
+def _known_fields(dataclass_type, values: dict) -> dict:
+    """
+    The values the dataclass has fields for. The serialized C# also has e.g. ToEntityInstanceName and discriminator,
+    which mapping the definition ignores, as in SurveyIdVariable.cs and _survey_id_variable_mappings.
+    """
+    field_names = {field.name for field in fields(dataclass_type)}
+    return {name: value for name, value in values.items() if name in field_names}
+
+def parse_survey_id_definition(definition):
+    """
+    Parse GroupedVariableDefinition to extract survey ID group configurations.
+
+    Args:
+        definition: Object with Groups array, each containing:
+            - ToEntityInstanceId: integer group entity ID
+            - Component: Object with SurveyIds array
+
+    Returns:
+        Tuple of (group_id_to_survey_ids, survey_id_to_group_ids)
+        - group_id_to_survey_ids: dict mapping group entity ID to set of survey IDs
+        - survey_id_to_group_ids: dict mapping survey ID to list of group entity IDs
+    """
+    if not definition or 'Groups' not in definition:
+        logger.error(f"Invalid definition: missing Groups. Definition: {definition}")
+        return {}, {}
+
+    groups_data = definition['Groups']
+    if not groups_data:
+        return {}, {}
+
+    group_id_to_survey_ids = {}
+    survey_id_to_group_ids = {}
+
+    for group_dict in groups_data:
+        try:
+            # Deserialize directly to dataclass
+            group = SurveyGroup(**_known_fields(SurveyGroup, group_dict))
+            group_id = group.ToEntityInstanceId
+            survey_ids = group.Component.SurveyIds
+
+            # Store group -> survey IDs mapping (as set for O(1) lookup)
+            group_id_to_survey_ids[group_id] = set(survey_ids)
+
+            # Build reverse lookup: survey ID -> list of group IDs
+            for survey_id in survey_ids:
+                if survey_id not in survey_id_to_group_ids:
+                    survey_id_to_group_ids[survey_id] = []
+                survey_id_to_group_ids[survey_id].append(group_id)
+
+        except Exception as e:
+            logger.error(f"Failed to parse survey group: {group_dict}")
+            logger.exception(e)
+            continue
+
+    return group_id_to_survey_ids, survey_id_to_group_ids
+
+_survey_id_lookup_cache = DefinitionCache(SURVEY_ID_LOOKUP_CACHE_SIZE, parse_survey_id_definition)
+
+def get_survey_id_lookup(definition) -> Tuple[Dict[int, set], Dict[int, List[int]]]:
+    """parse_survey_id_definition of a definition, parsed once per distinct definition. Don't modify the result."""
+    return _survey_id_lookup_cache.get(definition)
+
+def clear_survey_id_lookup_cache():
+    """Forget every parsed definition, e.g. between tests"""
+    _survey_id_lookup_cache.clear()
+
+def survey_id_lookup_cache_stats():
+    """Hit/miss/eviction counters of the survey ID lookup cache, for tuning SURVEY_ID_LOOKUP_CACHE_SIZE"""
+    return _survey_id_lookup_cache.stats()
+
+def survey_id_mapping_rows(definition) -> List[Tuple[int, int]]:
+    """
+    The definition compiled to a static mapping: (survey_id, group entity ID) rows, in the order a respondent's
+    answers are given. The same mapping as the _survey_id_variable_mappings dynamic table, which joins to respondents
+    in SQL so survey ID variables need no UDF at all.
+    """
+    _, survey_id_to_group_ids = get_survey_id_lookup(definition)
+    return [
+        (survey_id, group_id)
+        for survey_id, group_ids in survey_id_to_group_ids.items()
+        for group_id in group_ids
+    ]
+
+def find_matching_groups(response_survey_id, survey_id_to_group_ids, requested_group_ids=None):
+    """
+    Find all survey ID groups that contain the given survey ID.
+    Uses dictionary lookup for O(1) survey ID matching.
+
+    Args:
+        response_survey_id: Survey ID to check
+        survey_id_to_group_ids: Dict mapping survey ID to list of group entity IDs
+        requested_group_ids: Set of group entity IDs to filter results (or None for all)
+
+    Returns:
+        List of matching group entity IDs
+    """
+    # O(1) lookup for survey ID
+    if response_survey_id not in survey_id_to_group_ids:
+        return []
+
+    group_ids = survey_id_to_group_ids[response_survey_id]
+
+    # Apply filter if requested_group_ids specified
+    if requested_group_ids is not None:
+        group_ids = [gid for gid in group_ids if gid in requested_group_ids]
+
+    return group_ids
+
+def _answer_array(matching_group_ids) -> Optional[list]:
+    # Survey ID variables have no asked entities (first 3 are None)
+    # The answer_entity_id and answer_value are both the group entity ID
+    if not matching_group_ids:
+        return None
+    return [[None, None, None, group_id, group_id] for group_id in matching_group_ids]
+
+def evaluate_survey_id_variable_for_response(
+    response_id, response_survey_id, definition, requested_survey_group_entity_ids
+):
+    """
+    Evaluate survey ID variable for a single response.
+
+    Args:
+        response_id: Integer response ID (for logging)
+        response_survey_id: Survey ID of the response
+        definition: GroupedVariableDefinition object with survey ID group configurations
+        requested_survey_group_entity_ids: Array of group entity IDs to evaluate (or None for all)
+
+    Returns:
+        Array of answer arrays: [[None, None, None, group_entity_id, group_entity_id], ...]
+        Each matching group returns an answer where:
+        - First 3 elements are None (no asked entities for survey ID variables)
+        - 4th element is the group entity ID (answer_entity_id)
+        - 5th element is the group entity ID as the answer value
+
+        Returns None if no groups match
+    """
+    try:
+        # Parsed once per definition, the same for every respondent of the variable
+        group_id_to_survey_ids, survey_id_to_group_ids = get_survey_id_lookup(definition)
+
+        if not survey_id_to_group_ids:
+            logger.warning(f"No valid survey groups found in definition for response {response_id}")
+            return None
+
+        # Convert requested_survey_group_entity_ids to set for O(1) lookup
+        requested_group_set = set(requested_survey_group_entity_ids) if requested_survey_group_entity_ids else None
+
+        # Find all matching groups for this survey ID
+        matching_group_ids = find_matching_groups(response_survey_id, survey_id_to_group_ids, requested_group_set)
+
+        return _answer_array(matching_group_ids)
+
+    except Exception as e:
+        logger.error(f"Failed to evaluate survey ID variable for response {response_id}")
+        logger.error(f"response_survey_id: {response_survey_id}, definition: {definition}")
+        logger.exception(e)
+        return None
+
+def evaluate_survey_id_variable_for_responses_batch(
+    response_ids, response_survey_ids, definitions, requested_survey_group_entity_ids
+) -> List[Optional[list]]:
+    """
+    Evaluate survey ID variables for a batch of responses, giving the same answer arrays as
+    evaluate_survey_id_variable_for_response does for each one.
+    For each run of rows with the same definition (all of a variable's respondents), the answer array of every
+    survey ID is built once, then each row is a dict lookup. Rows with the same survey ID share the answer array.
+    """
+    response_ids = list(response_ids)
+    response_survey_ids = list(response_survey_ids)
+    definitions = list(definitions)
+
+    answer_arrays = [None] * len(definitions)
+    for run_start, run_end, definition, requested in definition_runs(definitions, list(requested_survey_group_entity_ids)):
+        try:
+            _, survey_id_to_group_ids = get_survey_id_lookup(definition)
+            if not survey_id_to_group_ids:
+                logger.warning(f"No valid survey groups found in definition for responses {response_ids[run_start]}..{response_ids[run_end - 1]}")
+                continue
+            requested_group_set = set(requested) if requested else None
+            answer_array_by_survey_id = {
+                survey_id: _answer_array(find_matching_groups(survey_id, survey_id_to_group_ids, requested_group_set))
+                for survey_id in survey_id_to_group_ids
+            }
+            answer_arrays[run_start:run_end] = map(answer_array_by_survey_id.get, response_survey_ids[run_start:run_end])
+        except Exception as e:
+            logger.error(f"Failed to evaluate survey ID variable for responses {response_ids[run_start]}..{response_ids[run_end - 1]}")
+            logger.error(f"definition: {definition}")
+            logger.exception(e)
+    return answer_arrays
+
+@vectorized(input=pandas.DataFrame)
+def evaluate_survey_id_variable_for_responses(df):
+    """
+    Vectorized UDF handler for impl_variable_expression._evaluate_survey_id_variable_for_responses.
+    Same arguments and results as _evaluate_survey_id_variable_for_response, a batch of rows at a time.
+    """
+    # Columns are positional, matching the SQL function's argument order
+    response_ids, response_survey_ids, definitions, requested_survey_group_entity_ids = (df.iloc[:, i] for i in range(4))
+    return pandas.Series(evaluate_survey_id_variable_for_responses_batch(
+        response_ids, response_survey_ids, definitions, requested_survey_group_entity_ids
+    ))
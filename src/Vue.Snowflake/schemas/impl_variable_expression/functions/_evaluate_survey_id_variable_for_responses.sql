@@ -0,0 +1,22 @@
+-- Vectorized scalar UDF for evaluating survey ID variables, a batch of respondents at a time
+-- Same arguments and results as _evaluate_survey_id_variable_for_response, but builds the answer array of each
+-- survey ID once per batch, so each row is a dict lookup
+
+-- To stage the Python files (creates a zip bundle with all .py files in the directory):
+-- uv run stage_python.py dev schemas/impl_variable_expression/functions/
+
+-- Create the UDF referencing the uploaded Python bundle
+create or replace function impl_variable_expression._evaluate_survey_id_variable_for_responses(
+    response_id integer,
+    response_survey_id integer,
+    definition object,
+    requested_survey_group_entity_ids array  -- Array of survey group entity IDs to evaluate (or null for all groups)
+)
+returns array  -- Array of arrays: [[asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_entity_id, answer_value], ...]
+language python
+immutable
+runtime_version = '3.13'
+packages = ('snowflake-snowpark-python', 'pandas')
+imports = ('@impl_variable_expression.udf_stage/schemas/impl_variable_expression/functions/functions_bundle.zip')
+handler = '_evaluate_survey_id_variable_for_response.evaluate_survey_id_variable_for_responses'
+;
@@ -0,0 +1,77 @@
+from time import perf_counter
+
+# Phases of evaluating an expression for a respondent, in the order they happen
+PHASES = ('compile', 'build_response', 'restrict_combinations', 'iterate_combinations', 'evaluate_expression')
+
+
+class EvaluationStats:
+    """
+    Opt-in counters and timers for evaluating expressions, to see where the time goes on a slow variable.
+    Pass one to the evaluate functions (stats=...) to accumulate over any number of respondents.
+    Everything that isn't instrumented pays nothing, since each check is only `stats is not None`.
+
+    Phases:
+    - compile: compile_expression, only slow on a cache miss
+    - build_response: Response and its QuestionVariables from the dependency answers
+    - restrict_combinations: narrowing the entity combinations down to those the respondent answered
+    - iterate_combinations: looping over the entity combinations, excluding evaluating the expression
+    - evaluate_expression: the expression itself (including its invariant parts and any index builds and lookups)
+
+    Example:
+        stats = EvaluationStats()
+        evaluate_expression_core_for_response(response_id, expression, entity_names, entity_instance_arrays, shapes, answers, stats=stats)
+        print(stats.to_dict())
+    """
+    __slots__ = (
+        'respondents', 'guarded_respondents', 'combinations_tried', 'combinations_emitted',
+        'nested_dict_builds', 'sorted_index_builds', 'index_lookups', 'phase_seconds',
+    )
+
+    def __init__(self):
+        self.respondents = 0
+        # Respondents skipped without looking at entity combinations, e.g. not in a metric's base
+        self.guarded_respondents = 0
+        self.combinations_tried = 0
+        self.combinations_emitted = 0
+        self.nested_dict_builds = 0
+        self.sorted_index_builds = 0
+        self.index_lookups = 0
+        self.phase_seconds = dict.fromkeys(PHASES, 0.0)
+
+    def add_phase_time(self, phase, start):
+        """Add the time since start (from perf_counter) to a phase, returning now for timing the next phase"""
+        now = perf_counter()
+        self.phase_seconds[phase] += now - start
+        return now
+
+    def timed_evaluation(self, evaluate_for_entity_combination):
+        """Wrap the per combination evaluation to count and time it"""
+        phase_seconds = self.phase_seconds
+
+        def timed(entity_combination):
+            self.combinations_tried += 1
+            start = perf_counter()
+            try:
+                return evaluate_for_entity_combination(entity_combination)
+            finally:
+                phase_seconds['evaluate_expression'] += perf_counter() - start
+        return timed
+
+    def merge(self, other):
+        """Add another EvaluationStats' counts and times to these, e.g. to combine partitions"""
+        for name in self.__slots__:
+            if name != 'phase_seconds':
+                setattr(self, name, getattr(self, name) + getattr(other, name))
+        for phase, seconds in other.phase_seconds.items():
+            self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + seconds
+        return self
+
+    def to_dict(self):
+        """JSON serializable form, as returned by _evaluate_expression_stats_for_responses"""
+        stats = {name: getattr(self, name) for name in self.__slots__ if name != 'phase_seconds'}
+        stats['phase_seconds'] = {phase: round(seconds, 6) for phase, seconds in self.phase_seconds.items()}
+        stats['total_seconds'] = round(sum(self.phase_seconds.values()), 6)
+        return stats
+
+    def __repr__(self):
+        return f"EvaluationStats({self.to_dict()})"
@@ -0,0 +1,15 @@
+-- Python UDF naming the fast path an expression is evaluated with by _evaluate_expression_for_responses,
+-- or null if it's evaluated generically with eval (and may be worth a fast path if its shape is common)
+
+-- To stage the Python files (creates a zip bundle with all .py files in the directory):
+-- uv run stage_python.py dev schemas/impl_variable_expression/functions/
+
+-- Create the UDF referencing the uploaded Python bundle
+create or replace function impl_variable_expression._expression_fast_path(expression string)
+returns string
+language python
+immutable
+runtime_version = '3.13'
+imports = ('@impl_variable_expression.udf_stage/schemas/impl_variable_expression/functions/functions_bundle.zip')
+handler = '_expression_plan_cache.expression_fast_path'
+;
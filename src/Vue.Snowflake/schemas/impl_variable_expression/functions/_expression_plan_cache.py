@@ -0,0 +1,430 @@
+import ast
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional
+
+from _expression_shape import CONSTANT_PLACEHOLDER_PATTERN, ExpressionShape, parameterize_expression
+from _lru_cache import LruCache
+from _parse_python_expression import hoist_result_invariants
+
+# Example usage in SQL:
+# select impl_variable_expression._expression_fast_path('max(response.Rating(brand=result.brand), default=None)')
+
+# Thousands of expressions collapse into a few hundred shapes, see Example_expression_analysis.md
+EXPRESSION_PLAN_CACHE_SIZE = 512
+
+
+class AnswerCallSpec:
+    """
+    A `response.v1(v1e1=result.entity1, v1e2=[c1, c2])` call in a shape, in terms of the shape's generic names.
+    keyword_filters: [(generic keyword, generic result entity or None, constant placeholders or None), ...]
+    """
+    __slots__ = ('variable', 'keyword_filters')
+
+    def __init__(self, variable, keyword_filters):
+        self.variable = variable
+        self.keyword_filters = keyword_filters
+
+
+def _match_answer_call(node) -> Optional[AnswerCallSpec]:
+    if not (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and isinstance(node.func.value, ast.Name) and node.func.value.id == 'response'
+        and not node.args
+    ):
+        return None
+
+    keyword_filters = []
+    for keyword in node.keywords:
+        if keyword.arg is None:
+            return None  # **kwargs
+        value = keyword.value
+        if isinstance(value, ast.List) and len(value.elts) == 1 and isinstance(value.elts[0], ast.Attribute):
+            value = value.elts[0]
+        if isinstance(value, ast.Attribute) and isinstance(value.value, ast.Name) and value.value.id == 'result':
+            keyword_filters.append((keyword.arg, value.attr, None))
+            continue
+
+        constants = value.elts if isinstance(value, ast.List) else [value]
+        if not constants or not all(
+            isinstance(constant, ast.Name) and CONSTANT_PLACEHOLDER_PATTERN.fullmatch(constant.id) for constant in constants
+        ):
+            return None
+        keyword_filters.append((keyword.arg, None, [constant.id for constant in constants]))
+    return AnswerCallSpec(node.func.attr, keyword_filters)
+
+
+def _is_placeholder(node) -> bool:
+    return isinstance(node, ast.Name) and CONSTANT_PLACEHOLDER_PATTERN.fullmatch(node.id) is not None
+
+
+def _is_name(node, name) -> bool:
+    return isinstance(node, ast.Name) and node.id == name
+
+
+def _single_generator(node) -> Optional[ast.comprehension]:
+    """The `for x in ...` of a generator expression with exactly one, or None"""
+    if not (isinstance(node, ast.GeneratorExp) and len(node.generators) == 1):
+        return None
+    generator = node.generators[0]
+    if generator.is_async or not isinstance(generator.target, ast.Name):
+        return None
+    return generator
+
+
+def _match_exists(node) -> Optional[tuple]:
+    """`any(c1 for r in response.v1(...))` -> (AnswerCallSpec, 'c1')"""
+    if not (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name) and node.func.id == 'any'
+        and len(node.args) == 1 and not node.keywords
+    ):
+        return None
+    generator = _single_generator(node.args[0])
+    if generator is None or generator.ifs:
+        return None
+    element = node.args[0].elt
+    if not _is_placeholder(element):
+        return None
+    call = _match_answer_call(generator.iter)
+    return (call, element.id) if call is not None else None
+
+
+def _match_true_values_check(node, value_name) -> Optional[tuple]:
+    """
+    The checks _build_truevals_check generates for a metric's true values:
+    `v in (c1, c2)` -> ('in', ['c1', 'c2']), `c1 <= v <= c2` -> ('range', ['c1', 'c2'])
+    """
+    if not isinstance(node, ast.Compare):
+        return None
+    if (
+        len(node.ops) == 1 and isinstance(node.ops[0], ast.In)
+        and _is_name(node.left, value_name)
+        and isinstance(node.comparators[0], ast.Tuple) and node.comparators[0].elts
+        and all(_is_placeholder(element) for element in node.comparators[0].elts)
+    ):
+        return 'in', [element.id for element in node.comparators[0].elts]
+    if (
+        len(node.ops) == 2 and all(isinstance(op, ast.LtE) for op in node.ops)
+        and _is_placeholder(node.left)
+        and _is_name(node.comparators[0], value_name)
+        and _is_placeholder(node.comparators[1])
+    ):
+        return 'range', [node.left.id, node.comparators[1].id]
+    return None
+
+
+def _match_values(node) -> Optional[tuple]:
+    """
+    `response.v1(...)` -> (AnswerCallSpec, None)
+    `(v for v in response.v1(...) if v in (c1, c2))` (or a range check) -> (AnswerCallSpec, true values check)
+    """
+    call = _match_answer_call(node)
+    if call is not None:
+        return call, None
+    generator = _single_generator(node)
+    if generator is None or len(generator.ifs) != 1 or not _is_name(node.elt, generator.target.id):
+        return None
+    call = _match_answer_call(generator.iter)
+    check = _match_true_values_check(generator.ifs[0], generator.target.id)
+    return (call, check) if call is not None and check is not None else None
+
+
+def _match_score(node) -> Optional[tuple]:
+    """`c1` -> ('c1', False), `-c1` -> ('c1', True)"""
+    if _is_placeholder(node):
+        return node.id, False
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and _is_placeholder(node.operand):
+        return node.operand.id, True
+    return None
+
+
+def _match_scores(node, value_name) -> Optional[tuple]:
+    """
+    A score for each answer value, e.g. the nps `-c1 if c2 <= v <= c3 else c4 if v in (c5, c6) else c7`
+    -> ([(true values check, score), ...], score otherwise)
+    """
+    branches = []
+    while isinstance(node, ast.IfExp):
+        check = _match_true_values_check(node.test, value_name)
+        score = _match_score(node.body)
+        if check is None or score is None:
+            return None
+        branches.append((check, score))
+        node = node.orelse
+    otherwise = _match_score(node)
+    if not branches or otherwise is None:
+        return None
+    return branches, otherwise
+
+
+def _match_reduction(node) -> Optional[tuple]:
+    """
+    `any(<values>)`, `max(<values>, default=None)` or `min(...)` -> (reduction name, (AnswerCallSpec, true values check), None)
+    `max(<score> for v in <values>)` -> ('max_scored', (AnswerCallSpec, true values check), scores)
+    where <values> is a response call, optionally filtered to a metric's true values
+    """
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and len(node.args) == 1):
+        return None
+    reduction = node.func.id
+    if reduction == 'max' and not node.keywords:
+        generator = _single_generator(node.args[0])
+        if generator is None or generator.ifs:
+            return None
+        values = _match_values(generator.iter)
+        scores = _match_scores(node.args[0].elt, generator.target.id)
+        return ('max_scored', values, scores) if values is not None and scores is not None else None
+    if reduction == 'any':
+        if node.keywords:
+            return None
+    elif reduction in ('max', 'min'):
+        if not (
+            len(node.keywords) == 1 and node.keywords[0].arg == 'default'
+            and isinstance(node.keywords[0].value, ast.Constant) and node.keywords[0].value.value is None
+        ):
+            return None
+    else:
+        return None
+    values = _match_values(node.args[0])
+    return (reduction, values, None) if values is not None else None
+
+
+def _answer_lookup(variable_identifier, keyword_filters, shape: ExpressionShape) -> Callable:
+    """
+    Function (response, result) -> answer values, equivalent to evaluating `response.{variable_identifier}(...)`.
+    Looks up the QuestionVariable's index directly, rather than normalizing the keyword arguments on every call.
+    """
+    if not keyword_filters:
+        def lookup_all(response, result):
+            return getattr(response, variable_identifier)()
+        return lookup_all
+
+    keywords = tuple(shape.keywords[keyword] for keyword, _, _ in keyword_filters)
+    value_getters = []
+    for _, result_entity, constants in keyword_filters:
+        if result_entity is not None:
+            get_entity = attrgetter(shape.result_entities[result_entity])
+            value_getters.append(lambda result, get_entity=get_entity: [get_entity(result)])
+        else:
+            constant_values = [shape.constants[constant] for constant in constants]
+            value_getters.append(lambda result, constant_values=constant_values: constant_values)
+
+    if len(value_getters) == 1:
+        # By far the most common: e.g. response.Rating(brand=result.brand)
+        get_values = value_getters[0]
+
+        def lookup_one(response, result):
+            index, _ = getattr(response, variable_identifier).index_for(keywords)
+            return index[[get_values(result)]]
+        return lookup_one
+
+    def lookup(response, result):
+        index, keyword_positions = getattr(response, variable_identifier).index_for(keywords)
+        return index[[value_getters[position](result) for position in keyword_positions]]
+    return lookup
+
+
+def _true_values_predicate(check, shape: ExpressionShape) -> Callable:
+    """Function value -> whether it's one of the true values, precomputed from the check's constants"""
+    kind, placeholders = check
+    constants = [shape.constants[placeholder] for placeholder in placeholders]
+    if kind == 'in':
+        return frozenset(constants).__contains__
+    lo, hi = constants
+    return lambda v: lo <= v <= hi
+
+
+def _score_function(scores, shape: ExpressionShape) -> Optional[Callable]:
+    """Function value -> score, or None if a score isn't a number (so negating it would fail like eval does)"""
+    branches, otherwise = scores
+    score_values = []
+    for placeholder, negate in [score for _, score in branches] + [otherwise]:
+        value = shape.constants[placeholder]
+        if negate:
+            if not isinstance(value, (int, float)):
+                return None
+            value = -value
+        score_values.append(value)
+    branches = [(_true_values_predicate(check, shape), score) for (check, _), score in zip(branches, score_values)]
+    otherwise_score = score_values[-1]
+
+    def score(v):
+        for is_true_value, branch_score in branches:
+            if is_true_value(v):
+                return branch_score
+        return otherwise_score
+    return score
+
+
+def _reduction_evaluator(reduction, values, scores, shape: ExpressionShape) -> Optional[Callable]:
+    """Function (response, result) -> the reduction of the (true) answer values, the same as eval would give"""
+    call, check = values
+    lookup = _answer_lookup(shape.variables[call.variable], call.keyword_filters, shape)
+    if check is None:
+        get_values = lookup
+    elif reduction == 'any' and check[0] == 'in':
+        # any() of the true values only needs one that's truthy, e.g. yn with true values 0|1 is true only for a 1
+        truthy_true_values = frozenset(shape.constants[placeholder] for placeholder in check[1] if shape.constants[placeholder])
+        return lambda response, result: not truthy_true_values.isdisjoint(lookup(response, result))
+    else:
+        is_true_value = _true_values_predicate(check, shape)
+        get_values = lambda response, result: filter(is_true_value, lookup(response, result))
+
+    if reduction == 'any':
+        return lambda response, result: any(get_values(response, result))
+    if reduction == 'max':
+        return lambda response, result: max(get_values(response, result), default=None)
+    if reduction == 'min':
+        return lambda response, result: min(get_values(response, result), default=None)
+    score = _score_function(scores, shape)
+    if score is None:
+        return None
+    # Like eval, raises ValueError if there are no (true) values
+    return lambda response, result: max(map(score, get_values(response, result)))
+
+
+def _answer_reduction_fast_path(body) -> Optional[tuple]:
+    """
+    `any(<values>)`, `max(<values>, default=None)`, `min(...)` or `max(<score> for v in <values>)`,
+    optionally guarded by `... if any(c1 for r in response.v2(...)) else None` (e.g. a metric with a result dependent base).
+    <values> is a response call, optionally filtered to true values: everything build_metric_variable_expression generates.
+
+    Returns:
+        (fast path name, build) where build(ExpressionShape) gives an evaluator or None to fall back to eval
+    """
+    exists = None
+    if isinstance(body, ast.IfExp) and isinstance(body.orelse, ast.Constant) and body.orelse.value is None:
+        exists = _match_exists(body.test)
+        if exists is None:
+            return None
+        body = body.body
+    reduction = _match_reduction(body)
+    if reduction is None:
+        return None
+    reduction_name, values, scores = reduction
+
+    def build(shape: ExpressionShape):
+        evaluate_primary = _reduction_evaluator(reduction_name, values, scores, shape)
+        if evaluate_primary is None:
+            return None
+        if exists is None:
+            return lambda response, result, invariant_values: evaluate_primary(response, result)
+
+        exists_call, exists_element = exists
+        if not shape.constants[exists_element]:
+            return None  # any(0 for r in ...) is always False
+        base_lookup = _answer_lookup(shape.variables[exists_call.variable], exists_call.keyword_filters, shape)
+
+        def evaluate(response, result, invariant_values):
+            # any(c1 for r in answers) is just whether there are any answers
+            if not base_lookup(response, result):
+                return None
+            return evaluate_primary(response, result)
+        return evaluate
+
+    name = reduction_name
+    if values[1] is not None:
+        name += '_true_values'
+    if exists is not None:
+        name += '_if_exists'
+    return name, build
+
+
+# Tried in order against the shape's syntax tree, the first match wins
+FAST_PATHS = [
+    _answer_reduction_fast_path,
+]
+
+
+class ExpressionPlan:
+    """How to evaluate every expression of one shape: a fast path, or None to eval the expression itself"""
+    __slots__ = ('shape', 'fast_path', 'build', 'expression_count')
+
+    def __init__(self, shape, fast_path=None, build=None):
+        self.shape = shape
+        self.fast_path = fast_path
+        # Takes the expression's ExpressionShape, returns an evaluator (response, result, invariant_values) or None
+        self.build = build
+        self.expression_count = 0
+
+    @classmethod
+    def for_shape(cls, shape):
+        try:
+            body = ast.parse(shape, mode='eval').body
+        except SyntaxError:
+            return cls(shape)
+        for fast_path in FAST_PATHS:
+            matched = fast_path(body)
+            if matched is not None:
+                return cls(shape, *matched)
+        return cls(shape)
+
+
+class ExpressionPlanCache:
+    """
+    Plans keyed by expression shape, so expressions that differ only in variable names, entity names and constants
+    share one fast path evaluator, parameterized by what makes each of them different.
+
+    Examples:
+        >>> cache = ExpressionPlanCache(max_size=10)
+        >>> evaluate_rating = cache.fast_evaluator('max(response.Rating(brand=result.brand), default=None)')
+        >>> evaluate_score = cache.fast_evaluator('max(response.Score(product=result.product), default=None)')  # Same plan
+        >>> cache.stats()['shapes'][0]['expression_count']
+        2
+    """
+
+    def __init__(self, max_size: int):
+        self._plans = LruCache(max_size)
+
+    def _plan(self, shape: ExpressionShape) -> ExpressionPlan:
+        return self._plans.get_or_create(shape.shape, lambda: ExpressionPlan.for_shape(shape.shape))
+
+    def plan(self, expression) -> Optional[ExpressionPlan]:
+        """The expression's plan, or None if it can't be parsed"""
+        shape = parameterize_expression(expression)
+        return self._plan(shape) if shape is not None else None
+
+    def fast_evaluator(self, expression) -> Optional[Callable]:
+        """
+        Evaluator (response, result, invariant_values) for the expression from its shape's fast path,
+        or None if it has to be evaluated generically with eval.
+        """
+        shape = parameterize_expression(expression)
+        if shape is None:
+            return None
+        plan = self._plan(shape)
+        plan.expression_count += 1
+        return plan.build(shape) if plan.build is not None else None
+
+    def resize(self, max_size: int) -> None:
+        self._plans.resize(max_size)
+
+    def clear(self) -> None:
+        self._plans.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters, and each cached shape with its fast path (None for generic eval), most used first."""
+        shapes: List[Dict[str, Any]] = sorted(
+            (
+                {"shape": plan.shape, "fast_path": plan.fast_path, "expression_count": plan.expression_count}
+                for plan in self._plans.values()
+            ),
+            key=lambda shape: -shape["expression_count"],
+        )
+        return {**self._plans.stats(), "shapes": shapes}
+
+
+def expression_fast_path(expression):
+    """
+    Name of the fast path the expression is evaluated with, or None if it's evaluated with eval.
+    Like the evaluation itself, only the part of the expression evaluated per entity combination is considered,
+    since result independent parts are hoisted and evaluated once per respondent anyway.
+    Handler for impl_variable_expression._expression_fast_path
+    """
+    if not expression or expression.strip() == "":
+        return None
+    hoisted = hoist_result_invariants(expression)
+    if hoisted is None:
+        return None
+    plan = ExpressionPlanCache(max_size=1).plan(hoisted.expression)
+    return plan.fast_path if plan is not None else None
@@ -0,0 +1,202 @@
+import ast
+import re
+from collections import defaultdict
+from typing import Any, Dict, NamedTuple, Optional
+
+# Example usage in SQL:
+# select impl_variable_expression._extract_expression_shape('any(response.Rating(brand=result.brand))')
+
+CONSTANT_PLACEHOLDER_PATTERN = re.compile(r'c\d+')
+
+
+class ShapeNormalizer(ast.NodeTransformer):
+    """
+    AST NodeTransformer that normalizes variable names and entity references
+    to generic names for expression shape extraction.
+
+    With parameterize_constants, every constant (other than None and booleans) is also replaced with a placeholder name c1, c2...
+    and the maps of generic names to actual ones are kept, so the shape plus the parameters give back the original expression.
+    """
+
+    def __init__(self, parameterize_constants=False):
+        self.parameterize_constants = parameterize_constants
+        self.var_map = {}  # Maps actual var names to v1, v2, etc.
+        self.var_counter = 0
+        self.keyword_arg_map = defaultdict(dict)  # Maps keyword args to e1, e2, etc. per variable
+        self.keyword_arg_counter = defaultdict(int)  # Counter per variable
+        self.result_entity_map = {}  # Maps actual result entities to entity1, entity2, etc.
+        self.result_entity_counter = 0
+        self.constant_map = {}  # Maps placeholder names to constant values, when parameterizing
+
+    def _result_entity_node(self, actual_result_entity, ctx):
+        if actual_result_entity not in self.result_entity_map:
+            self.result_entity_counter += 1
+            self.result_entity_map[actual_result_entity] = f"entity{self.result_entity_counter}"
+        return ast.Attribute(
+            value=ast.Name(id='result', ctx=ast.Load()),
+            attr=self.result_entity_map[actual_result_entity],
+            ctx=ctx
+        )
+
+    def _constant_placeholder_node(self, value):
+        placeholder = f"c{len(self.constant_map) + 1}"
+        self.constant_map[placeholder] = value
+        return ast.Name(id=placeholder, ctx=ast.Load())
+
+    def visit_Call(self, node):
+        # Handle response.var(...) pattern
+        if (isinstance(node.func, ast.Attribute) and
+            isinstance(node.func.value, ast.Name) and
+            node.func.value.id == 'response'):
+
+            actual_var = node.func.attr
+
+            # Get or create normalized variable name
+            if actual_var not in self.var_map:
+                self.var_counter += 1
+                self.var_map[actual_var] = f"v{self.var_counter}"
+
+            normalized_var = self.var_map[actual_var]
+
+            # Create new normalized call
+            new_node = ast.Call(
+                func=ast.Attribute(
+                    value=ast.Name(id='response', ctx=ast.Load()),
+                    attr=normalized_var,
+                    ctx=ast.Load()
+                ),
+                args=[self.visit(arg) for arg in node.args],
+                keywords=[]
+            )
+
+            # Process keyword arguments (entity filters)
+            for kw in node.keywords:
+                if kw.arg is None:
+                    # **kwargs
+                    new_node.keywords.append(ast.keyword(arg=None, value=self.visit(kw.value)))
+                    continue
+
+                # Normalize the keyword argument name
+                actual_kwarg = kw.arg
+                if actual_kwarg not in self.keyword_arg_map[normalized_var]:
+                    self.keyword_arg_counter[normalized_var] += 1
+                    self.keyword_arg_map[normalized_var][actual_kwarg] = f"{normalized_var}e{self.keyword_arg_counter[normalized_var]}"
+                normalized_kwarg = self.keyword_arg_map[normalized_var][actual_kwarg]
+
+                is_list = isinstance(kw.value, ast.List)
+                values = kw.value.elts if is_list else [kw.value]
+                normalized_values = []
+                for value in values:
+                    if isinstance(value, ast.Constant) and isinstance(value.value, int) and not self.parameterize_constants:
+                        # Replace all integers with 1
+                        normalized_values.append(ast.Constant(value=1))
+                    elif (isinstance(value, ast.Attribute) and
+                          isinstance(value.value, ast.Name) and
+                          value.value.id == "result"):
+                        # Normalize result.entity references
+                        normalized_values.append(self._result_entity_node(value.attr, ast.Load()))
+                    else:
+                        # Keep other values as-is, but visit them recursively
+                        normalized_values.append(self.visit(value))
+
+                # Add keyword with normalized keyword name and values
+                if is_list:
+                    normalized_value = ast.List(elts=normalized_values, ctx=ast.Load())
+                else:
+                    normalized_value = normalized_values[0]
+                new_node.keywords.append(ast.keyword(arg=normalized_kwarg, value=normalized_value))
+
+            return ast.copy_location(new_node, node)
+
+        # For other calls, recurse normally
+        return self.generic_visit(node)
+
+    def visit_Attribute(self, node):
+        # Handle result.entity references anywhere in the expression
+        if isinstance(node.value, ast.Name) and node.value.id == 'result':
+            return ast.copy_location(self._result_entity_node(node.attr, node.ctx), node)
+
+        # For other attributes, recurse normally
+        return self.generic_visit(node)
+
+    def visit_Constant(self, node):
+        if (
+            self.parameterize_constants
+            and node.value is not None and not isinstance(node.value, bool)
+            and isinstance(node.value, (int, float, str))
+        ):
+            return ast.copy_location(self._constant_placeholder_node(node.value), node)
+        return node
+
+
+def extract_expression_shape(expression):
+    """
+    Parses the expression and returns a normalized shape string with generic names.
+
+    Examples:
+        response.age(entity=1) -> response.v1(v1e1=1)
+        response.age(entity=[1, 2, 3]) -> response.v1(v1e1=[1, 1, 1])
+        sum(response.score(entity=result.brand)) -> sum(response.v1(v1e1=result.entity1))
+        response.q1(entity=1) + response.q2(entity=1) -> response.v1(v1e1=1) + response.v2(v2e1=1)
+        response.q1(brand=1, category=2) -> response.v1(v1e1=1, v1e2=1)
+        result.brand == 1 -> result.entity1 == 1
+        response.score(entity=result.brand) if result.category == 1 else 0
+            -> response.v1(v1e1=result.entity2) if result.entity1 == 1 else 0  (the condition is visited first)
+    """
+    if not expression or expression.strip() == "":
+        return ""
+
+    try:
+        tree = ast.parse(expression, mode='eval')
+        normalizer = ShapeNormalizer()
+        normalized_tree = normalizer.visit(tree)
+        ast.fix_missing_locations(normalized_tree)
+        return ast.unparse(normalized_tree)
+    except Exception as e:
+        return f"ERROR: {str(e)}"
+
+
+class ExpressionShape(NamedTuple):
+    """An expression split into its shape and the names and constants that were taken out of it"""
+    # e.g. `max(response.v1(v1e1=result.entity1, v1e2=[c1, c2]), default=None)`
+    shape: str
+    # Generic name -> actual name, e.g. {'v1': 'Rating'}, {'v1e1': 'brand'}, {'entity1': 'brand'}
+    variables: Dict[str, str]
+    keywords: Dict[str, str]
+    result_entities: Dict[str, str]
+    # Placeholder name -> value, e.g. {'c1': 10, 'c2': 20}
+    constants: Dict[str, Any]
+
+
+def parameterize_expression(expression) -> Optional[ExpressionShape]:
+    """
+    Split an expression into a shape shared by every expression that differs only in variable names, entity names
+    and constants, and the parameters that make it this expression.
+    Returns None if the expression can't be parsed, or already uses names that look like constant placeholders.
+
+    Examples:
+        >>> parameterize_expression('max(response.Rating(brand=result.brand, product=[10, 20]), default=None)').shape
+        'max(response.v1(v1e1=result.entity1, v1e2=[c1, c2]), default=None)'
+    """
+    if not expression or expression.strip() == "":
+        return None
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError:
+        return None
+    if any(isinstance(node, ast.Name) and CONSTANT_PLACEHOLDER_PATTERN.fullmatch(node.id) for node in ast.walk(tree)):
+        return None
+
+    normalizer = ShapeNormalizer(parameterize_constants=True)
+    normalized_tree = ast.fix_missing_locations(normalizer.visit(tree))
+    return ExpressionShape(
+        shape=ast.unparse(normalized_tree),
+        variables={generic: actual for actual, generic in normalizer.var_map.items()},
+        keywords={
+            generic: actual
+            for keyword_map in normalizer.keyword_arg_map.values()
+            for actual, generic in keyword_map.items()
+        },
+        result_entities={generic: actual for actual, generic in normalizer.result_entity_map.items()},
+        constants=dict(normalizer.constant_map),
+    )
@@ -0,0 +1,16 @@
+-- Python UDF to extract normalized expression shape for analysis
+-- Replaces actual variable names and entity IDs with generic placeholders
+-- to identify common expression patterns, see Example_expression_analysis.md
+
+-- To stage the Python files (creates a zip bundle with all .py files in the directory):
+-- uv run stage_python.py dev schemas/impl_variable_expression/functions/
+
+-- Create the UDF referencing the uploaded Python bundle
+create or replace function impl_variable_expression._extract_expression_shape(expression string)
+returns string
+language python
+immutable
+runtime_version = '3.13'
+imports = ('@impl_variable_expression.udf_stage/schemas/impl_variable_expression/functions/functions_bundle.zip')
+handler = '_expression_shape.extract_expression_shape'
+;
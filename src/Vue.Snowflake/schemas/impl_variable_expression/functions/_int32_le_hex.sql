@@ -0,0 +1,18 @@
+-- Hex of an integer as a little-endian two's complement int32, for packing answers in _variable_answer_arrays.
+-- Null is packed as -2^31 (see PACKED_NULL in _answer_columns.py), so the caller must check values are otherwise in range.
+create or replace function impl_variable_expression._int32_le_hex(value integer)
+returns varchar
+language sql
+immutable
+as
+$$
+    iff(
+        value is null,
+        '00000080',
+        regexp_replace(
+            lpad(trim(to_char(iff(value < 0, value + 4294967296, value), 'XXXXXXXX')), 8, '0'),
+            '(..)(..)(..)(..)',
+            '\\4\\3\\2\\1'
+        )
+    )
+$$;
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List
+
+
+class LruCache:
+    """
+    A bounded least-recently-used cache with hit/miss/eviction counters.
+    Module-level instances live for as long as the UDF's Python process, so are shared across invocations (rows/partitions).
+
+    Examples:
+        >>> cache = LruCache(max_size=2)
+        >>> cache.get_or_create('a', lambda: 1)
+        1
+        >>> cache.get_or_create('a', lambda: 2)  # Already cached
+        1
+        >>> cache.stats()['hits']
+        1
+    """
+
+    def __init__(self, max_size: int):
+        """
+        Args:
+            max_size: Maximum number of entries to keep before evicting the least recently used
+        """
+        if max_size < 1:
+            raise ValueError(f"max_size must be at least 1, got {max_size}")
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    def resize(self, max_size: int) -> None:
+        """Change the size limit, evicting the least recently used entries if now over it."""
+        if max_size < 1:
+            raise ValueError(f"max_size must be at least 1, got {max_size}")
+        self._max_size = max_size
+        self._evict_over_limit()
+
+    def get_or_create(self, key: Hashable, create: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for key, calling create() to make it on a miss.
+        If create() raises, nothing is cached and the exception propagates.
+        """
+        entries = self._entries
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+
+        self.misses += 1
+        value = create()
+        entries[key] = value
+        self._evict_over_limit()
+        return value
+
+    def _evict_over_limit(self) -> None:
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def values(self) -> List[Any]:
+        """The cached values, least recently used first."""
+        return list(self._entries.values())
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for debugging cache effectiveness."""
+        return {
+            "size": len(self._entries),
+            "max_size": self._max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"LruCache({self.stats()!r})"
@@ -1,4 +1,5 @@
-from typing import Any, List, Dict
+from bisect import bisect_left, bisect_right
+from typing import Any, List, Dict, Sequence
 
 
 class NestedDict:
@@ -125,3 +126,103 @@ class NestedDict:
     def __len__(self) -> int:
         """Return count of entries at the first level."""
         return len(self._data)
+
+
+class SortedIndex:
+    """
+    Same lookups as NestedDict, but over key columns that are already sorted, so there's nothing to build.
+    Each requested key is found with a binary search narrowing the range searched for the next key.
+
+    Answers from _variable_answer_arrays are aggregated in order of asked_entity_id_1, asked_entity_id_2, asked_entity_id_3,
+    so this applies whenever the keys are a prefix of that order. Most variables are only queried a few times per respondent,
+    so hashing every answer into a NestedDict costs more than the lookups. Use NestedDict for any other key order.
+
+    Examples:
+        >>> index = SortedIndex(key_columns=[[1, 1, 1, 2], [10, 10, 20, 10]], values=['a', 'b', 'c', 'd'])
+        >>> index[[1], [10, 20]]
+        ['a', 'b', 'c']
+        >>> index[[1, 2], [10]]
+        ['a', 'b', 'd']
+    """
+
+    def __init__(self, key_columns: List[Sequence[Any]], values: Sequence[Any]):
+        """
+        Args:
+            key_columns: Columns to use as keys (in nesting order), sorted by the first column, then the second and so on.
+                         Must not contain None since it can't be compared with other keys.
+            values: Value for each row of the key columns
+        """
+        self._key_columns = key_columns
+        self._values = values
+        self._depth = len(key_columns)
+
+    def __getitem__(self, key_values: List[List[Any]]) -> List[Any]:
+        """
+        Lookup values by providing a list of possible values for each dimension.
+        Values are returned in the same order as NestedDict would return them.
+
+        Args:
+            key_values: List of lists, where each inner list contains possible values
+                       for that key level. Must match the number of key_columns.
+
+        Returns:
+            Flat list of all matching values
+        """
+        if len(key_values) != self._depth:
+            raise ValueError(
+                f"Expected {self._depth} key dimensions, got {len(key_values)}"
+            )
+        if not self._depth:
+            return list(self._values)
+        result = []
+        self._lookup(key_values, 0, 0, len(self._values), result)
+        return result
+
+    def _lookup(self, key_values: List[List[Any]], depth: int, lo: int, hi: int, result: List[Any]) -> None:
+        """Append the values for the requested keys within rows lo to hi, which all match the keys for earlier depths."""
+        column = self._key_columns[depth]
+        is_final_level = depth == self._depth - 1
+        for key in key_values[depth]:
+            try:
+                start = bisect_left(column, key, lo, hi)
+            except TypeError:
+                # Not comparable with the keys (e.g. None) so can't match any of them
+                continue
+            end = bisect_right(column, key, start, hi)
+            if start == end:
+                continue
+            if is_final_level:
+                result.extend(self._values[start:end])
+            else:
+                self._lookup(key_values, depth + 1, start, end, result)
+
+    def get(self, key_values: List[List[Any]], default: Any = None) -> List[Any]:
+        """
+        Get values with a default fallback.
+
+        Args:
+            key_values: List of lists for lookup
+            default: Value to return if lookup fails or finds nothing
+
+        Returns:
+            List of matching values or default
+        """
+        try:
+            result = self[key_values]
+            return result if result else default
+        except (KeyError, ValueError):
+            return default
+
+    def __repr__(self) -> str:
+        return f"SortedIndex(depth={self._depth}, rows={len(self._values)})"
+
+    def __len__(self) -> int:
+        """Return count of distinct keys at the first level."""
+        if not self._depth:
+            return len(self._values)
+        column = self._key_columns[0]
+        count, start, end = 0, 0, len(column)
+        while start < end:
+            count += 1
+            start = bisect_right(column, column[start], start, end)
+        return count
@@ -1,5 +1,6 @@
 import ast
 from collections import defaultdict
+from typing import List, NamedTuple, Optional, Tuple
 
 # Example usage in SQL:
 # select impl_variable_expression._parse_python_expression('any(response.some_variable(result.some_entity))')
@@ -18,6 +19,10 @@ class DependencyCollector(ast.NodeVisitor):
             'result': self.entity_identifiers,
             'response': self.variable_identifiers
         }
+        # Plain names, e.g. `v` and `response` in `any(v for v in response.x())`
+        self.loaded_names = set()
+        self.bound_names = set()
+        self.has_named_expression = False
     
     def visit_Attribute(self, node):
         """Collect attrs from attribute access of form {value: Expr}.{attr: Name}"""
@@ -28,6 +33,24 @@ class DependencyCollector(ast.NodeVisitor):
             if identifier_set is not None:
                 identifier_set.add(node.attr)
 
+    def visit_Name(self, node):
+        names = self.loaded_names if isinstance(node.ctx, ast.Load) else self.bound_names
+        names.add(node.id)
+
+    def visit_arg(self, node):
+        """Lambda arguments"""
+        self.bound_names.add(node.arg)
+
+    def visit_NamedExpr(self, node):
+        self.has_named_expression = True
+        super().generic_visit(node)
+
+
+def collect_dependencies(node):
+    collector = DependencyCollector()
+    collector.visit(node)
+    return collector
+
 def parse_expression(expression):
     """
     Parse a Python expression and extract entity and variable dependencies.
@@ -58,3 +81,187 @@ def parse_expression(expression):
             "result_entity_identifiers": [],
             "dependency_variable_identifiers": []
         }
+
+
+# Builtins whose result can be reused between evaluations, unlike e.g. map/filter/zip which return single-use iterators
+_REUSABLE_RESULT_BUILTINS = {
+    'abs', 'all', 'any', 'bool', 'float', 'int', 'len', 'list', 'max', 'min', 'round', 'set', 'sorted', 'str', 'sum', 'tuple'
+}
+
+
+def _returns_reusable_value(node):
+    """Conservatively check the node can't evaluate to something single-use like a generator"""
+    if isinstance(node, ast.Call):
+        func = node.func
+        return (
+            (isinstance(func, ast.Name) and func.id in _REUSABLE_RESULT_BUILTINS)
+            or (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == 'response')
+        )
+    if isinstance(node, (ast.Compare, ast.UnaryOp, ast.BinOp, ast.Subscript, ast.Constant)):
+        return True
+    if isinstance(node, ast.BoolOp):
+        return all(_returns_reusable_value(value) for value in node.values)
+    if isinstance(node, ast.IfExp):
+        return _returns_reusable_value(node.body) and _returns_reusable_value(node.orelse)
+    return False
+
+
+class ResultInvariantHoister(ast.NodeTransformer):
+    """
+    Replaces the largest subexpressions that don't depend on `result` with `{invariant_name}(i)`.
+    The caller evaluates (and memoizes) these once per respondent rather than once per entity combination.
+    e.g. `max(response.v(brand=result.brand), default=None) if any(1 for r in response.base()) else None`
+    ->   `max(response.v(brand=result.brand), default=None) if _invariant(0) else None`
+    """
+
+    def __init__(self, invariant_name, expression_bound_names):
+        self.invariant_name = invariant_name
+        self.expression_bound_names = expression_bound_names
+        self.invariant_expressions = []
+
+    def _is_hoistable(self, node):
+        if isinstance(node, (ast.Name, ast.Attribute)) or not _returns_reusable_value(node):
+            return False
+        collector = collect_dependencies(node)
+        free_names = collector.loaded_names - collector.bound_names
+        return (
+            'response' in collector.loaded_names
+            and 'result' not in collector.loaded_names
+            # e.g. `v == 1` within `any(v for v in ...)` depends on the comprehension
+            and not (free_names & self.expression_bound_names)
+        )
+
+    def visit(self, node):
+        if isinstance(node, ast.expr) and self._is_hoistable(node):
+            self.invariant_expressions.append(ast.unparse(node))
+            return ast.copy_location(
+                ast.Call(
+                    func=ast.Name(id=self.invariant_name, ctx=ast.Load()),
+                    args=[ast.Constant(value=len(self.invariant_expressions) - 1)],
+                    keywords=[]
+                ),
+                node
+            )
+        return super().visit(node)
+
+
+def _is_response_call(node):
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and isinstance(node.func.value, ast.Name) and node.func.value.id == 'response'
+    )
+
+
+def _result_entity(node):
+    """`result.brand` or `[result.brand]` -> 'brand'"""
+    if isinstance(node, ast.List) and len(node.elts) == 1:
+        node = node.elts[0]
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == 'result':
+        return node.attr
+    return None
+
+
+def _calls_that_empty_iterable(node):
+    """Response calls which, when they return no answers, make the iterable node empty"""
+    if _is_response_call(node):
+        return [node]
+    if isinstance(node, (ast.GeneratorExp, ast.ListComp, ast.SetComp)):
+        # Later generators may depend on the first one's variable, so only the first is certain
+        return _calls_that_empty_iterable(node.generators[0].iter)
+    return []
+
+
+def _calls_that_make_none(node):
+    """Response calls which, when they return no answers, make the expression None"""
+    if isinstance(node, ast.IfExp) and isinstance(node.orelse, ast.Constant) and node.orelse.value is None:
+        return _calls_that_make_none(node.body)
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name) and node.func.id in ('max', 'min')
+        and len(node.args) == 1
+        and len(node.keywords) == 1 and node.keywords[0].arg == 'default'
+        and isinstance(node.keywords[0].value, ast.Constant) and node.keywords[0].value.value is None
+    ):
+        return _calls_that_empty_iterable(node.args[0])
+    return []
+
+
+def required_answer_bindings(node):
+    """
+    Find entity filters that must match an answer for the expression to be anything but None.
+    e.g. `max(response.Rating(brand=result.brand), default=None)` is None for any brand the respondent didn't rate,
+    so gives [('Rating', [('brand', 'brand')])]
+
+    Returns:
+        List of (variable_identifier, [(variable entity identifier, result entity identifier), ...])
+    """
+    bindings = []
+    for call in _calls_that_make_none(node):
+        if any(keyword.arg is None for keyword in call.keywords):
+            continue  # **kwargs
+        entity_bindings = [
+            (keyword.arg, result_entity)
+            for keyword in call.keywords
+            if (result_entity := _result_entity(keyword.value)) is not None
+        ]
+        if entity_bindings:
+            bindings.append((call.func.attr, entity_bindings))
+    return bindings
+
+
+class HoistedExpression(NamedTuple):
+    """An expression split into parts evaluated once per respondent, and the remainder evaluated per entity combination"""
+    # Expression with arguments (response, result, {invariant_name}), where {invariant_name}(i) gives invariant_expressions[i]
+    expression: str
+    invariant_name: str
+    # Expressions with the single argument (response)
+    invariant_expressions: List[str]
+    # When set, the original expression was `expression if {invariant_name}(guard_index) else None`
+    guard_index: Optional[int]
+    # When false, every entity combination gets the same value
+    depends_on_result: bool
+    # See required_answer_bindings
+    required_answer_bindings: List[Tuple[str, List[Tuple[str, str]]]]
+
+
+def hoist_result_invariants(expression):
+    """
+    Split out the parts of an expression that are the same for every entity combination of a respondent.
+    Returns None if the expression can't be analysed, in which case it should be evaluated as-is.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError:
+        return None
+
+    collector = collect_dependencies(tree)
+    if collector.has_named_expression or 'response' in collector.bound_names or 'result' in collector.bound_names:
+        # Rewriting could change what names refer to
+        return None
+
+    all_names = collector.loaded_names | collector.bound_names
+    invariant_name = '_invariant'
+    while invariant_name in all_names:
+        invariant_name += '_'
+
+    hoister = ResultInvariantHoister(invariant_name, collector.bound_names)
+    body = hoister.visit(tree.body)
+
+    guard_index = None
+    if (
+        isinstance(body, ast.IfExp)
+        and isinstance(body.orelse, ast.Constant) and body.orelse.value is None
+        and isinstance(body.test, ast.Call) and isinstance(body.test.func, ast.Name) and body.test.func.id == invariant_name
+    ):
+        guard_index = body.test.args[0].value
+        body = body.body
+
+    return HoistedExpression(
+        expression=ast.unparse(body),
+        invariant_name=invariant_name,
+        invariant_expressions=hoister.invariant_expressions,
+        guard_index=guard_index,
+        depends_on_result='result' in collector.loaded_names,
+        required_answer_bindings=required_answer_bindings(body),
+    )
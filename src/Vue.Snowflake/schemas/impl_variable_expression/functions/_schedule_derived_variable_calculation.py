@@ -0,0 +1,311 @@
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Enough to keep a warehouse busy without queueing most of the jobs
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_VARIABLES_PER_BATCH = 20
+
+
+def dependency_levels(variable_identifiers: Iterable[str], dependency_mappings: Iterable[Tuple[str, str]]) -> List[List[str]]:
+    """
+    Group variables into levels so each variable only depends on variables in earlier levels.
+    Everything within a level is independent, so can be calculated at the same time.
+    Dependencies outside variable_identifiers (e.g. question variables) are assumed to already have answers.
+
+    Args:
+        variable_identifiers: Variables to calculate
+        dependency_mappings: (variable_identifier, dependency_variable_identifier) pairs, as in _derived_variable_dependency_mappings
+
+    Returns:
+        Levels in calculation order, each a sorted list of variable identifiers
+
+    Examples:
+        >>> dependency_levels(['a', 'b', 'c'], [('c', 'a'), ('c', 'b'), ('b', 'a'), ('a', 'Age')])
+        [['a'], ['b'], ['c']]
+    """
+    variable_identifiers = set(variable_identifiers)
+    dependencies = {variable_identifier: set() for variable_identifier in variable_identifiers}
+    dependents = {variable_identifier: set() for variable_identifier in variable_identifiers}
+    for variable_identifier, dependency_variable_identifier in dependency_mappings:
+        if (
+            variable_identifier in variable_identifiers
+            and dependency_variable_identifier in variable_identifiers
+            and dependency_variable_identifier != variable_identifier
+        ):
+            dependencies[variable_identifier].add(dependency_variable_identifier)
+            dependents[dependency_variable_identifier].add(variable_identifier)
+
+    remaining_dependency_counts = {variable_identifier: len(deps) for variable_identifier, deps in dependencies.items()}
+    level = sorted(variable_identifier for variable_identifier, count in remaining_dependency_counts.items() if count == 0)
+    levels = []
+    while level:
+        levels.append(level)
+        next_level = []
+        for variable_identifier in level:
+            for dependent in dependents[variable_identifier]:
+                remaining_dependency_counts[dependent] -= 1
+                if remaining_dependency_counts[dependent] == 0:
+                    next_level.append(dependent)
+        level = sorted(next_level)
+
+    scheduled_count = sum(len(level) for level in levels)
+    if scheduled_count != len(variable_identifiers):
+        cyclic = sorted(variable_identifier for variable_identifier, count in remaining_dependency_counts.items() if count > 0)
+        raise ValueError(f"Dependency cycle between (or depending on) variables: {', '.join(cyclic)}")
+    return levels
+
+
+def is_error_result(result) -> bool:
+    """Whether a result of _update_derived_variable_answers (see _ResultRowJob) means the variable wasn't calculated"""
+    return result is None or result.startswith("Error")
+
+
+def run_levels(
+    levels: List[List[str]],
+    submit: Callable[[str], Any],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    poll_interval_seconds: float = 1.0,
+    clock: Callable[[], float] = time.monotonic,
+    sleep: Callable[[float], None] = time.sleep,
+    dependencies: Optional[Dict[str, Iterable[str]]] = None,
+    is_failure: Callable[[Any], bool] = is_error_result,
+    batch: Callable[[List[str]], Iterable[List[str]]] = lambda variable_identifiers: ([v] for v in variable_identifiers),
+) -> List[Dict[str, Any]]:
+    """
+    Run each level's variables concurrently, with at most max_concurrency jobs in flight, waiting for a level to finish before the next.
+    Variables depending on one that failed (or was skipped) in an earlier level are skipped, as they'd be missing its answers.
+
+    Args:
+        levels: As returned by dependency_levels
+        submit: Starts calculating a list of variables, returning a job with is_done() and result(), the latter giving
+            each variable's result, e.g. a wrapped Snowpark AsyncJob
+        max_concurrency: Maximum number of jobs running at once
+        dependencies: Variables each variable depends on
+        is_failure: Whether a variable's result means it failed
+        batch: Splits the variables of a level to calculate into the lists submitted, by default one each
+
+    Returns:
+        Per level timing: [{"level": 0, "variable_count": 3, "seconds": 1.5, "results": {variable_identifier: result},
+        "skipped": {variable_identifier: [failed dependencies]}}, ...]
+    """
+    if max_concurrency < 1:
+        raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+
+    dependencies = dependencies or {}
+    failed = set()
+    level_timings = []
+    for level_index, level in enumerate(levels):
+        level_start = clock()
+        skipped = {}
+        for variable_identifier in level:
+            failed_dependencies = sorted(set(dependencies.get(variable_identifier, ())) & failed)
+            if failed_dependencies:
+                skipped[variable_identifier] = failed_dependencies
+        waiting = deque(batch([variable_identifier for variable_identifier in level if variable_identifier not in skipped]))
+        running = {}
+        results = {}
+        while waiting or running:
+            while waiting and len(running) < max_concurrency:
+                variable_identifiers = tuple(waiting.popleft())
+                running[variable_identifiers] = submit(list(variable_identifiers))
+
+            finished = [variable_identifiers for variable_identifiers, job in running.items() if job.is_done()]
+            for variable_identifiers in finished:
+                results.update(running.pop(variable_identifiers).result())
+            if not finished:
+                sleep(poll_interval_seconds)
+
+        failed.update(skipped)
+        failed.update(variable_identifier for variable_identifier, result in results.items() if is_failure(result))
+        seconds = clock() - level_start
+        logger.info(f"Level {level_index}: {len(level)} variables ({len(skipped)} skipped) in {seconds:.1f}s")
+        level_timings.append({
+            "level": level_index,
+            "variable_count": len(level),
+            "seconds": round(seconds, 3),
+            "results": results,
+            "skipped": skipped,
+        })
+    return level_timings
+
+
+def _procedure_result(rows):
+    """The single value a procedure returns, e.g. 'Processed 10 rows' or 'Error: ...' from _update_derived_variable_answers"""
+    return rows[0][0] if rows else None
+
+
+def _variables_results(variable_identifiers, outcome) -> Dict[str, str]:
+    """
+    Each variable's result from what _update_derived_variable_answers_for_variables returns, in the same form as
+    _update_derived_variable_answers' results
+    """
+    if isinstance(outcome, str):
+        outcome = json.loads(outcome)
+    if not outcome or "error" in outcome:
+        error = outcome.get("error") if outcome else "no result"
+        return {variable_identifier: f"Error: {error}" for variable_identifier in variable_identifiers}
+
+    results = {}
+    for variable_identifier in variable_identifiers:
+        if variable_identifier in outcome["errors"]:
+            results[variable_identifier] = f"Error: {outcome['errors'][variable_identifier]}"
+        elif variable_identifier in outcome["rows_written"]:
+            results[variable_identifier] = f"Processed {outcome['rows_written'][variable_identifier]} rows"
+        else:
+            results[variable_identifier] = "Error: Not an expression variable"
+    return results
+
+
+class _ResultRowJob:
+    """Wraps a Snowpark AsyncJob for a procedure call so result() gives each of its variables' result"""
+    __slots__ = ('_job', '_variable_identifiers', '_results')
+
+    def __init__(self, job, variable_identifiers, results=lambda variable_identifiers, value: {variable_identifiers[0]: value}):
+        self._job = job
+        self._variable_identifiers = variable_identifiers
+        self._results = results
+
+    def is_done(self):
+        return self._job.is_done()
+
+    def result(self):
+        try:
+            return self._results(self._variable_identifiers, _procedure_result(self._job.result()))
+        except Exception as e:
+            # Same form as errors _update_derived_variable_answers catches itself, so one failed call doesn't stop the rest
+            return {variable_identifier: f"Error: {e}" for variable_identifier in self._variable_identifiers}
+
+
+def batch_python_variables(variable_identifiers, evaluated_in_python, variables_per_batch):
+    """
+    Split a level's variables into batches of up to variables_per_batch of those evaluated in Python,
+    which _update_derived_variable_answers_for_variables evaluates from one pass over the answers,
+    and single variables for the rest
+
+    Args:
+        variable_identifiers: Variables of a level
+        evaluated_in_python: Variables whose expressions are evaluated in Python rather than transpiled to SQL
+        variables_per_batch: Most variables per batch, 1 or less for no batching
+    """
+    python_variables = [v for v in variable_identifiers if v in evaluated_in_python] if variables_per_batch > 1 else []
+    for i in range(0, len(python_variables), variables_per_batch):
+        yield python_variables[i:i + variables_per_batch]
+    for variable_identifier in variable_identifiers:
+        if variable_identifier not in python_variables:
+            yield [variable_identifier]
+
+
+def calculate_derived_variables_by_level(
+    session,
+    response_set_id,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    only_uncalculated=True,
+    variables_per_batch=DEFAULT_VARIABLES_PER_BATCH,
+):
+    """
+    Handler for impl_variable_expression._calculate_derived_variables_by_level.
+    Calculates a response set's derived variables level by level through the dependency graph as concurrent async child jobs,
+    calling _update_derived_variable_answers_for_variables for batches of the expressions evaluated in Python
+    and _update_derived_variable_answers for each other variable.
+
+    Args:
+        session: Snowpark session
+        response_set_id: Response set to calculate
+        max_concurrency: Maximum number of calls running at once
+        only_uncalculated: Skip variables whose last calculation succeeded (e.g. to resume an interrupted initial calculation)
+        variables_per_batch: Most expressions evaluated in Python per call, 1 or less to calculate every variable separately
+
+    Returns:
+        Object with per level timing, the result of each variable that returned an error,
+        and the failed dependencies of each variable skipped because of them
+    """
+    start = time.monotonic()
+    # Failed and still running (or interrupted) calculations need running again
+    uncalculated_filter = """
+        and not exists (
+            select 1 from impl_variable_expression._derived_variable_calculation_history h
+            where h.response_set_id = dv.response_set_id and h.variable_identifier = dv.variable_identifier
+              and h.calculation_end_time is not null and h.error_message is null
+        )
+    """ if only_uncalculated else ""
+    # Same test as _update_derived_variable_answers for whether an expression is transpiled to SQL
+    variable_rows = session.sql(
+        f"""
+        select
+            dv.variable_identifier,
+            s.python_expression is not null and (
+                s.variable_type not in ('expression', 'filtered_metric')
+                or impl_variable_expression._transpile_python_expression(
+                    s.python_expression, s.entity_identifiers, s.dependency_entity_types, dec.dependency_entity_columns
+                ) is null
+            ) as evaluated_in_python
+        from impl_variable_expression.derived_variables dv
+        left join impl_variable_expression._derived_variables_with_shapes s
+            on dv.response_set_id = s.response_set_id and dv.variable_identifier = s.variable_identifier
+        left join impl_variable_expression._dependency_entity_columns dec
+            on dv.response_set_id = dec.response_set_id and dv.variable_identifier = dec.variable_identifier
+        where dv.response_set_id = ?
+        {uncalculated_filter}
+        """,
+        params=[response_set_id],
+    ).collect()
+    variable_identifiers = [row[0] for row in variable_rows]
+    evaluated_in_python = {row[0] for row in variable_rows if row[1]}
+    dependency_mappings = [
+        (row[0], row[1]) for row in session.sql(
+            """
+            select variable_identifier, dependency_variable_identifier
+            from impl_variable_expression._derived_variable_dependency_mappings
+            where response_set_id = ? and dependency_variable_identifier is not null
+            """,
+            params=[response_set_id],
+        ).collect()
+    ]
+
+    def submit(variable_identifiers):
+        if len(variable_identifiers) == 1:
+            return _ResultRowJob(session.sql(
+                "call impl_variable_expression._update_derived_variable_answers(?, ?)",
+                params=[response_set_id, variable_identifiers[0]],
+            ).collect_nowait(), variable_identifiers)
+        return _ResultRowJob(session.sql(
+            "call impl_variable_expression._update_derived_variable_answers_for_variables(?, parse_json(?))",
+            params=[response_set_id, json.dumps(variable_identifiers)],
+        ).collect_nowait(), variable_identifiers, _variables_results)
+
+    dependencies = {}
+    for variable_identifier, dependency_variable_identifier in dependency_mappings:
+        dependencies.setdefault(variable_identifier, set()).add(dependency_variable_identifier)
+
+    levels = dependency_levels(variable_identifiers, dependency_mappings)
+    level_timings = run_levels(
+        levels, submit, max_concurrency, dependencies=dependencies,
+        batch=lambda level: batch_python_variables(level, evaluated_in_python, variables_per_batch),
+    )
+
+    errors = {
+        variable_identifier: result
+        for level_timing in level_timings
+        for variable_identifier, result in level_timing.pop("results").items()
+        if is_error_result(result)
+    }
+    skipped = {
+        variable_identifier: failed_dependencies
+        for level_timing in level_timings
+        for variable_identifier, failed_dependencies in level_timing.pop("skipped").items()
+    }
+    return {
+        "response_set_id": response_set_id,
+        "variable_count": len(variable_identifiers),
+        "level_count": len(levels),
+        "levels": level_timings,
+        "errors": errors,
+        "skipped": skipped,
+        "seconds": round(time.monotonic() - start, 3),
+    }
+
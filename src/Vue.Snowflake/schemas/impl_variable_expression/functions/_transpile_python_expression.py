@@ -0,0 +1,324 @@
+import ast
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from _parse_python_expression import _is_response_call, _result_entity
+
+# Example usage in SQL:
+# select impl_variable_expression._transpile_python_expression(
+#     'max(response.Rating(brand=result.brand), default=None)', ['brand'], {'Rating': ['brand']}, {'Rating': ['asked_entity_id_1']}
+# )
+
+# Columns of impl_response_set.variable_answers an entity of a variable can be stored in
+ANSWER_COLUMNS = ('asked_entity_id_1', 'asked_entity_id_2', 'asked_entity_id_3', 'answer_value')
+
+# Derived answers only have 3 asked entity columns
+MAX_RESULT_ENTITIES = 3
+
+# Comparisons that treat a None answer value the same in Python and SQL: False (or an error) in Python, null in SQL
+_COMPARISON_SQL = {ast.Eq: '=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.In: 'in'}
+
+# How each aggregate of a term's answers is calculated in SQL
+_AGGREGATE_SQL = {
+    'exists': 'true',
+    'any': 'boolor_agg(va.answer_value <> 0)',
+    'max': 'max(va.answer_value)',
+    'min': 'min(va.answer_value)',
+}
+
+
+class UnsupportedExpression(Exception):
+    """The expression isn't one of the shapes that can be transpiled, it must be evaluated in Python"""
+
+
+class AnswerTerm(NamedTuple):
+    """One aggregate over a respondent's answers to a variable, e.g. `max(response.Rating(brand=result.brand), default=None)`"""
+    variable_identifier: str
+    # (column, entity ids) for constant filters, e.g. `brand=[1, 2]`
+    constant_filters: Tuple[Tuple[str, Tuple[int, ...]], ...]
+    # (column, result entity index) for filters that depend on the entity combination, e.g. `brand=result.brand`
+    result_bindings: Tuple[Tuple[str, int], ...]
+    # SQL conditions on va.answer_value, e.g. from `(v for v in response.Rating() if 1 <= v <= 5)`
+    value_conditions: Tuple[str, ...]
+    # One of _AGGREGATE_SQL
+    aggregate: str
+
+
+class TranspiledExpression(NamedTuple):
+    """An expression of the form `primary if base else None`, where base is optional"""
+    primary: AnswerTerm
+    base: Optional[AnswerTerm]
+    entity_count: int
+
+
+def _int_constant(node):
+    if isinstance(node, ast.Constant) and type(node.value) is int:
+        return node.value
+    raise UnsupportedExpression(f"Expected an integer, got {ast.unparse(node)}")
+
+
+def _int_constants(node):
+    if isinstance(node, (ast.List, ast.Tuple)) and node.elts:
+        return tuple(_int_constant(element) for element in node.elts)
+    return (_int_constant(node),)
+
+
+class ExpressionTranspiler:
+    """
+    Recognises the most common expression shapes (see Example_expression_analysis.md), including those generated for metrics:
+    - `any(response.X(e=result.e))`
+    - `max(response.X(e=result.e), default=None)` (or min)
+    - either of those over true values: `(v for v in response.X(e=result.e) if 1 <= v <= 5)` or `... if v in (1, 2)`
+    - optionally with a base: `... if any(1 for r in response.B(e=result.e)) else None`
+    """
+
+    def __init__(self, entity_identifiers, dependency_entity_types, dependency_entity_columns):
+        """
+        Args:
+            entity_identifiers: result entity names, in the order of the derived answer's asked entity columns
+            dependency_entity_types: dict mapping variable names to entity types
+            dependency_entity_columns: dict mapping variable names to the variable_answers column of each entity type
+        """
+        self.entity_identifiers = list(entity_identifiers or [])
+        self.dependency_entity_types = dependency_entity_types or {}
+        self.dependency_entity_columns = dependency_entity_columns or {}
+
+    def transpile(self, expression: str) -> TranspiledExpression:
+        if len(self.entity_identifiers) > MAX_RESULT_ENTITIES:
+            raise UnsupportedExpression(f"More than {MAX_RESULT_ENTITIES} result entities")
+        if len(set(self.entity_identifiers)) != len(self.entity_identifiers):
+            raise UnsupportedExpression("Repeated result entity")
+        try:
+            node = ast.parse(expression, mode='eval').body
+        except SyntaxError as e:
+            raise UnsupportedExpression(f"Syntax error: {e}")
+
+        base = None
+        if isinstance(node, ast.IfExp):
+            if not (isinstance(node.orelse, ast.Constant) and node.orelse.value is None):
+                raise UnsupportedExpression("Conditional must be `... if base else None`")
+            base = self._base(node.test)
+            node = node.body
+        return TranspiledExpression(self._aggregate_call(node), base, len(self.entity_identifiers))
+
+    def _base(self, node) -> AnswerTerm:
+        term = self._aggregate_call(node)
+        if term.aggregate not in ('any', 'exists'):
+            raise UnsupportedExpression("Base must be `any(...)`")
+        return term
+
+    def _aggregate_call(self, node) -> AnswerTerm:
+        """`any(values)`, `max(values, default=None)` or `min(values, default=None)`"""
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and len(node.args) == 1):
+            raise UnsupportedExpression(f"Unsupported call: {ast.unparse(node)}")
+        function_name = node.func.id
+        if function_name == 'any' and not node.keywords:
+            return self._values(node.args[0], truthy_aggregate='any')
+        if function_name in ('max', 'min') and self._has_default_none(node):
+            term = self._values(node.args[0], truthy_aggregate=function_name)
+            if term.aggregate != function_name:
+                raise UnsupportedExpression(f"{function_name} must be over answer values")
+            return term
+        # e.g. max without default=None raises for respondents without answers
+        raise UnsupportedExpression(f"Unsupported call: {ast.unparse(node)}")
+
+    @staticmethod
+    def _has_default_none(node):
+        return (
+            len(node.keywords) == 1 and node.keywords[0].arg == 'default'
+            and isinstance(node.keywords[0].value, ast.Constant) and node.keywords[0].value.value is None
+        )
+
+    def _values(self, node, truthy_aggregate) -> AnswerTerm:
+        """`response.X(...)` or `(v for v in response.X(...) if <check>)`, aggregated with truthy_aggregate"""
+        if _is_response_call(node):
+            return self._answer_term(node, (), truthy_aggregate)
+
+        if not (isinstance(node, ast.GeneratorExp) and len(node.generators) == 1):
+            raise UnsupportedExpression(f"Unsupported values: {ast.unparse(node)}")
+        generator = node.generators[0]
+        if (
+            generator.is_async
+            or not isinstance(generator.target, ast.Name)
+            or generator.target.id in ('response', 'result')
+            or not _is_response_call(generator.iter)
+        ):
+            raise UnsupportedExpression(f"Unsupported generator: {ast.unparse(node)}")
+        value_name = generator.target.id
+        value_conditions = tuple(self._value_condition(check, value_name) for check in generator.ifs)
+
+        if isinstance(node.elt, ast.Name) and node.elt.id == value_name:
+            aggregate = truthy_aggregate
+        elif isinstance(node.elt, ast.Constant) and node.elt.value and truthy_aggregate == 'any':
+            # e.g. `any(1 for r in response.X())`: just whether there are any answers
+            aggregate = 'exists'
+        else:
+            raise UnsupportedExpression(f"Unsupported generator: {ast.unparse(node)}")
+        return self._answer_term(generator.iter, value_conditions, aggregate)
+
+    @staticmethod
+    def _value_condition(node, value_name) -> str:
+        """e.g. `1 <= v <= 5` -> `1 <= va.answer_value and va.answer_value <= 5`"""
+        if not isinstance(node, ast.Compare):
+            raise UnsupportedExpression(f"Unsupported condition: {ast.unparse(node)}")
+
+        def operand(operand_node, allow_tuple):
+            if isinstance(operand_node, ast.Name) and operand_node.id == value_name:
+                return 'va.answer_value'
+            if allow_tuple and isinstance(operand_node, (ast.Tuple, ast.List)):
+                return f"({', '.join(map(str, _int_constants(operand_node)))})"
+            return str(_int_constant(operand_node))
+
+        conditions = []
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            op_sql = _COMPARISON_SQL.get(type(op))
+            if op_sql is None:
+                raise UnsupportedExpression(f"Unsupported comparison: {ast.unparse(node)}")
+            is_in = op_sql == 'in'
+            if is_in and not (
+                isinstance(left, ast.Name) and left.id == value_name and isinstance(right, (ast.Tuple, ast.List))
+            ):
+                raise UnsupportedExpression(f"Unsupported comparison: {ast.unparse(node)}")
+            conditions.append(f"{operand(left, False)} {op_sql} {operand(right, is_in)}")
+            left = right
+        if not any('va.answer_value' in condition for condition in conditions):
+            raise UnsupportedExpression(f"Condition doesn't depend on the value: {ast.unparse(node)}")
+        return ' and '.join(conditions)
+
+    def _answer_term(self, call, value_conditions, aggregate) -> AnswerTerm:
+        variable_identifier = call.func.attr
+        entity_types = self.dependency_entity_types.get(variable_identifier)
+        entity_columns = self.dependency_entity_columns.get(variable_identifier)
+        if (
+            entity_types is None or entity_columns is None or len(entity_types) != len(entity_columns)
+            or not all(column in ANSWER_COLUMNS for column in entity_columns)
+        ):
+            raise UnsupportedExpression(f"Unknown dependency columns for {variable_identifier}")
+        if call.args:
+            raise UnsupportedExpression("Positional arguments")
+        column_from_entity = dict(zip(entity_types, entity_columns))
+
+        constant_filters = []
+        result_bindings = []
+        for keyword in call.keywords:
+            column = column_from_entity.get(keyword.arg)
+            if column is None:
+                raise UnsupportedExpression(f"{variable_identifier} has no entity {keyword.arg}")
+            result_entity = _result_entity(keyword.value)
+            if result_entity is None:
+                constant_filters.append((column, _int_constants(keyword.value)))
+            elif result_entity in self.entity_identifiers:
+                result_bindings.append((column, self.entity_identifiers.index(result_entity)))
+            else:
+                raise UnsupportedExpression(f"Unknown result entity {result_entity}")
+        return AnswerTerm(variable_identifier, tuple(constant_filters), tuple(result_bindings), value_conditions, aggregate)
+
+
+def _render_term(term: AnswerTerm, name: str) -> str:
+    group_columns = ['va.response_id'] + [f'va.{column}' for column, _ in term.result_bindings]
+    select_columns = ['va.response_id'] + [
+        f'va.{column} as bound_{i}' for i, (column, _) in enumerate(term.result_bindings)
+    ]
+    conditions = [f"va.variable_identifier = '{term.variable_identifier}'"]
+    conditions += [
+        f"va.{column} in ({', '.join(map(str, entity_ids))})" for column, entity_ids in term.constant_filters
+    ]
+    conditions += [f"({condition})" for condition in term.value_conditions]
+    newline_and = '\n        and '
+    return f"""{name} as (
+    select {', '.join(select_columns)}, {_AGGREGATE_SQL[term.aggregate]} as value
+    from target
+    inner join impl_response_set.variable_answers va on va.response_set_id = target.response_set_id
+    where {newline_and.join(conditions)}
+    group by {', '.join(group_columns)}
+)"""
+
+
+def _render_join(term: AnswerTerm, name: str) -> str:
+    conditions = [f'{name}.response_id = c.response_id'] + [
+        f'{name}.bound_{i} = c.entity_id_{dimension + 1}' for i, (_, dimension) in enumerate(term.result_bindings)
+    ]
+    return f"left join {name} on {' and '.join(conditions)}"
+
+
+def render_sql(transpiled: TranspiledExpression) -> str:
+    """
+    Render a query giving the same rows as _uncached_derived_answers for the variable.
+    Has two bind parameters: response_set_id and variable_identifier.
+    Every respondent gets every entity combination, just like the python path, then joins on each term's aggregate.
+    """
+    entity_columns = []
+    entity_joins = []
+    for dimension in range(MAX_RESULT_ENTITIES):
+        if dimension < transpiled.entity_count:
+            # Same as the python path: a missing instance array gives a single None instance
+            entity_joins.append(
+                f"inner join lateral flatten(input => coalesce(dv.entity_instance_arrays[{dimension}], array_construct(null))) e{dimension + 1}"
+            )
+            entity_columns.append(f"e{dimension + 1}.value::integer as entity_id_{dimension + 1}")
+        else:
+            entity_columns.append(f"null::integer as entity_id_{dimension + 1}")
+
+    terms = [('primary_answers', transpiled.primary)]
+    if transpiled.base is not None:
+        terms.append(('base_answers', transpiled.base))
+
+    primary = transpiled.primary
+    if primary.aggregate in ('any', 'exists'):
+        answer_value = 'iff(coalesce(primary_answers.value, false), 1, 0)'
+        conditions = []
+    else:
+        answer_value = 'primary_answers.value'
+        conditions = ['primary_answers.value is not null']
+    if transpiled.base is not None:
+        conditions.insert(0, 'coalesce(base_answers.value, false)')
+
+    newline = '\n'
+    term_ctes = f',{newline}'.join(_render_term(term, name) for name, term in terms)
+    return f"""with target as (
+    select ?::integer as response_set_id, ?::varchar as variable_identifier
+),
+combinations as (
+    select
+        dv.response_set_id,
+        dv.variable_identifier,
+        r.response_id,
+        {f',{newline}        '.join(entity_columns)}
+    from target
+    inner join impl_variable_expression._derived_variables_with_shapes dv
+        on dv.response_set_id = target.response_set_id and dv.variable_identifier = target.variable_identifier
+    inner join impl_response_set.responses r on r.response_set_id = dv.response_set_id
+    {f'{newline}    '.join(entity_joins)}
+),
+{term_ctes}
+select
+    c.response_set_id,
+    c.variable_identifier,
+    c.response_id,
+    c.entity_id_1 as asked_entity_id_1,
+    c.entity_id_2 as asked_entity_id_2,
+    c.entity_id_3 as asked_entity_id_3,
+    {answer_value} as answer_value
+from combinations c
+{newline.join(_render_join(term, name) for name, term in terms)}{f"{newline}where {' and '.join(conditions)}" if conditions else ''}"""
+
+
+def transpile_python_expression(
+    expression: str,
+    entity_identifiers: List[str],
+    dependency_entity_types: Dict[str, List[str]],
+    dependency_entity_columns: Dict[str, List[str]],
+) -> Optional[str]:
+    """
+    Transpile a variable expression to SQL over impl_response_set.variable_answers, so no per-row Python is needed.
+
+    Returns:
+        SQL query (see render_sql), or None if the expression must be evaluated in Python
+    """
+    if not expression:
+        return None
+    try:
+        transpiled = ExpressionTranspiler(entity_identifiers, dependency_entity_types, dependency_entity_columns).transpile(expression)
+    except UnsupportedExpression:
+        return None
+    return render_sql(transpiled)
@@ -0,0 +1,21 @@
+-- Python UDF to transpile the most common variable expression shapes to SQL over impl_response_set.variable_answers
+-- Returns null for expressions that must be evaluated in Python by _evaluate_expression_for_responses
+-- The returned query has two bind parameters (response_set_id, variable_identifier) and gives the same rows as _uncached_derived_answers
+
+-- To stage the Python files (creates a zip bundle with all .py files in the directory):
+-- uv run stage_python.py dev schemas/impl_variable_expression/functions/
+
+-- Create the UDF referencing the uploaded Python bundle
+create or replace function impl_variable_expression._transpile_python_expression(
+    expression string,
+    entity_identifiers array,
+    dependency_entity_types object,
+    dependency_entity_columns object  -- Maps each dependency to the variable_answers column of each of its entity types
+)
+returns string
+language python
+immutable
+runtime_version = '3.13'
+imports = ('@impl_variable_expression.udf_stage/schemas/impl_variable_expression/functions/functions_bundle.zip')
+handler = '_transpile_python_expression.transpile_python_expression'
+;
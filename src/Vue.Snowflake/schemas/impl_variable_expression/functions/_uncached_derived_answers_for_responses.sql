@@ -0,0 +1,79 @@
+-- Derived variable answers (expression, data wave and survey ID variables) for a response set, variable and respondents,
+-- each null for all of them. Respondents are filtered before the expression table function, since a filter on the result
+-- can't be pushed down through its partitions, so recalculating a few respondents doesn't evaluate all of them.
+-- e.g. select * from table(impl_variable_expression._uncached_derived_answers_for_responses(81, 'age_group', [1001, 1002]));
+create or replace function impl_variable_expression._uncached_derived_answers_for_responses(
+    requested_response_set_id integer,
+    requested_variable_identifier varchar,
+    requested_response_ids array
+)
+returns table (
+    response_set_id integer,
+    variable_identifier varchar,
+    response_id integer,
+    asked_entity_id_1 integer,
+    asked_entity_id_2 integer,
+    asked_entity_id_3 integer,
+    answer_value integer
+)
+language sql
+as
+$$
+    with grouped_answer_arrays as (
+        select wv.response_set_id, wv.variable_identifier, wv.response_id, wv.answer_array
+        from impl_variable_expression._uncached_data_wave_variable_answer_arrays wv
+        union all
+        select sv.response_set_id, sv.variable_identifier, sv.response_id, sv.answer_array
+        from impl_variable_expression._uncached_survey_id_variable_answer_arrays sv
+    ),
+
+    requested_dependency_answers as (
+        select da.response_set_id, da.variable_identifier, da.response_id, da.answer_arrays_by_variable_identifier
+        from impl_variable_expression._dependency_answers da
+        where (requested_response_set_id is null or da.response_set_id = requested_response_set_id)
+          and (requested_variable_identifier is null or da.variable_identifier = requested_variable_identifier)
+          and (requested_response_ids is null or array_contains(da.response_id::variant, requested_response_ids))
+    )
+
+    -- Expression variables are already typed rows, see _evaluate_expression_answer_rows_for_responses
+    select
+        answers.response_set_id,
+        answers.variable_identifier,
+        answers.response_id,
+        answers.asked_entity_id_1,
+        answers.asked_entity_id_2,
+        answers.asked_entity_id_3,
+        answers.answer_value
+    from impl_variable_expression._derived_variables_with_shapes dv
+    inner join requested_dependency_answers da
+        on dv.response_set_id = da.response_set_id and dv.variable_identifier = da.variable_identifier
+    inner join table(impl_variable_expression._evaluate_expression_answer_rows_for_responses(
+        dv.response_set_id,
+        dv.variable_identifier,
+        da.response_id,
+        dv.python_expression,
+        dv.entity_identifiers,
+        dv.entity_instance_arrays,
+        dv.dependency_entity_types,
+        da.answer_arrays_by_variable_identifier
+    ) over (partition by dv.response_set_id, dv.variable_identifier)) answers
+    where dv.python_expression is not null
+
+    union all
+
+    select
+        aa.response_set_id,
+        aa.variable_identifier,
+        aa.response_id,
+        answers.value[0]::integer as asked_entity_id_1,
+        answers.value[1]::integer as asked_entity_id_2,
+        answers.value[2]::integer as asked_entity_id_3,
+        -- Omit to prevent confusion: Should always be the same as answer_value when set
+        -- answers.value[3]::integer as answer_entity_id,
+        answers.value[4]::integer as answer_value
+    from grouped_answer_arrays aa
+    inner join lateral flatten(input => aa.answer_array) answers
+    where (requested_response_set_id is null or aa.response_set_id = requested_response_set_id)
+      and (requested_variable_identifier is null or aa.variable_identifier = requested_variable_identifier)
+      and (requested_response_ids is null or array_contains(aa.response_id::variant, requested_response_ids))
+$$;
@@ -0,0 +1,24 @@
+-- Calculates a response set's derived variables level by level through the dependency graph (from _derived_variable_dependency_mappings),
+-- running each level's variables as concurrent async calls to _update_derived_variable_answers, at most max_concurrency at once.
+-- Expressions evaluated in Python (not transpiled to SQL) are calculated variables_per_batch at a time with
+-- _update_derived_variable_answers_for_variables, so each respondent's answers are wrapped once per batch rather than per variable.
+-- Much faster than _init_derived_variable_answers' one at a time loop for the initial calculation of a new response set.
+-- Variables depending on one that failed are skipped and reported with it, rather than calculated from missing answers.
+-- Returns per level timing, e.g. call impl_variable_expression._calculate_derived_variables_by_level(81, 8, true, 20);
+
+-- To stage the Python files (creates a zip bundle with all .py files in the directory):
+-- uv run stage_python.py dev schemas/impl_variable_expression/functions/
+
+create or replace procedure impl_variable_expression._calculate_derived_variables_by_level(
+    response_set_id integer,
+    max_concurrency integer default 8,
+    only_uncalculated boolean default true,  -- Skip variables whose last calculation succeeded, e.g. to resume after an interruption
+    variables_per_batch integer default 20  -- 1 to calculate every variable with its own call
+)
+returns object
+language python
+runtime_version = '3.13'
+packages = ('snowflake-snowpark-python')
+imports = ('@impl_variable_expression.udf_stage/schemas/impl_variable_expression/functions/functions_bundle.zip')
+handler = '_schedule_derived_variable_calculation.calculate_derived_variables_by_level'
+;
@@ -0,0 +1,60 @@
+-- Re-evaluates expression variables with _evaluate_expression_stats_for_responses and stores where the time went in
+-- _derived_variable_calculation_history.evaluation_stats. Answers aren't written, so this is safe to run at any time,
+-- but it costs as much as calculating the variables, so only run it when investigating warehouse cost.
+-- Only variables already in the history (i.e. calculated at least once) are evaluated, since it doesn't record calculations.
+-- e.g. The expressions that dominate it:
+--   select variable_identifier, evaluation_stats:total_seconds, evaluation_stats:combinations_tried, evaluation_stats:phase_seconds
+--   from impl_variable_expression._derived_variable_calculation_history
+--   where response_set_id = 81 order by evaluation_stats:total_seconds desc;
+create or replace procedure impl_variable_expression._record_derived_variable_evaluation_stats(
+    response_set_id integer,
+    variable_identifier string default null -- null = all expression variables of the response set
+)
+returns string
+language sql
+as
+$$
+declare
+    variables_recorded integer;
+    recorded_time timestamp_ntz := sysdate();
+begin
+    if (response_set_id is null) then
+        return 'No action taken: response_set_id must be provided';
+    end if;
+
+    merge into impl_variable_expression._derived_variable_calculation_history as target
+    using (
+        select
+            stats.response_set_id,
+            stats.variable_identifier,
+            object_insert(stats.evaluation_stats, 'recorded_at', :recorded_time) as evaluation_stats
+        from impl_variable_expression._derived_variables_with_shapes dv
+        inner join impl_variable_expression._dependency_answers da
+            on dv.response_set_id = da.response_set_id and dv.variable_identifier = da.variable_identifier
+        inner join table(impl_variable_expression._evaluate_expression_stats_for_responses(
+            dv.response_set_id,
+            dv.variable_identifier,
+            da.response_id,
+            dv.python_expression,
+            dv.entity_identifiers,
+            dv.entity_instance_arrays,
+            dv.dependency_entity_types,
+            da.answer_arrays_by_variable_identifier
+        ) over (partition by dv.response_set_id, dv.variable_identifier)) stats
+        where dv.response_set_id = :response_set_id
+          and (:variable_identifier is null or dv.variable_identifier = :variable_identifier)
+          and dv.python_expression is not null
+          and exists (
+              select 1 from impl_variable_expression._derived_variable_calculation_history h
+              where h.response_set_id = dv.response_set_id and h.variable_identifier = dv.variable_identifier
+          )
+    ) as source
+    on target.response_set_id = source.response_set_id
+        and target.variable_identifier = source.variable_identifier
+    when matched then
+        update set evaluation_stats = source.evaluation_stats;
+
+    variables_recorded := SQLROWCOUNT;
+    return 'Recorded evaluation stats for ' || variables_recorded || ' variables';
+end;
+$$;
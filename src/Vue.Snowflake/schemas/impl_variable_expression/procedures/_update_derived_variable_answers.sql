@@ -7,6 +7,9 @@ declare
     rows_processed integer;
     calculation_time timestamp_ntz := sysdate();
     error_msg string;
+    transpiled_query string;
+    -- Named per call, since concurrent calls from one session (e.g. collect_nowait) share its temporary tables
+    answers_table string := 'impl_variable_expression.__temp_derived_answers_' || replace(uuid_string(), '-', '_');
 begin
     if (response_set_id is null or variable_identifier is null) then
         return 'No action taken: response_set_id and variable_identifier must be provided';
@@ -24,6 +27,37 @@ begin
         insert (response_set_id, variable_identifier, calculation_start_time, calculation_end_time, rows_written, error_message)
         values (source.response_set_id, source.variable_identifier, :calculation_time, null, null, null);
     
+    -- PERF: Calculate the answers before taking the lock on derived_variable_answers, so concurrent calls
+    -- (see _calculate_derived_variables_by_level) only wait for each other to delete and insert.
+    -- Transpiled to SQL for simple expressions (e.g. most metrics), which need no per-row Python at all
+    select impl_variable_expression._transpile_python_expression(
+        dv.python_expression, dv.entity_identifiers, dv.dependency_entity_types, dec.dependency_entity_columns
+    )
+    into :transpiled_query
+    from impl_variable_expression._derived_variables_with_shapes dv
+    left join impl_variable_expression._dependency_entity_columns dec
+        on dv.response_set_id = dec.response_set_id and dv.variable_identifier = dec.variable_identifier
+    where dv.response_set_id = :response_set_id
+      and dv.variable_identifier = :variable_identifier
+      and dv.variable_type in ('expression', 'filtered_metric');
+
+    if (transpiled_query is not null) then
+        let create_sql string := 'create temporary table ' || answers_table || ' as
+            select response_set_id, response_id, variable_identifier, asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_value
+            from (' || transpiled_query || ')';
+        execute immediate :create_sql using (response_set_id, variable_identifier);
+    else
+        create temporary table identifier(:answers_table) as
+        select response_set_id,
+            response_id,
+            variable_identifier,
+            asked_entity_id_1,
+            asked_entity_id_2,
+            asked_entity_id_3,
+            answer_value
+        from table(impl_variable_expression._uncached_derived_answers_for_responses(:response_set_id, :variable_identifier, null));
+    end if;
+
     begin transaction;
 
     delete from impl_variable_expression.derived_variable_answers
@@ -39,9 +73,7 @@ begin
         asked_entity_id_3,
         answer_value,
         :calculation_time
-    from impl_variable_expression._uncached_derived_answers
-    where response_set_id = :response_set_id
-      and variable_identifier = :variable_identifier;
+    from identifier(:answers_table);
 
     -- Get count of rows processed
     rows_processed := SQLROWCOUNT;
@@ -58,12 +90,14 @@ begin
         values (source.response_set_id, source.variable_identifier, :calculation_time, :calculation_end_time, :rows_processed, null);
 
     commit;
+    drop table if exists identifier(:answers_table);
     return 'Processed ' || rows_processed || ' rows';
 exception
     when other then
         error_msg := left(sqlerrm, 5000);
         rollback;
-        
+        drop table if exists identifier(:answers_table);
+
         let calculation_end_time := sysdate();
         -- Log error
         merge into impl_variable_expression._derived_variable_calculation_history as target
@@ -0,0 +1,229 @@
+-- Evaluates several expression variables of a response set in one pass with _evaluate_expressions_for_responses,
+-- so each respondent's dependency answers are shipped and wrapped in a Response once for all of them.
+-- The variables must not depend on each other (e.g. one level of the dependency graph), since they're all evaluated from the same answers.
+-- Variables that aren't expression variables are ignored, use _update_derived_variable_answers for those.
+-- Respondents are split into partitions of about respondents_per_partition, so large response sets are evaluated in parallel
+-- and no Python process has to hold all of a response set's answers.
+-- Returns {"rows_written": {variable_identifier: rows}, "errors": {variable_identifier: error_message}}, or {"error": ...} if nothing was written.
+-- Called by _calculate_derived_variables_by_level for each level's expression variables evaluated in Python.
+create or replace procedure impl_variable_expression._update_derived_variable_answers_for_variables(
+    response_set_id integer,
+    variable_identifiers array,
+    respondents_per_partition integer default 10000
+)
+returns object
+language sql
+as
+$$
+declare
+    rows_written_by_variable object;
+    error_message_by_variable object;
+    calculation_time timestamp_ntz := sysdate();
+    error_msg string;
+    -- Named per call, since concurrent calls from one session (e.g. collect_nowait) share its temporary tables
+    table_suffix string := replace(uuid_string(), '-', '_');
+    variables_table string := 'impl_variable_expression.__temp_expression_variables_' || table_suffix;
+    answers_table string := 'impl_variable_expression.__temp_expression_variable_answers_' || table_suffix;
+    outcomes_table string := 'impl_variable_expression.__temp_expression_variable_outcomes_' || table_suffix;
+begin
+    if (response_set_id is null or variable_identifiers is null) then
+        return object_construct('error', 'No action taken: response_set_id and variable_identifiers must be provided');
+    end if;
+
+    create temporary table identifier(:variables_table) as
+    select
+        dv.response_set_id,
+        dv.variable_identifier,
+        dv.python_expression,
+        dv.entity_identifiers,
+        dv.entity_instance_arrays,
+        dv.dependency_entity_types
+    from impl_variable_expression._derived_variables_with_shapes dv
+    where dv.response_set_id = :response_set_id
+      and array_contains(dv.variable_identifier::variant, :variable_identifiers)
+      and dv.python_expression is not null;
+
+    -- Log start of calculation
+    merge into impl_variable_expression._derived_variable_calculation_history as target
+    using identifier(:variables_table) as source
+    on target.response_set_id = source.response_set_id
+        and target.variable_identifier = source.variable_identifier
+    when matched then
+        update set rows_written = null, error_message = null, calculation_start_time = :calculation_time, calculation_end_time = null
+    when not matched then
+        insert (response_set_id, variable_identifier, calculation_start_time, calculation_end_time, rows_written, error_message)
+        values (source.response_set_id, source.variable_identifier, :calculation_time, null, null, null);
+
+    create temporary table identifier(:answers_table) as
+    with dependencies as (
+        select distinct ddm.response_set_id, ddm.dependency_variable_identifier
+        from impl_variable_expression._derived_variable_dependency_mappings ddm
+        inner join identifier(:variables_table) ev
+            on ddm.response_set_id = ev.response_set_id and ddm.variable_identifier = ev.variable_identifier
+        where ddm.dependency_variable_identifier is not null
+    ),
+
+    -- Same as _dependency_answers, but for the union of all the variables' dependencies
+    dependency_answers as (
+        select
+            r.response_set_id,
+            r.response_id,
+            object_agg(d.dependency_variable_identifier, coalesce(vaa.packed_answers, array_construct())) as answer_arrays_by_variable_identifier
+        from impl_response_set.responses r
+        -- Left join so expressions without dependencies are still evaluated for every respondent
+        left join dependencies d on r.response_set_id = d.response_set_id
+        left join impl_variable_expression._variable_answer_arrays vaa
+            on
+                d.response_set_id = vaa.response_set_id
+                and d.dependency_variable_identifier = vaa.variable_identifier
+                and r.response_id = vaa.response_id
+        where r.response_set_id = :response_set_id
+        group by r.response_set_id, r.response_id
+    ),
+
+    bucketed_dependency_answers as (
+        select
+            *,
+            mod(abs(hash(response_id)), greatest(1, ceil(count(*) over () / :respondents_per_partition))) as bucket
+        from dependency_answers
+    ),
+
+    evaluation_inputs as (
+        select
+            response_set_id,
+            bucket,
+            response_id,
+            answer_arrays_by_variable_identifier as dependency_answers,
+            null::varchar as variable_identifier,
+            null::string as python_expression,
+            null::array as entity_identifiers,
+            null::array as entity_instance_arrays,
+            null::object as dependency_entity_types
+        from bucketed_dependency_answers
+
+        union all
+
+        -- Every partition needs all the variables
+        select
+            ev.response_set_id,
+            b.bucket,
+            null::integer as response_id,
+            null::object as dependency_answers,
+            ev.variable_identifier,
+            ev.python_expression,
+            ev.entity_identifiers,
+            ev.entity_instance_arrays,
+            ev.dependency_entity_types
+        from identifier(:variables_table) ev
+        cross join (select distinct bucket from bucketed_dependency_answers) b
+    )
+
+    select
+        answers.response_set_id,
+        answers.variable_identifier,
+        answers.response_id,
+        answers.asked_entity_id_1,
+        answers.asked_entity_id_2,
+        answers.asked_entity_id_3,
+        answers.answer_value,
+        answers.error_message
+    from evaluation_inputs ei
+    -- Typed answer rows, so they're inserted as they are rather than flattened and cast
+    inner join table(impl_variable_expression._evaluate_expressions_answer_rows_for_responses(
+        ei.response_set_id,
+        ei.response_id,
+        ei.dependency_answers,
+        ei.variable_identifier,
+        ei.python_expression,
+        ei.entity_identifiers,
+        ei.entity_instance_arrays,
+        ei.dependency_entity_types
+    ) over (partition by ei.response_set_id, ei.bucket)) answers;
+
+    -- A variable that raised in any partition keeps its previous answers, just like a failed _update_derived_variable_answers
+    create temporary table identifier(:outcomes_table) as
+    select
+        ev.response_set_id,
+        ev.variable_identifier,
+        iff(max(aa.error_message) is null, count(aa.response_id), null) as rows_written,
+        left(max(aa.error_message), 5000) as error_message
+    from identifier(:variables_table) ev
+    left join identifier(:answers_table) aa
+        on ev.response_set_id = aa.response_set_id and ev.variable_identifier = aa.variable_identifier
+    group by ev.response_set_id, ev.variable_identifier;
+
+    begin transaction;
+
+    delete from impl_variable_expression.derived_variable_answers
+    where response_set_id = :response_set_id
+      and variable_identifier in (select variable_identifier from identifier(:outcomes_table) where error_message is null);
+
+    insert into impl_variable_expression.derived_variable_answers
+    select
+        aa.response_set_id,
+        aa.response_id,
+        aa.variable_identifier,
+        aa.asked_entity_id_1,
+        aa.asked_entity_id_2,
+        aa.asked_entity_id_3,
+        aa.answer_value,
+        :calculation_time
+    from identifier(:answers_table) aa
+    inner join identifier(:outcomes_table) o
+        on aa.response_set_id = o.response_set_id and aa.variable_identifier = o.variable_identifier
+    where o.error_message is null;
+
+    let calculation_end_time := sysdate();
+    -- Log completion, with the error for any variable that raised
+    merge into impl_variable_expression._derived_variable_calculation_history as target
+    using identifier(:outcomes_table) as source
+    on target.response_set_id = source.response_set_id
+        and target.variable_identifier = source.variable_identifier
+    when matched then
+        update set rows_written = source.rows_written, error_message = source.error_message, calculation_start_time = :calculation_time, calculation_end_time = :calculation_end_time
+    when not matched then
+        insert (response_set_id, variable_identifier, calculation_start_time, calculation_end_time, rows_written, error_message)
+        values (source.response_set_id, source.variable_identifier, :calculation_time, :calculation_end_time, source.rows_written, source.error_message);
+
+    commit;
+
+    -- object_agg leaves out nulls, so each variable is in one or the other
+    select
+        coalesce(object_agg(variable_identifier, rows_written), object_construct()),
+        coalesce(object_agg(variable_identifier, error_message), object_construct())
+    into :rows_written_by_variable, :error_message_by_variable
+    from identifier(:outcomes_table);
+
+    drop table if exists identifier(:variables_table);
+    drop table if exists identifier(:answers_table);
+    drop table if exists identifier(:outcomes_table);
+    return object_construct('rows_written', rows_written_by_variable, 'errors', error_message_by_variable);
+exception
+    when other then
+        error_msg := left(sqlerrm, 5000);
+        rollback;
+        drop table if exists identifier(:variables_table);
+        drop table if exists identifier(:answers_table);
+        drop table if exists identifier(:outcomes_table);
+
+        let calculation_end_time := sysdate();
+        -- Log error against all the variables since none were written
+        merge into impl_variable_expression._derived_variable_calculation_history as target
+        using (
+            select dv.response_set_id, dv.variable_identifier
+            from impl_variable_expression._derived_variables_with_shapes dv
+            where dv.response_set_id = :response_set_id
+              and array_contains(dv.variable_identifier::variant, :variable_identifiers)
+              and dv.python_expression is not null
+        ) as source
+        on target.response_set_id = source.response_set_id
+            and target.variable_identifier = source.variable_identifier
+        when matched then
+            update set rows_written = null, error_message = :error_msg, calculation_start_time = :calculation_time, calculation_end_time = :calculation_end_time
+        when not matched then
+            insert (response_set_id, variable_identifier, calculation_start_time, calculation_end_time, rows_written, error_message)
+            values (source.response_set_id, source.variable_identifier, :calculation_time, :calculation_end_time, null, :error_msg);
+
+        return object_construct('error', error_msg);
+end;
+$$;
@@ -0,0 +1,201 @@
+-- Recalculates a derived variable for only the respondents that changed since it was last calculated,
+-- then merges the difference into derived_variable_answers rather than rewriting the whole variable.
+-- Changed respondents are those with changes to responses, or to the variable's dependencies in variable_answers
+-- (which _variable_answer_arrays reads), since the last calculation. These are the dynamic tables' own change versions,
+-- so changes reach it however late the tables refresh, unlike comparing source change times to the calculation time.
+-- Unchanged answers keep their computed_at, so a dependent variable's incremental update only picks up respondents whose answers really changed.
+-- Still use _update_derived_variable_answers when the variable's definition or entity instances change (as _incremental_update_derived_variable_answers does),
+-- since then every respondent's answers may change. It's also used when the changes are older than the tables' time travel retention.
+create or replace procedure impl_variable_expression._update_derived_variable_answers_incrementally(
+    response_set_id integer,
+    variable_identifier string,
+    changed_since timestamp_ntz default null -- null = since the last successful calculation
+)
+returns string
+language sql
+as
+$$
+declare
+    rows_processed integer;
+    rows_deleted integer;
+    changed_response_count integer;
+    changed_response_ids array;
+    calculation_time timestamp_ntz := sysdate();
+    previous_calculation_time timestamp_ntz;
+    changed_since_time timestamp_tz;
+    transpiled_query string;
+    full_result string;
+    error_msg string;
+    -- Named per call, since concurrent calls from one session (e.g. collect_nowait) share its temporary tables
+    table_suffix string := replace(uuid_string(), '-', '_');
+    changed_responses_table string := 'impl_variable_expression.__temp_changed_responses_' || table_suffix;
+    answers_table string := 'impl_variable_expression.__temp_incremental_derived_answers_' || table_suffix;
+begin
+    if (response_set_id is null or variable_identifier is null) then
+        return 'No action taken: response_set_id and variable_identifier must be provided';
+    end if;
+
+    select max(calculation_start_time) into :previous_calculation_time
+    from impl_variable_expression._derived_variable_calculation_history
+    where response_set_id = :response_set_id
+      and variable_identifier = :variable_identifier
+      and calculation_end_time is not null
+      and error_message is null;
+
+    if (changed_since is null and previous_calculation_time is null) then
+        -- Never calculated, so every respondent has changed
+        call impl_variable_expression._update_derived_variable_answers(:response_set_id, :variable_identifier) into :full_result;
+        return full_result;
+    end if;
+    -- Calculation times are UTC (sysdate), but time travel needs a time zone
+    changed_since_time := to_timestamp_tz(to_varchar(coalesce(changed_since, previous_calculation_time)) || ' +00:00');
+
+    begin
+        -- Includes respondents that left responses (e.g. archived), so they lose their answers
+        create temporary table identifier(:changed_responses_table) as
+        select r.response_id
+        from impl_response_set.responses changes(information => default) at(timestamp => :changed_since_time) r
+        where r.response_set_id = :response_set_id
+
+        union
+
+        select va.response_id
+        from impl_response_set.variable_answers changes(information => default) at(timestamp => :changed_since_time) va
+        inner join impl_variable_expression._derived_variable_dependency_mappings ddm
+            on va.response_set_id = ddm.response_set_id and va.variable_identifier = ddm.dependency_variable_identifier
+        where ddm.response_set_id = :response_set_id
+          and ddm.variable_identifier = :variable_identifier;
+    exception
+        when statement_error then
+            -- The changes are no longer retained (or the tables were recreated since), so any respondent may have changed
+            call impl_variable_expression._update_derived_variable_answers(:response_set_id, :variable_identifier) into :full_result;
+            return full_result;
+    end;
+
+    select count(*), array_agg(response_id) into :changed_response_count, :changed_response_ids
+    from identifier(:changed_responses_table);
+
+    -- Log start of calculation
+    merge into impl_variable_expression._derived_variable_calculation_history as target
+    using (select :response_set_id as response_set_id, :variable_identifier as variable_identifier) as source
+    on target.response_set_id = source.response_set_id
+        and target.variable_identifier = source.variable_identifier
+    when matched then
+        update set rows_written = null, error_message = null, calculation_start_time = :calculation_time, calculation_end_time = null
+    when not matched then
+        insert (response_set_id, variable_identifier, calculation_start_time, calculation_end_time, rows_written, error_message)
+        values (source.response_set_id, source.variable_identifier, :calculation_time, null, null, null);
+
+    -- Same paths as _update_derived_variable_answers, for just the changed respondents
+    select impl_variable_expression._transpile_python_expression(
+        dv.python_expression, dv.entity_identifiers, dv.dependency_entity_types, dec.dependency_entity_columns
+    )
+    into :transpiled_query
+    from impl_variable_expression._derived_variables_with_shapes dv
+    left join impl_variable_expression._dependency_entity_columns dec
+        on dv.response_set_id = dec.response_set_id and dv.variable_identifier = dec.variable_identifier
+    where dv.response_set_id = :response_set_id
+      and dv.variable_identifier = :variable_identifier
+      and dv.variable_type in ('expression', 'filtered_metric');
+
+    if (transpiled_query is not null) then
+        let create_sql string := 'create temporary table ' || answers_table || ' as
+            select response_set_id, response_id, variable_identifier, asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_value
+            from (' || transpiled_query || ')
+            where response_id in (select response_id from ' || changed_responses_table || ')';
+        execute immediate :create_sql using (response_set_id, variable_identifier);
+    else
+        create temporary table identifier(:answers_table) as
+        select response_set_id,
+            response_id,
+            variable_identifier,
+            asked_entity_id_1,
+            asked_entity_id_2,
+            asked_entity_id_3,
+            answer_value
+        from table(impl_variable_expression._uncached_derived_answers_for_responses(
+            :response_set_id, :variable_identifier, :changed_response_ids
+        ));
+    end if;
+
+    begin transaction;
+
+    -- Changed respondents' answers that are no longer produced (or now have a different value)
+    delete from impl_variable_expression.derived_variable_answers dva
+    where dva.response_set_id = :response_set_id
+      and dva.variable_identifier = :variable_identifier
+      and dva.response_id in (select response_id from identifier(:changed_responses_table))
+      and not exists (
+          select 1
+          from identifier(:answers_table) ia
+          where ia.response_id = dva.response_id
+            and equal_null(ia.asked_entity_id_1, dva.asked_entity_id_1)
+            and equal_null(ia.asked_entity_id_2, dva.asked_entity_id_2)
+            and equal_null(ia.asked_entity_id_3, dva.asked_entity_id_3)
+            and equal_null(ia.answer_value, dva.answer_value)
+      );
+
+    rows_deleted := SQLROWCOUNT;
+
+    -- Everything left matching is unchanged, so only new answers are written
+    merge into impl_variable_expression.derived_variable_answers as target
+    using identifier(:answers_table) as source
+    on target.response_set_id = source.response_set_id
+        and target.variable_identifier = source.variable_identifier
+        and target.response_id = source.response_id
+        and equal_null(target.asked_entity_id_1, source.asked_entity_id_1)
+        and equal_null(target.asked_entity_id_2, source.asked_entity_id_2)
+        and equal_null(target.asked_entity_id_3, source.asked_entity_id_3)
+        and equal_null(target.answer_value, source.answer_value)
+    when not matched then
+        insert (response_set_id, response_id, variable_identifier, asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_value, computed_at)
+        values (
+            source.response_set_id,
+            source.response_id,
+            source.variable_identifier,
+            source.asked_entity_id_1,
+            source.asked_entity_id_2,
+            source.asked_entity_id_3,
+            source.answer_value,
+            :calculation_time
+        );
+
+    rows_processed := SQLROWCOUNT;
+    let calculation_end_time := sysdate();
+    -- Log successful completion. rows_written is only the rows this update wrote, not the variable's total
+    merge into impl_variable_expression._derived_variable_calculation_history as target
+    using (select :response_set_id as response_set_id, :variable_identifier as variable_identifier) as source
+    on target.response_set_id = source.response_set_id
+        and target.variable_identifier = source.variable_identifier
+    when matched then
+        update set rows_written = :rows_processed, error_message = null, calculation_start_time = :calculation_time, calculation_end_time = :calculation_end_time
+    when not matched then
+        insert (response_set_id, variable_identifier, calculation_start_time, calculation_end_time, rows_written, error_message)
+        values (source.response_set_id, source.variable_identifier, :calculation_time, :calculation_end_time, :rows_processed, null);
+
+    commit;
+    drop table if exists identifier(:changed_responses_table);
+    drop table if exists identifier(:answers_table);
+    return 'Processed ' || changed_response_count || ' changed responses: ' || rows_processed || ' rows written, ' || rows_deleted || ' rows deleted';
+exception
+    when other then
+        error_msg := left(sqlerrm, 5000);
+        rollback;
+        drop table if exists identifier(:changed_responses_table);
+        drop table if exists identifier(:answers_table);
+
+        let calculation_end_time := sysdate();
+        -- Log error
+        merge into impl_variable_expression._derived_variable_calculation_history as target
+        using (select :response_set_id as response_set_id, :variable_identifier as variable_identifier) as source
+        on target.response_set_id = source.response_set_id
+            and target.variable_identifier = source.variable_identifier
+        when matched then
+            update set rows_written = null, error_message = :error_msg, calculation_start_time = :calculation_time, calculation_end_time = :calculation_end_time
+        when not matched then
+            insert (response_set_id, variable_identifier, calculation_start_time, calculation_end_time, rows_written, error_message)
+            values (source.response_set_id, source.variable_identifier, :calculation_time, :calculation_end_time, null, :error_msg);
+
+        return 'Error: ' || error_msg;
+end;
+$$;
@@ -0,0 +1 @@
+create or replace stream impl_variable_expression._variable_answers_stream on dynamic table impl_response_set.variable_answers;
@@ -4,5 +4,7 @@ create or alter table impl_variable_expression._derived_variable_calculation_his
     calculation_start_time timestamp_ntz,
     calculation_end_time timestamp_ntz,
     rows_written integer,
-    error_message varchar(5000)
+    error_message varchar(5000),
+    -- Only set by _record_derived_variable_evaluation_stats
+    evaluation_stats variant
 ) cluster by (response_set_id, variable_identifier);
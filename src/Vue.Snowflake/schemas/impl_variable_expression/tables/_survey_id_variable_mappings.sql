@@ -0,0 +1,28 @@
+-- Survey ID variable definitions compiled to a static mapping of survey ID -> survey ID group entity instance,
+-- so their answers are a join rather than a Python UDF call per respondent
+-- (see survey_id_mapping_rows in functions/_evaluate_survey_id_variable_for_response.py for the same in Python)
+-- A survey ID in several groups maps to each of them, in the order of the groups in the definition
+create or replace transient dynamic table impl_variable_expression._survey_id_variable_mappings (
+    response_set_id integer,
+    variable_identifier varchar(256),
+    survey_id integer,
+    answer_value integer,  -- The survey ID group entity instance ID
+    group_index integer,  -- Position of the group in the definition, which orders a respondent's answers
+    survey_id_index integer  -- Position of the survey ID in the group, for a survey ID listed more than once
+) cluster by (response_set_id, survey_id)
+target_lag = 'DOWNSTREAM' refresh_mode = incremental initialize = on_create warehouse = warehouse_xsmall
+as
+(
+    select
+        dv.response_set_id,
+        dv.variable_identifier,
+        survey_ids.value::integer as survey_id,
+        survey_groups.value:"ToEntityInstanceId"::integer as answer_value,
+        survey_groups.index as group_index,
+        survey_ids.index as survey_id_index
+    from impl_variable_expression._derived_variables_with_shapes dv
+    inner join lateral flatten(input => dv.definition:"Groups") survey_groups
+    inner join lateral flatten(input => survey_groups.value:"Component":"SurveyIds") survey_ids
+    where dv.variable_type = 'survey_id'
+      and survey_groups.value:"ToEntityInstanceId" is not null
+);
@@ -1,7 +1,8 @@
--- Task to incrementally update derived variable answers when derived variables change
+-- Task to incrementally update derived variable answers when derived variables or their dependencies' answers change
 create or replace task impl_variable_expression._incremental_update_derived_variable_answers
     warehouse = warehouse_xsmall
 when system$stream_has_data ('impl_variable_expression._derived_variable_dependency_shapes_stream')
+    or system$stream_has_data ('impl_variable_expression._variable_answers_stream')
 as begin
     begin transaction;
     
@@ -11,17 +12,35 @@ as begin
     from impl_variable_expression._derived_variable_dependency_shapes_stream
     where metadata$action in ('INSERT', 'UPDATE', 'DELETE')
     limit 1; -- The task will run again straight after if more changes exist.
+
+    -- Variables whose dependencies' answers changed only need their changed respondents recalculating.
+    -- Their own changed answers then reach variable_answers, so their dependents are updated by a later run.
+    create or replace temporary table impl_variable_expression.__temp_derived_variable_answer_updates as
+    select distinct ddm.response_set_id, ddm.variable_identifier
+    from impl_variable_expression._variable_answers_stream vas
+    inner join impl_variable_expression._derived_variable_dependency_mappings ddm
+        on vas.response_set_id = ddm.response_set_id and vas.variable_identifier = ddm.dependency_variable_identifier
+    where not exists (
+        select 1 from impl_variable_expression.__temp_derived_variable_updates u
+        where u.response_set_id = ddm.response_set_id and u.variable_identifier = ddm.variable_identifier
+    );
     
     declare
         response_set_id_var integer; -- noqa: PRS, LT02
         variable_identifier_var string;
         cursor_updates cursor for select response_set_id, variable_identifier from __temp_derived_variable_updates;
+        cursor_answer_updates cursor for select response_set_id, variable_identifier from __temp_derived_variable_answer_updates;
     begin
         for record in cursor_updates do
             response_set_id_var := record.response_set_id;
             variable_identifier_var := record.variable_identifier;
             call impl_variable_expression._update_derived_variable_answers(:response_set_id_var, :variable_identifier_var);
         end for;
+        for record in cursor_answer_updates do
+            response_set_id_var := record.response_set_id;
+            variable_identifier_var := record.variable_identifier;
+            call impl_variable_expression._update_derived_variable_answers_incrementally(:response_set_id_var, :variable_identifier_var);
+        end for;
     end;
     
     commit;
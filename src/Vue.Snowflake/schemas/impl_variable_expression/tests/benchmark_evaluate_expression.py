@@ -0,0 +1,324 @@
+"""
+Offline benchmark for the expression evaluation engine, on synthetic respondents.
+
+Reports respondents/sec, p50/p99 per-respondent latency and peak memory for each scenario,
+and fails (exit code 1) when throughput regresses past the stored baseline in benchmark_baseline.json.
+
+Throughput is stored relative to a fixed pure Python calibration loop run on the same machine,
+so a baseline recorded on a laptop is still meaningful on a build agent.
+Every timing (including the calibration) is the median of several runs, so one slow run can't fail the comparison.
+
+Example Usage:
+    uv run benchmark_evaluate_expression.py
+    uv run benchmark_evaluate_expression.py --scenario brand_nps --respondents 5000
+    uv run benchmark_evaluate_expression.py --update-baseline
+"""
+# /// script
+# requires-python = ">=3.13"
+# ///
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+# Also add the functions directory so internal helpers like `_nested_dict` can be imported
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+
+from _build_metric_variable_expression import build_metric_variable_expression
+from _evaluate_expression_for_response import evaluate_expression_core_for_response
+from _nested_dict import NestedDict
+
+BASELINE_PATH = Path(__file__).parent / "benchmark_baseline.json"
+# Timing noise on a shared machine is easily 10-20%, so only fail on a clear regression
+DEFAULT_TOLERANCE = 0.3
+DEFAULT_RESPONDENT_COUNT = 2000
+# Runs of each timing to take the median of, since a single run is easily skewed by other processes
+DEFAULT_REPEATS = 5
+
+
+class Scenario(NamedTuple):
+    """A synthetic variable: what it's calculated from, and how many answers each respondent has"""
+    name: str
+    expression: str
+    entity_names: List[str]
+    brand_count: int
+    product_count: int
+    answers_per_respondent: int
+    # Proportion of respondents in the base (when the expression has one)
+    base_proportion: float = 0.8
+
+
+def _metric_expression(calc_type, true_vals=None, entity_names=("brand", "product")):
+    return build_metric_variable_expression(
+        "Base", None, ["brand"], "Rating", true_vals, list(entity_names), calc_type
+    )
+
+
+SCENARIOS = [
+    Scenario(
+        "zero_entity_max",
+        "max(response.Rating(), default=None)",
+        [], brand_count=10, product_count=1, answers_per_respondent=5,
+    ),
+    Scenario(
+        "brand_any",
+        "any(response.Rating(brand=result.brand))",
+        ["brand"], brand_count=20, product_count=1, answers_per_respondent=5,
+    ),
+    Scenario(
+        "brand_product_avg",
+        _metric_expression("avg"),
+        ["brand", "product"], brand_count=20, product_count=5, answers_per_respondent=30,
+    ),
+    Scenario(
+        "brand_product_yn_true_values",
+        _metric_expression("yn", "4|5"),
+        ["brand", "product"], brand_count=20, product_count=5, answers_per_respondent=30,
+    ),
+    Scenario(
+        # No default for max, so only in the base when rating the brand (as with real NPS metrics)
+        "brand_nps",
+        _metric_expression("nps", entity_names=["brand"]),
+        ["brand"], brand_count=50, product_count=10, answers_per_respondent=200,
+    ),
+]
+SCENARIOS_BY_NAME = {scenario.name: scenario for scenario in SCENARIOS}
+
+
+def entity_instance_arrays(scenario: Scenario) -> List[List[int]]:
+    """Brands are numbered from 1, products from 101 so the two can't be confused"""
+    instances = {
+        "brand": list(range(1, scenario.brand_count + 1)),
+        "product": list(range(101, 101 + scenario.product_count)),
+    }
+    return [instances[entity_name] for entity_name in scenario.entity_names]
+
+
+def dependency_shapes() -> Dict[str, List[str]]:
+    return {"Rating": ["brand", "product"], "Base": ["brand"]}
+
+
+def generate_respondents(scenario: Scenario, respondent_count: int, seed: int = 0):
+    """
+    Generate dependency answers shaped like _dependency_answers.answer_arrays_by_variable_identifier.
+    Seeded, so every run benchmarks exactly the same respondents.
+
+    Yields:
+        (response_id, dependency_answers)
+    """
+    rng = random.Random(seed)
+    brands = list(range(1, scenario.brand_count + 1))
+    products = list(range(101, 101 + scenario.product_count))
+    all_combinations = [(brand, product) for brand in brands for product in products]
+    answer_count = min(scenario.answers_per_respondent, len(all_combinations))
+
+    for response_id in range(1, respondent_count + 1):
+        rated = sorted(rng.sample(all_combinations, answer_count))
+        rating_answers = [[brand, product, None, rng.randint(0, 10)] for brand, product in rated]
+        if rng.random() < scenario.base_proportion:
+            base_answers = [[brand, None, None, 1] for brand in sorted({brand for brand, _ in rated})]
+        else:
+            base_answers = []
+        yield response_id, {"Rating": rating_answers, "Base": base_answers}
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def calibrate(iterations: int = 200_000, repeats: int = DEFAULT_REPEATS) -> float:
+    """Median operations/sec of a fixed pure Python workload, to normalise throughput between machines"""
+    lookup = {i: i for i in range(1000)}
+    ops_per_second = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        total = 0
+        for i in range(iterations):
+            total += lookup[i % 1000]
+        ops_per_second.append(iterations / (time.perf_counter() - start))
+    return round(statistics.median(ops_per_second))
+
+
+def run_scenario(
+    scenario: Scenario, respondent_count: int = DEFAULT_RESPONDENT_COUNT, seed: int = 0, repeats: int = DEFAULT_REPEATS
+) -> Dict[str, float]:
+    """
+    Evaluate the scenario's expression for every synthetic respondent, as _evaluate_expression_for_response does,
+    repeats times.
+
+    Returns:
+        Median respondents_per_second, p50_ms and p99_ms of every run's latencies, peak_memory_kb
+        and answers (total answer rows of a run, as a sanity check)
+    """
+    respondents = list(generate_respondents(scenario, respondent_count, seed))
+    instance_arrays = entity_instance_arrays(scenario)
+    shapes = dependency_shapes()
+
+    def evaluate(response_id, dependency_answers):
+        return evaluate_expression_core_for_response(
+            response_id, scenario.expression, scenario.entity_names, instance_arrays, shapes, dependency_answers
+        )
+
+    # Warm up the compiled expression cache, like every partition after the first in Snowflake
+    evaluate(*respondents[0])
+
+    latencies = []
+    respondents_per_second = []
+    for _ in range(repeats):
+        answer_count = 0
+        total_start = time.perf_counter()
+        for response_id, dependency_answers in respondents:
+            start = time.perf_counter()
+            answer_count += len(evaluate(response_id, dependency_answers))
+            latencies.append(time.perf_counter() - start)
+        respondents_per_second.append(respondent_count / (time.perf_counter() - total_start))
+
+    # Separate pass since tracemalloc slows everything down
+    tracemalloc.start()
+    for response_id, dependency_answers in respondents[:200]:
+        evaluate(response_id, dependency_answers)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "respondents_per_second": round(statistics.median(respondents_per_second), 1),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "peak_memory_kb": round(peak_memory / 1024, 1),
+        "answers": answer_count,
+    }
+
+
+def run_nested_dict_benchmark(
+    item_count: int = 1000, build_count: int = 50, lookup_count: int = 20000, seed: int = 0, repeats: int = DEFAULT_REPEATS
+) -> Dict[str, float]:
+    """Build and look up a two level NestedDict, as QuestionVariable does for a brand x product question (median of repeats)"""
+    rng = random.Random(seed)
+    items = [[rng.randint(1, 50), rng.randint(101, 120), None, rng.randint(0, 10)] for _ in range(item_count)]
+    lookups = [[[rng.randint(1, 50)], [rng.randint(101, 120)]] for _ in range(lookup_count)]
+
+    builds_per_second = []
+    lookups_per_second = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(build_count):
+            nested_dict = NestedDict(items, [0, 1])
+        builds_per_second.append(build_count / (time.perf_counter() - start))
+
+        start = time.perf_counter()
+        for key_values in lookups:
+            nested_dict[key_values]
+        lookups_per_second.append(lookup_count / (time.perf_counter() - start))
+
+    return {
+        "builds_per_second": round(statistics.median(builds_per_second), 1),
+        "lookups_per_second": round(statistics.median(lookups_per_second), 1),
+    }
+
+
+def run_benchmarks(
+    scenario_names: Optional[List[str]] = None, respondent_count: int = DEFAULT_RESPONDENT_COUNT, repeats: int = DEFAULT_REPEATS
+) -> Dict:
+    """
+    Returns:
+        {"calibration_ops_per_second": ..., "scenarios": {name: metrics}, "nested_dict": metrics}
+    """
+    calibration = calibrate(repeats=repeats)
+    scenarios = [SCENARIOS_BY_NAME[name] for name in scenario_names] if scenario_names else SCENARIOS
+    return {
+        "calibration_ops_per_second": calibration,
+        "scenarios": {scenario.name: run_scenario(scenario, respondent_count, repeats=repeats) for scenario in scenarios},
+        "nested_dict": run_nested_dict_benchmark(repeats=repeats),
+    }
+
+
+def _relative_throughputs(results: Dict) -> Dict[str, float]:
+    """Each throughput divided by the calibration, so results from different machines can be compared"""
+    calibration = results["calibration_ops_per_second"]
+    relative = {
+        f"scenarios.{name}": metrics["respondents_per_second"] / calibration
+        for name, metrics in results["scenarios"].items()
+    }
+    relative.update({
+        f"nested_dict.{name}": value / calibration
+        for name, value in results["nested_dict"].items()
+    })
+    return relative
+
+
+def find_regressions(results: Dict, baseline: Dict, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """
+    Compare calibrated throughput against the baseline.
+
+    Returns:
+        A description of each measurement more than tolerance (a proportion) slower than its baseline,
+        or whose answers differ (which means the benchmark isn't measuring the same thing any more)
+    """
+    regressions = []
+    baseline_relative = _relative_throughputs(baseline)
+    for name, relative in _relative_throughputs(results).items():
+        if name not in baseline_relative:
+            continue
+        ratio = relative / baseline_relative[name]
+        if ratio < 1 - tolerance:
+            regressions.append(f"{name}: {ratio:.0%} of baseline throughput")
+
+    for name, metrics in results["scenarios"].items():
+        baseline_metrics = baseline["scenarios"].get(name)
+        if baseline_metrics and baseline_metrics["answers"] != metrics["answers"]:
+            regressions.append(f"scenarios.{name}: {metrics['answers']} answers, baseline has {baseline_metrics['answers']}")
+    return regressions
+
+
+def format_results(results: Dict) -> str:
+    lines = [f"{'scenario':<32}{'resp/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'peak KB':>10}{'answers':>10}"]
+    for name, metrics in results["scenarios"].items():
+        lines.append(
+            f"{name:<32}{metrics['respondents_per_second']:>12.0f}{metrics['p50_ms']:>10.3f}"
+            f"{metrics['p99_ms']:>10.3f}{metrics['peak_memory_kb']:>10.0f}{metrics['answers']:>10}"
+        )
+    nested_dict = results["nested_dict"]
+    lines.append(
+        f"NestedDict: {nested_dict['builds_per_second']:.0f} builds/s, {nested_dict['lookups_per_second']:.0f} lookups/s"
+    )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS_BY_NAME), help="Only run these scenarios")
+    parser.add_argument("--respondents", type=int, default=DEFAULT_RESPONDENT_COUNT)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Runs of each timing to take the median of")
+    parser.add_argument("--update-baseline", action="store_true", help=f"Store the results in {BASELINE_PATH.name}")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scenario, args.respondents, args.repeats)
+    print(format_results(results))
+
+    if args.update_baseline:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        return
+
+    if not BASELINE_PATH.exists():
+        print(f"No baseline at {BASELINE_PATH}, run with --update-baseline to create one")
+        return
+    regressions = find_regressions(results, json.loads(BASELINE_PATH.read_text()), args.tolerance)
+    if regressions:
+        print("Regressions against baseline:")
+        print("\n".join(f"  {regression}" for regression in regressions))
+        sys.exit(1)
+    print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
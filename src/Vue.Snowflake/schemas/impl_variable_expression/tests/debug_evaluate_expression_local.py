@@ -10,6 +10,7 @@ Example Usage:
 # requires-python = ">=3.13"
 # dependencies = [
 #     "debugpy>=1.8.0",
+#     "pandas>=2.3.1",
 # ]
 # ///
 
@@ -24,8 +25,10 @@ sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
 import debugpy
 
 from _evaluate_expression_for_response import (
+    compiled_expression_cache_stats,
     evaluate_expression_core_for_response as evaluate_expression_for_response
 )
+from _evaluation_stats import EvaluationStats
 
 
 def run_test_case(test_data: dict, enable_debug: bool = False):
@@ -67,16 +70,20 @@ def run_test_case(test_data: dict, enable_debug: bool = False):
     print(f"{'='*80}\n")
     
     # Call the function
+    stats = EvaluationStats()
     result = evaluate_expression_for_response(
         response_id=response_id,
         variable_expression=variable_expression,
         entity_names=entity_identifiers,
         entity_instance_arrays=entity_instance_arrays,
         dependency_shapes=dependency_shapes,
-        dependency_answers=dependency_answers
+        dependency_answers=dependency_answers,
+        stats=stats
     )
     
     print(f"Result: {result}")
+    print(f"Compiled expression cache: {compiled_expression_cache_stats()}")
+    print(f"Evaluation stats: {json.dumps(stats.to_dict(), indent=2)}")
     print(f"\n{'='*80}\n")
     
     return result
@@ -0,0 +1,446 @@
+"""
+Local end-to-end derived variable answers pipeline over Parquet extracts, for backfills computed off-warehouse.
+
+Reproduces _dependency_answers -> _uncached_derived_answers (expression, data wave and survey ID variables) using the
+same functions bundle modules as the UDFs, partitioned by response_id across a process pool.
+Derived variables that depend on other derived variables being calculated are evaluated level by level within each
+partition, so every partition is independent.
+
+Extract with local_derived_answers_pipeline.sql, run, then load the output directory with one COPY (same file).
+
+Example Usage:
+    uv run local_derived_answers_pipeline.py extract/ output/ --response-set-id 81
+    uv run local_derived_answers_pipeline.py extract/ output/ --response-set-id 81 --variables Positive_buzz_filtered_metric --workers 4
+
+Extract directory layout (each a directory of Parquet files):
+    variable_answers/                 impl_response_set.variable_answers
+    derived_variables_with_shapes/    impl_variable_expression._derived_variables_with_shapes (variant columns as JSON)
+    responses/                        impl_response_set.responses
+"""
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "duckdb>=1.1.0",
+#     "numpy>=2.0.0",
+#     "pandas>=2.3.1",
+# ]
+# ///
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# Add the functions directory so the UDF modules can be imported
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+
+import pandas
+from _evaluate_data_wave_variable_for_response import evaluate_data_wave_variable_for_responses_batch
+from _evaluate_expression_for_response import answer_rows, evaluate_expressions_core_for_responses
+from _evaluate_survey_id_variable_for_response import evaluate_survey_id_variable_for_responses_batch
+from _schedule_derived_variable_calculation import dependency_levels
+
+# Enough to spread a response set over every core while keeping each partition's answers comfortably in memory
+DEFAULT_RESPONDENTS_PER_PARTITION = 50_000
+
+OUTPUT_COLUMNS = (
+    'response_set_id', 'response_id', 'variable_identifier',
+    'asked_entity_id_1', 'asked_entity_id_2', 'asked_entity_id_3', 'answer_value', 'computed_at',
+)
+# Written next to the answers: the variables whose answers the output replaces, including any with no answers at all
+MANIFEST_NAME = 'calculated_variables.parquet'
+
+
+class DerivedVariable(NamedTuple):
+    """A row of _derived_variables_with_shapes, as needed to calculate its answers"""
+    variable_identifier: str
+    variable_type: str  # 'expression', 'filtered_metric', 'data_wave' or 'survey_id'
+    python_expression: Optional[str]
+    entity_identifiers: List[str]
+    entity_instance_arrays: List[List[int]]
+    dependency_variable_identifiers: List[str]
+    dependency_entity_types: Dict[str, List[str]]
+    definition: Optional[Dict[str, Any]]
+
+
+class Partition(NamedTuple):
+    """Respondents of one response set to calculate in one worker process"""
+    index: int
+    first_response_id: int
+    last_response_id: int
+
+
+def _json_column(value):
+    # Variant columns are extracted as JSON text
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def derived_variable_from_row(row: Dict[str, Any]) -> DerivedVariable:
+    return DerivedVariable(
+        variable_identifier=row['variable_identifier'],
+        variable_type=row['variable_type'],
+        python_expression=row.get('python_expression'),
+        entity_identifiers=_json_column(row.get('entity_identifiers')) or [],
+        entity_instance_arrays=_json_column(row.get('entity_instance_arrays')) or [],
+        dependency_variable_identifiers=_json_column(row.get('dependency_variable_identifiers')) or [],
+        dependency_entity_types=_json_column(row.get('dependency_entity_types')) or {},
+        definition=_json_column(row.get('definition')),
+    )
+
+
+def is_calculated(variable: DerivedVariable) -> bool:
+    """Whether _uncached_derived_answers gives the variable answers: any with a python_expression (e.g. filtered metrics too), as it does"""
+    return variable.python_expression is not None or variable.variable_type in ('data_wave', 'survey_id')
+
+
+def _sort_key(answer):
+    # Matches _variable_answer_arrays: order by each column, nulls last
+    return tuple((part is None, part if part is not None else 0) for part in answer)
+
+
+def evaluate_level(
+    variables: List[DerivedVariable],
+    dependency_shapes: Dict[str, List[str]],
+    response_ids: List[int],
+    survey_ids: List[int],
+    survey_completed: List[Any],
+    answers_by_response: List[Dict[str, list]],
+) -> Tuple[Dict[str, List[Tuple[int, list]]], Dict[str, str]]:
+    """
+    Answer arrays of every respondent for variables that don't depend on each other, as the UDFs give them.
+
+    Returns:
+        (answers_by_variable, error_message_by_variable)
+        answers_by_variable maps each variable without an error to [(response_id, answer_arrays), ...] for respondents with answers
+    """
+    expressions = [
+        (variable.variable_identifier, variable.python_expression, variable.entity_identifiers, variable.entity_instance_arrays)
+        for variable in variables if variable.python_expression is not None
+    ]
+    answers_by_variable, error_message_by_variable = evaluate_expressions_core_for_responses(
+        expressions, dependency_shapes, response_ids, answers_by_response
+    ) if expressions else ({}, {})
+
+    for variable in variables:
+        if variable.python_expression is not None:
+            continue
+        if variable.variable_type == 'data_wave':
+            answer_arrays = evaluate_data_wave_variable_for_responses_batch(
+                response_ids, survey_completed, [variable.definition] * len(response_ids), [None] * len(response_ids)
+            )
+        elif variable.variable_type == 'survey_id':
+            answer_arrays = evaluate_survey_id_variable_for_responses_batch(
+                response_ids, survey_ids, [variable.definition] * len(response_ids), [None] * len(response_ids)
+            )
+        else:
+            continue
+        answers_by_variable[variable.variable_identifier] = [
+            (response_id, respondent_answers)
+            for response_id, respondent_answers in zip(response_ids, answer_arrays) if respondent_answers
+        ]
+    return answers_by_variable, error_message_by_variable
+
+
+def calculate_derived_answers(
+    levels: List[List[DerivedVariable]],
+    response_ids: List[int],
+    survey_ids: List[int],
+    survey_completed: List[Any],
+    answers_by_response: List[Dict[str, list]],
+) -> Tuple[List[Tuple[int, str, Optional[int], Optional[int], Optional[int], Optional[int]]], Dict[str, str]]:
+    """
+    Rows of _uncached_derived_answers for a partition of respondents, calculating each level in turn.
+    A level's answers become dependency answers of later levels, as they would in variable_answers.
+
+    Args:
+        levels: Variables in calculation order, see dependency_levels
+        response_ids, survey_ids, survey_completed: Parallel lists, one per respondent (as in impl_response_set.responses)
+        answers_by_response: Parallel list of dicts mapping every dependency variable to the respondent's answer arrays
+            (or an empty list), as _dependency_answers gives. Updated with the derived answers as levels are calculated.
+
+    Returns:
+        ([(response_id, variable_identifier, asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_value), ...],
+         error_message_by_variable)
+    """
+    dependency_shapes = {}
+    for level in levels:
+        for variable in level:
+            dependency_shapes.update(variable.dependency_entity_types)
+    position_by_response_id = {response_id: position for position, response_id in enumerate(response_ids)}
+
+    rows = []
+    error_message_by_variable = {}
+    for level in levels:
+        answers_by_variable, level_errors = evaluate_level(
+            level, dependency_shapes, response_ids, survey_ids, survey_completed, answers_by_response
+        )
+        error_message_by_variable.update(level_errors)
+        for variable_identifier, respondent_answers in answers_by_variable.items():
+            # Typed as _evaluate_expression_answer_rows_for_responses gives them
+            variable_rows = list(answer_rows(respondent_answers))
+            rows.extend((response_id, variable_identifier, *answer) for response_id, *answer in variable_rows)
+            if variable_identifier in dependency_shapes:
+                answers_by_respondent = {}
+                for response_id, *answer in variable_rows:
+                    answers_by_respondent.setdefault(response_id, []).append(answer)
+                for response_id, answers in answers_by_respondent.items():
+                    answers_by_response[position_by_response_id[response_id]][variable_identifier] = sorted(answers, key=_sort_key)
+    return rows, error_message_by_variable
+
+
+def variables_to_exclude(error_message_by_variable: Dict[str, str], variables: Iterable[DerivedVariable]) -> Set[str]:
+    """Variables that failed, and everything calculated from them, which would be missing some of their answers"""
+    dependents = {}
+    for variable in variables:
+        for dependency in variable.dependency_variable_identifiers:
+            dependents.setdefault(dependency, set()).add(variable.variable_identifier)
+    excluded = set()
+    pending = list(error_message_by_variable)
+    while pending:
+        variable_identifier = pending.pop()
+        if variable_identifier not in excluded:
+            excluded.add(variable_identifier)
+            pending.extend(dependents.get(variable_identifier, ()))
+    return excluded
+
+
+def _parquet_glob(extract_dir, table) -> str:
+    return str(Path(extract_dir) / table / '*.parquet')
+
+
+def _connect():
+    import duckdb  # Only needed to read and write Parquet, so the calculation can be tested without it
+    return duckdb.connect()
+
+
+def load_derived_variables(extract_dir, response_set_id, variable_identifiers=None) -> List[DerivedVariable]:
+    """The response set's variables to calculate (all of them if variable_identifiers is None)"""
+    with _connect() as connection:
+        cursor = connection.execute(
+            f"select * from read_parquet('{_parquet_glob(extract_dir, 'derived_variables_with_shapes')}') where response_set_id = ?",
+            [response_set_id],
+        )
+        columns = [column[0].lower() for column in cursor.description]
+        variables = [derived_variable_from_row(dict(zip(columns, row))) for row in cursor.fetchall()]
+    wanted = set(variable_identifiers) if variable_identifiers else None
+    return sorted(
+        (variable for variable in variables if is_calculated(variable) and (wanted is None or variable.variable_identifier in wanted)),
+        key=lambda variable: variable.variable_identifier,
+    )
+
+
+def plan_partitions(extract_dir, response_set_id, respondents_per_partition=DEFAULT_RESPONDENTS_PER_PARTITION) -> List[Partition]:
+    """Contiguous response_id ranges of about respondents_per_partition respondents each"""
+    with _connect() as connection:
+        responses = _parquet_glob(extract_dir, 'responses')
+        (respondent_count,) = connection.execute(
+            f"select count(*) from read_parquet('{responses}') where response_set_id = ?", [response_set_id]
+        ).fetchone()
+        partition_count = max(1, math.ceil(respondent_count / respondents_per_partition))
+        ranges = connection.execute(
+            f"""
+            select min(response_id), max(response_id)
+            from (
+                select response_id, ntile(?) over (order by response_id) as partition_number
+                from read_parquet('{responses}')
+                where response_set_id = ?
+            )
+            group by partition_number
+            order by partition_number
+            """,
+            [partition_count, response_set_id],
+        ).fetchall()
+    return [Partition(index, first, last) for index, (first, last) in enumerate(ranges)]
+
+
+def load_partition(extract_dir, response_set_id, partition: Partition, dependency_variable_identifiers: List[str], calculated_variable_identifiers: List[str]):
+    """
+    (response_ids, survey_ids, survey_completed, answers_by_response) of the partition's respondents, as _dependency_answers.
+    Answers of the variables being calculated are left out, since they're recalculated.
+    """
+    with _connect() as connection:
+        respondents = connection.execute(
+            f"""
+            select response_id, survey_id, survey_completed
+            from read_parquet('{_parquet_glob(extract_dir, 'responses')}')
+            where response_set_id = ? and response_id between ? and ?
+            order by response_id
+            """,
+            [response_set_id, partition.first_response_id, partition.last_response_id],
+        ).fetchall()
+        answer_rows = connection.execute(
+            f"""
+            select
+                response_id,
+                variable_identifier,
+                list([asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_value]
+                    order by asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_value) as answer_arrays
+            from read_parquet('{_parquet_glob(extract_dir, 'variable_answers')}')
+            where response_set_id = ? and response_id between ? and ?
+              and list_contains(?, variable_identifier) and not list_contains(?, variable_identifier)
+            group by response_id, variable_identifier
+            """,
+            [
+                response_set_id, partition.first_response_id, partition.last_response_id,
+                dependency_variable_identifiers, calculated_variable_identifiers,
+            ],
+        ).fetchall()
+
+    response_ids = [response_id for response_id, _, _ in respondents]
+    answers_by_response = [dict.fromkeys(dependency_variable_identifiers) for _ in respondents]
+    for answers in answers_by_response:
+        for dependency in answers:
+            answers[dependency] = []
+    position_by_response_id = {response_id: position for position, response_id in enumerate(response_ids)}
+    for response_id, variable_identifier, answer_arrays in answer_rows:
+        position = position_by_response_id.get(response_id)
+        if position is not None:
+            answers_by_response[position][variable_identifier] = answer_arrays
+    return (
+        response_ids,
+        [survey_id for _, survey_id, _ in respondents],
+        # survey_completed is a date, passed to the UDF as timestamp_ntz (midnight)
+        [datetime(d.year, d.month, d.day) if d is not None else None for _, _, d in respondents],
+        answers_by_response,
+    )
+
+
+def write_rows(output_path, response_set_id, rows, computed_at: datetime) -> None:
+    """Parquet with derived_variable_answers' columns, ready for COPY ... match_by_column_name"""
+    frame = pandas.DataFrame({
+        'response_set_id': pandas.array([response_set_id] * len(rows), dtype='Int64'),
+        'response_id': pandas.array([row[0] for row in rows], dtype='Int64'),
+        'variable_identifier': pandas.Series([row[1] for row in rows], dtype=object),
+        'asked_entity_id_1': pandas.array([row[2] for row in rows], dtype='Int64'),
+        'asked_entity_id_2': pandas.array([row[3] for row in rows], dtype='Int64'),
+        'asked_entity_id_3': pandas.array([row[4] for row in rows], dtype='Int64'),
+        'answer_value': pandas.array([row[5] for row in rows], dtype='Int64'),
+        'computed_at': pandas.Series([computed_at] * len(rows), dtype='datetime64[us]'),
+    }, columns=list(OUTPUT_COLUMNS))
+    with _connect() as connection:
+        connection.register('derived_variable_answers', frame)
+        connection.execute(f"copy derived_variable_answers to '{output_path}' (format parquet)")
+
+
+def calculate_partition(extract_dir, output_dir, response_set_id, levels: List[List[DerivedVariable]], partition: Partition, computed_at: datetime):
+    """Worker: calculate and write one partition. Returns (partition index, respondents, rows written, error_message_by_variable)"""
+    calculated = sorted(variable.variable_identifier for level in levels for variable in level)
+    dependencies = sorted({
+        dependency for level in levels for variable in level for dependency in variable.dependency_variable_identifiers
+    })
+    response_ids, survey_ids, survey_completed, answers_by_response = load_partition(
+        extract_dir, response_set_id, partition, dependencies, calculated
+    )
+    rows, error_message_by_variable = calculate_derived_answers(
+        levels, response_ids, survey_ids, survey_completed, answers_by_response
+    )
+    write_rows(Path(output_dir) / f"part-{partition.index:05d}.parquet", response_set_id, rows, computed_at)
+    return partition.index, len(response_ids), len(rows), error_message_by_variable
+
+
+def remove_variables(output_dir, excluded: Set[str]) -> None:
+    """Rewrite the output without the excluded variables' answers"""
+    with _connect() as connection:
+        for part in sorted(Path(output_dir).glob('part-*.parquet')):
+            filtered = part.with_suffix('.filtered')
+            connection.execute(
+                f"copy (select * from read_parquet('{part}') where not list_contains(?, variable_identifier)) to '{filtered}' (format parquet)",
+                [sorted(excluded)],
+            )
+            os.replace(filtered, part)
+
+
+def write_manifest(output_dir, response_set_id, variable_identifiers: List[str]) -> None:
+    """Parquet of the (response_set_id, variable_identifier) the output replaces, for the load to delete by"""
+    frame = pandas.DataFrame({
+        'response_set_id': pandas.array([response_set_id] * len(variable_identifiers), dtype='Int64'),
+        'variable_identifier': pandas.Series(variable_identifiers, dtype=object),
+    })
+    with _connect() as connection:
+        connection.register('calculated_variables', frame)
+        connection.execute(f"copy calculated_variables to '{Path(output_dir) / MANIFEST_NAME}' (format parquet)")
+
+
+def run_pipeline(extract_dir, output_dir, response_set_id, variable_identifiers=None, workers=None,
+                 respondents_per_partition=DEFAULT_RESPONDENTS_PER_PARTITION) -> Dict[str, Any]:
+    """
+    Calculate the response set's derived variable answers from the extracts into output_dir.
+    Variables that raise (and those depending on them) are left out of the output and reported, rather than failing the run.
+    The manifest lists the rest, so a variable that now has no answers still has its old ones deleted.
+    """
+    started = time.perf_counter()
+    computed_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    variables = load_derived_variables(extract_dir, response_set_id, variable_identifiers)
+    variables_by_identifier = {variable.variable_identifier: variable for variable in variables}
+    levels = [
+        [variables_by_identifier[variable_identifier] for variable_identifier in level]
+        for level in dependency_levels(
+            variables_by_identifier,
+            [(variable.variable_identifier, dependency) for variable in variables for dependency in variable.dependency_variable_identifiers],
+        )
+    ]
+    partitions = plan_partitions(extract_dir, response_set_id, respondents_per_partition)
+
+    respondent_count = 0
+    rows_written = 0
+    error_message_by_variable = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(calculate_partition, extract_dir, output_dir, response_set_id, levels, partition, computed_at)
+            for partition in partitions
+        ]
+        for future in futures:
+            _, respondents, rows, errors = future.result()
+            respondent_count += respondents
+            rows_written += rows
+            for variable_identifier, error_message in errors.items():
+                error_message_by_variable.setdefault(variable_identifier, error_message)
+
+    excluded = variables_to_exclude(error_message_by_variable, variables)
+    if excluded:
+        remove_variables(output_dir, excluded)
+    calculated = sorted(variable.variable_identifier for variable in variables if variable.variable_identifier not in excluded)
+    write_manifest(output_dir, response_set_id, calculated)
+
+    return {
+        'response_set_id': response_set_id,
+        'variables': len(variables),
+        'levels': len(levels),
+        'partitions': len(partitions),
+        'respondents': respondent_count,
+        'rows_calculated': rows_written,
+        'calculated_variables': calculated,
+        'excluded_variables': sorted(excluded),
+        'error_message_by_variable': error_message_by_variable,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calculate derived variable answers locally from Parquet extracts")
+    parser.add_argument('extract_dir', help="Directory with variable_answers/, derived_variables_with_shapes/ and responses/ Parquet")
+    parser.add_argument('output_dir', help=f"Directory to write part-*.parquet files for COPY into derived_variable_answers, and {MANIFEST_NAME}")
+    parser.add_argument('--response-set-id', type=int, required=True)
+    parser.add_argument('--variables', nargs='*', help="Only these variables (default: every derived variable of the response set)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument('--respondents-per-partition', type=int, default=DEFAULT_RESPONDENTS_PER_PARTITION)
+    args = parser.parse_args()
+
+    summary = run_pipeline(
+        args.extract_dir, args.output_dir, args.response_set_id, args.variables, args.workers, args.respondents_per_partition
+    )
+    print(json.dumps(summary, indent=2))
+    if summary['excluded_variables']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+-- Extract and load for local_derived_answers_pipeline.py, to backfill a response set's derived variable answers off-warehouse
+-- Run with snowsql (for get/put). Set the response set throughout, and local paths to suit.
+
+create temporary file format impl_variable_expression.__parquet_format type = parquet;
+
+-- 1. Extract the inputs (variant columns as JSON text, which the pipeline parses)
+copy into @~/derived_answers_extract/variable_answers/
+from (
+    select response_set_id, response_id, variable_identifier, asked_entity_id_1, asked_entity_id_2, asked_entity_id_3, answer_value
+    from impl_response_set.variable_answers
+    where response_set_id = 81
+)
+file_format = (format_name = impl_variable_expression.__parquet_format) header = true overwrite = true;
+
+copy into @~/derived_answers_extract/derived_variables_with_shapes/
+from (
+    select
+        response_set_id,
+        variable_identifier,
+        variable_type,
+        python_expression,
+        to_json(definition) as definition,
+        to_json(entity_identifiers) as entity_identifiers,
+        to_json(entity_instance_arrays) as entity_instance_arrays,
+        to_json(dependency_variable_identifiers) as dependency_variable_identifiers,
+        to_json(dependency_entity_types) as dependency_entity_types
+    from impl_variable_expression._derived_variables_with_shapes
+    where response_set_id = 81
+)
+file_format = (format_name = impl_variable_expression.__parquet_format) header = true overwrite = true;
+
+copy into @~/derived_answers_extract/responses/
+from (
+    select response_set_id, response_id, survey_id, survey_completed
+    from impl_response_set.responses
+    where response_set_id = 81
+)
+file_format = (format_name = impl_variable_expression.__parquet_format) header = true overwrite = true;
+
+get @~/derived_answers_extract/variable_answers/ file://extract/variable_answers/;
+get @~/derived_answers_extract/derived_variables_with_shapes/ file://extract/derived_variables_with_shapes/;
+get @~/derived_answers_extract/responses/ file://extract/responses/;
+
+-- 2. Locally: uv run local_derived_answers_pipeline.py extract/ output/ --response-set-id 81
+
+-- 3. Load the output. Only the variables in the manifest are replaced: those that failed (and their dependents) aren't in it,
+-- so keep their previous answers as the procedures do, while ones that now have no answers lose their old ones.
+put file://output/part-*.parquet @~/derived_answers_output/ overwrite = true;
+put file://output/calculated_variables.parquet @~/derived_answers_manifest/ overwrite = true;
+
+begin transaction;
+
+delete from impl_variable_expression.derived_variable_answers
+where response_set_id = 81
+  and variable_identifier in (
+      select $1:variable_identifier::varchar
+      from @~/derived_answers_manifest/ (file_format => 'impl_variable_expression.__parquet_format')
+  );
+
+copy into impl_variable_expression.derived_variable_answers
+from @~/derived_answers_output/
+file_format = (format_name = impl_variable_expression.__parquet_format)
+match_by_column_name = case_insensitive;
+
+commit;
+
+remove @~/derived_answers_extract/;
+remove @~/derived_answers_output/;
+remove @~/derived_answers_manifest/;
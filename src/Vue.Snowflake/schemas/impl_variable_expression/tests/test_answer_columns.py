@@ -0,0 +1,139 @@
+"""
+Pytest tests for AnswerColumns compact answer storage.
+"""
+
+import base64
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+# Add the functions directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+
+import pytest
+from _answer_columns import PACKED_NULL, AnswerColumns, compact_column, pack_answer_arrays
+from _evaluate_expression_for_response import QuestionVariable, decode_answers
+
+
+class TestCompactColumn:
+
+    def test_ints_stored_as_int_array(self):
+        column = compact_column([1, 2, 3])
+        assert isinstance(column, array) and column.typecode == 'i'
+
+    def test_large_ints_widen(self):
+        column = compact_column([1, 2 ** 40])
+        assert isinstance(column, array) and column.typecode == 'q'
+        assert list(column) == [1, 2 ** 40]
+
+    def test_all_none_not_stored(self):
+        assert compact_column([None, None]) is None
+
+    def test_mixed_none_kept_as_list(self):
+        assert compact_column([1, None]) == [1, None]
+
+
+class TestAnswerColumns:
+
+    ANSWERS = [[1, 10, None, 4], [2, 20, None, 0], [3, 10, None, 9]]
+
+    def test_round_trips_columns(self):
+        columns = AnswerColumns.from_answer_arrays(self.ANSWERS)
+
+        assert len(columns) == 3
+        assert columns.populated_indices == [0, 1, 3]
+        assert columns.first_answer() == [1, 10, None, 4]
+        assert list(columns.values) == [4, 0, 9]
+        assert list(columns.column(2)) == [None, None, None]
+        assert list(columns.rows([1, 0])) == [(10, 1, 4), (20, 2, 0), (10, 3, 9)]
+
+    def test_empty(self):
+        columns = AnswerColumns.from_answer_arrays([])
+
+        assert len(columns) == 0
+        assert columns.first_answer() is None
+        assert list(columns.values) == []
+
+
+class TestPackedAnswers:
+
+    ANSWERS = [[1, 10, None, 4], [2, 20, None, -7], [3, 10, None, 2 ** 31 - 1]]
+
+    def test_round_trips_columns(self):
+        columns = AnswerColumns.from_packed(pack_answer_arrays(self.ANSWERS))
+
+        assert len(columns) == 3
+        assert columns.populated_indices == [0, 1, 3]
+        assert [list(columns.column(i)) for i in range(4)] == [[1, 2, 3], [10, 20, 10], [None] * 3, [4, -7, 2 ** 31 - 1]]
+        assert isinstance(columns.column(0), array)
+
+    def test_layout_matches_variable_answer_arrays(self):
+        # Little-endian int32s: populated column bitmask, then each populated column, as the view builds them
+        packed = pack_answer_arrays([[5, None, None, 1], [6, None, None, None]])
+
+        assert base64.b64decode(packed) == struct.pack("<5i", 0b1001, 5, 6, 1, PACKED_NULL)
+
+    def test_nulls_within_a_column(self):
+        columns = AnswerColumns.from_packed(pack_answer_arrays([[1, None, None, 4], [None, None, None, 5]]))
+
+        assert list(columns.column(0)) == [1, None]
+        assert list(columns.values) == [4, 5]
+
+    def test_empty(self):
+        columns = AnswerColumns.from_packed(pack_answer_arrays([]))
+
+        assert len(columns) == 0
+        assert columns.first_answer() is None
+
+    def test_raw_bytes(self):
+        columns = AnswerColumns.from_packed(base64.b64decode(pack_answer_arrays(self.ANSWERS)))
+
+        assert list(columns.values) == [4, -7, 2 ** 31 - 1]
+
+    @pytest.mark.parametrize("value", [2 ** 31, PACKED_NULL, 1.5])
+    def test_answers_that_dont_fit_are_not_packed(self, value):
+        assert pack_answer_arrays([[1, None, None, value]]) is None
+
+    def test_decode_either_form(self):
+        for answers in (self.ANSWERS, pack_answer_arrays(self.ANSWERS), AnswerColumns.from_answer_arrays(self.ANSWERS)):
+            columns = decode_answers(answers)
+            assert [list(columns.column(i)) for i in range(4)] == [list(column) for column in zip(*self.ANSWERS)]
+
+
+class TestQuestionVariableStorage:
+
+    ANSWERS = [[1, 10, None, 4], [2, 20, None, 0], [3, 10, None, 9]]
+
+    def test_same_lookups_from_lists_packed_or_columns(self):
+        from_lists = QuestionVariable(["brand", "product"], self.ANSWERS)
+        from_packed = QuestionVariable(["brand", "product"], pack_answer_arrays(self.ANSWERS))
+        from_columns = QuestionVariable(["brand", "product"], AnswerColumns.from_answer_arrays(self.ANSWERS))
+
+        for variable in (from_lists, from_packed, from_columns):
+            assert variable() == [4, 0, 9]
+            assert variable(product=10) == [4, 9]
+            assert variable(brand=[1, 2], product=[10, 20]) == [4, 0]
+            assert variable.answered_entity_ids("product") == {10, 20}
+
+    def test_has_no_instance_dict(self):
+        assert not hasattr(QuestionVariable(["brand"], [[1, None, None, 2]]), "__dict__")
+
+    def test_lookups_on_sort_prefix_use_sorted_index(self):
+        variable = QuestionVariable(["brand", "product"], self.ANSWERS)
+        variable(brand=1)
+        variable(brand=1, product=10)
+        variable(product=10)
+
+        index_types = {signature: type(index).__name__ for signature, index in variable._cache_by_kwargs.items()}
+        assert index_types == {
+            ("brand",): "SortedIndex",
+            ("brand", "product"): "SortedIndex",
+            ("product",): "NestedDict",
+        }
+
+    def test_keys_with_none_use_nested_dict(self):
+        variable = QuestionVariable(["brand"], [[1, None, None, 4], [None, None, None, 5]])
+
+        assert variable(brand=1) == [4]
+        assert type(variable._cache_by_kwargs[("brand",)]).__name__ == "NestedDict"
@@ -0,0 +1,101 @@
+"""
+Pytest tests for the offline expression evaluation benchmark.
+The full benchmark is slow, so is only compared against the stored baseline when RUN_BENCHMARKS is set.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+# Add this directory to the path so we can import the benchmark script (which adds the functions directory itself)
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pytest
+from benchmark_evaluate_expression import (
+    BASELINE_PATH,
+    SCENARIOS,
+    SCENARIOS_BY_NAME,
+    calibrate,
+    entity_instance_arrays,
+    find_regressions,
+    generate_respondents,
+    run_benchmarks,
+    run_scenario,
+)
+
+
+def results(respondents_per_second, calibration=1000.0, answers=10):
+    return {
+        "calibration_ops_per_second": calibration,
+        "scenarios": {"s": {"respondents_per_second": respondents_per_second, "answers": answers}},
+        "nested_dict": {"lookups_per_second": 100.0},
+    }
+
+
+class TestGenerateRespondents:
+
+    def test_seeded(self):
+        scenario = SCENARIOS_BY_NAME["brand_product_avg"]
+
+        assert list(generate_respondents(scenario, 5, seed=1)) == list(generate_respondents(scenario, 5, seed=1))
+        assert list(generate_respondents(scenario, 5, seed=1)) != list(generate_respondents(scenario, 5, seed=2))
+
+    def test_answers_per_respondent(self):
+        scenario = SCENARIOS_BY_NAME["brand_product_avg"]
+
+        for _, dependency_answers in generate_respondents(scenario, 10):
+            assert len(dependency_answers["Rating"]) == scenario.answers_per_respondent
+            rated_brands = {answer[0] for answer in dependency_answers["Rating"]}
+            assert {answer[0] for answer in dependency_answers["Base"]} <= rated_brands
+
+    def test_entity_instance_arrays(self):
+        assert [len(instances) for instances in entity_instance_arrays(SCENARIOS_BY_NAME["brand_product_avg"])] == [20, 5]
+        assert entity_instance_arrays(SCENARIOS_BY_NAME["zero_entity_max"]) == []
+
+
+class TestRunScenario:
+
+    @pytest.mark.parametrize("scenario", SCENARIOS, ids=lambda scenario: scenario.name)
+    def test_every_scenario_evaluates(self, scenario):
+        metrics = run_scenario(scenario, respondent_count=20)
+
+        assert metrics["answers"] > 0
+        assert metrics["p50_ms"] <= metrics["p99_ms"]
+        assert metrics["peak_memory_kb"] > 0
+
+    def test_repeats_count_one_run_of_answers(self):
+        scenario = SCENARIOS_BY_NAME["brand_product_avg"]
+
+        assert run_scenario(scenario, respondent_count=20, repeats=3)["answers"] == run_scenario(scenario, respondent_count=20, repeats=1)["answers"]
+
+
+def test_calibrate():
+    assert calibrate(iterations=1000, repeats=3) > 0
+
+
+class TestFindRegressions:
+
+    def test_within_tolerance(self):
+        assert find_regressions(results(80.0), results(100.0), tolerance=0.3) == []
+
+    def test_slower(self):
+        assert find_regressions(results(60.0), results(100.0), tolerance=0.3) == ["scenarios.s: 60% of baseline throughput"]
+
+    def test_relative_to_calibration(self):
+        # Half the throughput on a machine half as fast isn't a regression
+        assert find_regressions(results(50.0, calibration=500.0), results(100.0), tolerance=0.3) == []
+
+    def test_different_answers(self):
+        assert find_regressions(results(100.0, answers=11), results(100.0)) == ["scenarios.s: 11 answers, baseline has 10"]
+
+    def test_new_scenario(self):
+        baseline = results(100.0)
+        baseline["scenarios"] = {}
+
+        assert find_regressions(results(100.0), baseline) == []
+
+
+@pytest.mark.skipif(not os.environ.get("RUN_BENCHMARKS"), reason="Set RUN_BENCHMARKS=1 to compare against the stored baseline")
+def test_no_regressions_against_baseline():
+    assert find_regressions(run_benchmarks(), json.loads(BASELINE_PATH.read_text())) == []
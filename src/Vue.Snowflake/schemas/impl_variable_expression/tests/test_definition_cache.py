@@ -0,0 +1,47 @@
+"""
+Pytest tests for DefinitionCache and batching rows by definition.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the functions directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+
+from _definition_cache import DefinitionCache, definition_hash, definition_runs
+
+
+class TestDefinitionCache:
+
+    def test_parses_equal_definitions_once(self):
+        parses = []
+        cache = DefinitionCache(max_size=2, parse=lambda definition: parses.append(definition) or len(definition["Groups"]))
+
+        assert cache.get({"Groups": [1, 2]}) == 2
+        assert cache.get({"Groups": [1, 2]}) == 2
+        assert cache.get({"Groups": [3]}) == 1
+        assert cache.get({"Groups": [1, 2]}) == 2
+
+        assert len(parses) == 2
+        # The repeat of the last definition doesn't even reach the LRU cache
+        assert cache.stats()["hits"] == 1
+
+    def test_hash_ignores_key_order(self):
+        assert definition_hash({"a": 1, "b": [1, 2]}) == definition_hash({"b": [1, 2], "a": 1})
+        assert definition_hash({"a": 1}) != definition_hash({"a": 2})
+
+    def test_clear(self):
+        cache = DefinitionCache(max_size=2, parse=lambda definition: object())
+        first = cache.get({"Groups": []})
+
+        cache.clear()
+
+        assert cache.get({"Groups": []}) is not first
+
+
+def test_definition_runs():
+    definitions = [{"a": 1}, {"a": 1}, {"a": 2}, {"a": 2}, {"a": 1}]
+    requested = [None, None, None, [1], [1]]
+
+    assert [(start, end) for start, end, _, _ in definition_runs(definitions, requested)] == [(0, 2), (2, 3), (3, 4), (4, 5)]
+    assert list(definition_runs([], [])) == []
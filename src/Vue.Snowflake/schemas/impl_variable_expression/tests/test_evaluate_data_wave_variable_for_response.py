@@ -0,0 +1,159 @@
+"""
+Pytest tests for evaluating data wave variables, one respondent at a time and in batches.
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the functions directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+
+import pandas
+import pytest
+import _evaluate_data_wave_variable_for_response
+from _evaluate_data_wave_variable_for_response import (
+    evaluate_data_wave_variable_for_response,
+    evaluate_data_wave_variable_for_responses,
+    evaluate_data_wave_variable_for_responses_batch,
+    get_wave_index,
+    parse_wave_definition,
+)
+
+
+def wave_group(entity_id, min_date, max_date):
+    return {"ToEntityInstanceId": entity_id, "Component": {"MinDate": min_date, "MaxDate": max_date}}
+
+
+MONTHLY_DEFINITION = {
+    "Groups": [
+        wave_group(2, "2024-02-01T00:00:00Z", "2024-02-29T23:59:59Z"),
+        wave_group(1, "2024-01-01T00:00:00Z", "2024-01-31T23:59:59Z"),
+        wave_group(3, "2024-03-01T00:00:00Z", "2024-03-31T23:59:59Z"),
+    ]
+}
+
+# Quarters overlapping the months, and a wave within another
+OVERLAPPING_DEFINITION = {
+    "Groups": MONTHLY_DEFINITION["Groups"] + [
+        wave_group(10, "2024-01-01T00:00:00Z", "2024-03-31T23:59:59Z"),
+        wave_group(11, "2024-01-10T00:00:00Z", "2024-01-20T00:00:00Z"),
+        wave_group(12, "2023-12-15T00:00:00Z", "2024-02-15T00:00:00Z"),
+    ]
+}
+
+
+@pytest.fixture(autouse=True)
+def utc(monkeypatch):
+    # Naive timestamps are UTC in Snowflake's Python runtime
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    _evaluate_data_wave_variable_for_response.clear_wave_index_cache()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+class TestEvaluateDataWaveVariableForResponse:
+
+    def test_matching_wave(self):
+        assert evaluate_data_wave_variable_for_response(1, datetime(2024, 2, 10), MONTHLY_DEFINITION, None) == [
+            [None, None, None, 2, 2]
+        ]
+
+    def test_no_matching_wave(self):
+        assert evaluate_data_wave_variable_for_response(1, datetime(2025, 1, 1), MONTHLY_DEFINITION, None) is None
+
+    def test_requested_waves(self):
+        assert evaluate_data_wave_variable_for_response(1, datetime(2024, 1, 15), OVERLAPPING_DEFINITION, [12]) == [
+            [None, None, None, 12, 12]
+        ]
+
+    def test_invalid_definition(self):
+        assert evaluate_data_wave_variable_for_response(1, datetime(2024, 1, 15), {}, None) is None
+
+    def test_definition_parsed_once(self, monkeypatch):
+        parses = []
+        original = _evaluate_data_wave_variable_for_response.parse_wave_definition
+        monkeypatch.setattr(
+            _evaluate_data_wave_variable_for_response, "parse_wave_definition",
+            lambda definition: parses.append(1) or original(definition),
+        )
+
+        for day in range(1, 20):
+            evaluate_data_wave_variable_for_response(day, datetime(2024, 1, day), MONTHLY_DEFINITION, None)
+        # An equal definition, as deserialized for another row, after another variable's
+        evaluate_data_wave_variable_for_response(20, datetime(2024, 1, 20), OVERLAPPING_DEFINITION, None)
+        evaluate_data_wave_variable_for_response(21, datetime(2024, 1, 21), {"Groups": list(MONTHLY_DEFINITION["Groups"])}, None)
+
+        assert len(parses) == 2
+        assert _evaluate_data_wave_variable_for_response.wave_index_cache_stats()["hits"] == 1
+
+
+class TestWaveIndex:
+
+    def test_sorted_bounds(self):
+        wave_index = get_wave_index(MONTHLY_DEFINITION)
+
+        assert [wave.entity_id for wave in wave_index.waves] == [1, 2, 3]
+        assert wave_index.max_timestamps == [wave.max_timestamp for wave in parse_wave_definition(MONTHLY_DEFINITION)]
+
+    def test_assign_waves_on_bounds(self):
+        wave_index = get_wave_index(MONTHLY_DEFINITION)
+        january = wave_index.waves[0]
+
+        assert wave_index.assign_waves([january.min_timestamp, january.max_timestamp, january.max_timestamp + 0.5]) == [
+            [1], [1], []
+        ]
+
+    def test_assign_waves_null(self):
+        assert get_wave_index(MONTHLY_DEFINITION).assign_waves([float("nan")]) == [[]]
+
+
+class TestEvaluateDataWaveVariableForResponsesBatch:
+
+    @pytest.mark.parametrize("definition", [MONTHLY_DEFINITION, OVERLAPPING_DEFINITION], ids=["monthly", "overlapping"])
+    @pytest.mark.parametrize("requested", [None, [1, 10, 12]])
+    def test_same_as_one_at_a_time(self, definition, requested):
+        rng = random.Random(0)
+        timestamps = [datetime(2023, 12, 1) + timedelta(seconds=rng.randint(0, 150 * 24 * 3600)) for _ in range(500)]
+        # Exactly on every wave's bounds too
+        for wave in parse_wave_definition(definition):
+            timestamps += [datetime.fromtimestamp(wave.min_timestamp), datetime.fromtimestamp(wave.max_timestamp)]
+
+        expected = [
+            evaluate_data_wave_variable_for_response(response_id, timestamp, definition, requested)
+            for response_id, timestamp in enumerate(timestamps)
+        ]
+        actual = evaluate_data_wave_variable_for_responses_batch(
+            range(len(timestamps)), timestamps, [definition] * len(timestamps), [requested] * len(timestamps)
+        )
+
+        assert actual == expected
+        if definition is OVERLAPPING_DEFINITION:
+            assert any(answer_array is not None and len(answer_array) > 1 for answer_array in actual)
+
+    def test_mixed_definitions_and_nulls(self):
+        definitions = [MONTHLY_DEFINITION, MONTHLY_DEFINITION, OVERLAPPING_DEFINITION, {}, MONTHLY_DEFINITION]
+        timestamps = [datetime(2024, 1, 15), None, datetime(2024, 1, 15), datetime(2024, 1, 15), datetime(2024, 3, 1)]
+
+        assert evaluate_data_wave_variable_for_responses_batch(range(5), timestamps, definitions, [None] * 5) == [
+            [[None, None, None, 1, 1]],
+            None,
+            # As in C#, the search stops at the first wave (by max date) that starts after the timestamp, so misses 10
+            [[None, None, None, 11, 11], [None, None, None, 1, 1], [None, None, None, 12, 12]],
+            None,
+            [[None, None, None, 3, 3]],
+        ]
+
+    def test_vectorized_handler(self):
+        df = pandas.DataFrame({
+            "response_id": [1, 2],
+            "response_timestamp": pandas.to_datetime(["2024-02-10", "2024-03-10"]),
+            "definition": [MONTHLY_DEFINITION, MONTHLY_DEFINITION],
+            "requested_wave_entity_ids": [None, None],
+        })
+
+        assert list(evaluate_data_wave_variable_for_responses(df)) == [[[None, None, None, 2, 2]], [[None, None, None, 3, 3]]]
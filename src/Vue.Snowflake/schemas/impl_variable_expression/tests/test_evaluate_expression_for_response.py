@@ -0,0 +1,569 @@
+"""
+Pytest tests for evaluating variable expressions, using the same json test cases as debug_evaluate_expression_local.py
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# Add the functions directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+
+import pandas
+import pytest
+import _evaluate_expression_for_response
+from _answer_columns import pack_answer_arrays
+from _evaluate_expression_for_response import (
+    EvaluateExpressionAnswerRowsForResponses,
+    EvaluateExpressionForResponses,
+    EvaluateExpressionStatsForResponses,
+    EvaluateExpressionsAnswerRowsForResponses,
+    EvaluateExpressionsForResponses,
+    Result,
+    answer_rows,
+    compile_expression,
+    compiled_expression_cache_stats,
+    evaluate_expression_core_for_response,
+    evaluate_expression_core_for_responses,
+    evaluate_expressions_core_for_response,
+    evaluate_expressions_core_for_responses,
+    result_class,
+    snowflake_integer,
+)
+from _evaluation_stats import PHASES, EvaluationStats
+from _parse_python_expression import hoist_result_invariants
+
+
+def load_test_case(file_name):
+    """Test cases are exported from Snowflake with either upper or lower case keys."""
+    with open(Path(__file__).parent / file_name, 'r') as f:
+        return {key.lower(): value for key, value in json.load(f).items()}
+
+
+def count_answer_lookups(monkeypatch, describe):
+    """
+    Record describe(question_variable, kwargs) for every lookup of a respondent's answers,
+    whether by calling the QuestionVariable or by a fast path getting its index.
+    """
+    calls = []
+    question_variable_class = _evaluate_expression_for_response.QuestionVariable
+    original_call = question_variable_class.__call__
+    original_index_for = question_variable_class.index_for
+
+    def counting_call(self, **kwargs):
+        calls.append(describe(self, kwargs))
+        return original_call(self, **kwargs)
+
+    def counting_index_for(self, keywords):
+        calls.append(describe(self, dict.fromkeys(keywords)))
+        return original_index_for(self, keywords)
+
+    monkeypatch.setattr(question_variable_class, "__call__", counting_call)
+    monkeypatch.setattr(question_variable_class, "index_for", counting_index_for)
+    return calls
+
+
+def evaluate_test_case(test_data):
+    return evaluate_expression_core_for_response(
+        response_id=test_data.get("response_id"),
+        variable_expression=test_data["python_expression"],
+        entity_names=test_data["entity_identifiers"],
+        entity_instance_arrays=test_data.get("entity_instance_arrays"),
+        dependency_shapes=test_data["dependency_entity_types"],
+        dependency_answers=test_data["answer_arrays_by_variable_identifier"],
+    )
+
+
+@pytest.mark.parametrize(
+    "file_name, expected",
+    [
+        ("zero_entity.json", [[None, None, None, None, 6]]),
+        ("one_asked_one_answered.json", [[None, None, None, None, 0]]),
+        ("empty_dependency_answer.json", [[1, None, None, None, 1]]),
+    ],
+)
+def test_evaluate_expression_core_for_response(file_name, expected):
+    assert evaluate_test_case(load_test_case(file_name)) == expected
+
+
+@pytest.mark.parametrize("file_name", ["zero_entity.json", "one_asked_one_answered.json", "empty_dependency_answer.json"])
+def test_packed_dependency_answers_evaluate_the_same(file_name):
+    test_data = load_test_case(file_name)
+    packed_test_data = dict(test_data, answer_arrays_by_variable_identifier={
+        variable: pack_answer_arrays(answers)
+        for variable, answers in test_data["answer_arrays_by_variable_identifier"].items()
+    })
+
+    assert evaluate_test_case(packed_test_data) == evaluate_test_case(test_data)
+
+
+class TestEvaluateExpressionForResponses:
+    """The batch entry point must give the same answers as calling the scalar one per respondent."""
+
+    EXPRESSION = "max(response.Rating(brand=result.brand), default=None)"
+    DEPENDENCY_SHAPES = {"Rating": ["brand"]}
+    ANSWERS_BY_RESPONSE = {
+        1: {"Rating": [[1, None, None, 3], [2, None, None, 5]]},
+        2: {"Rating": []},
+        3: {"Rating": [[2, None, None, 4], [2, None, None, 7]]},
+    }
+
+    def test_matches_scalar_evaluation(self):
+        batch = dict(evaluate_expression_core_for_responses(
+            self.EXPRESSION, ["brand"], [[1, 2]], self.DEPENDENCY_SHAPES,
+            list(self.ANSWERS_BY_RESPONSE), list(self.ANSWERS_BY_RESPONSE.values()),
+        ))
+
+        for response_id, dependency_answers in self.ANSWERS_BY_RESPONSE.items():
+            scalar = evaluate_expression_core_for_response(
+                response_id, self.EXPRESSION, ["brand"], [[1, 2]], self.DEPENDENCY_SHAPES, dependency_answers
+            )
+            assert batch.get(response_id, []) == scalar
+
+    def test_omits_respondents_without_answers(self):
+        batch = dict(evaluate_expression_core_for_responses(
+            self.EXPRESSION, ["brand"], [[1, 2]], self.DEPENDENCY_SHAPES,
+            list(self.ANSWERS_BY_RESPONSE), list(self.ANSWERS_BY_RESPONSE.values()),
+        ))
+
+        assert batch == {
+            1: [[1, None, None, None, 3], [2, None, None, None, 5]],
+            3: [[2, None, None, None, 7]],
+        }
+
+    def test_vectorized_handler(self):
+        rows = [
+            [81, "Max_rating", response_id, self.EXPRESSION, ["brand"], [[1, 2]], self.DEPENDENCY_SHAPES, answers]
+            for response_id, answers in self.ANSWERS_BY_RESPONSE.items()
+        ]
+        result = EvaluateExpressionForResponses().end_partition(pandas.DataFrame(rows))
+
+        assert list(result.columns) == ["response_set_id", "variable_identifier", "response_id", "answer_array"]
+        assert result["response_id"].tolist() == [1, 3]
+        assert set(result["response_set_id"]) == {81}
+        assert result["answer_array"].tolist()[1] == [[2, None, None, None, 7]]
+
+    def test_answer_rows_handler(self):
+        rows = [
+            [81, "Max_rating", response_id, self.EXPRESSION, ["brand"], [[1, 2]], self.DEPENDENCY_SHAPES, answers]
+            for response_id, answers in self.ANSWERS_BY_RESPONSE.items()
+        ]
+        result = EvaluateExpressionAnswerRowsForResponses().end_partition(pandas.DataFrame(rows))
+
+        assert list(result.columns) == [
+            "response_set_id", "variable_identifier", "response_id",
+            "asked_entity_id_1", "asked_entity_id_2", "asked_entity_id_3", "answer_value",
+        ]
+        assert set(result["response_set_id"]) == {81} and set(result["variable_identifier"]) == {"Max_rating"}
+        assert str(result["answer_value"].dtype) == "Int64"
+        assert [
+            (row.response_id, row.asked_entity_id_1, row.asked_entity_id_2, row.answer_value)
+            for row in result.astype(object).where(result.notna(), None).itertuples()
+        ] == [(1, 1, None, 3), (1, 2, None, 5), (3, 2, None, 7)]
+
+
+class TestCompiledExpressionCache:
+
+    def test_same_expression_compiled_once(self):
+        expression = "response.Cached_compile_test() and 1"
+        before = compiled_expression_cache_stats()
+
+        first = compile_expression(expression)
+        second = compile_expression(expression)
+
+        after = compiled_expression_cache_stats()
+        assert first is second
+        assert after["misses"] - before["misses"] == 1
+        assert after["hits"] - before["hits"] == 1
+
+    def test_invalid_expression_still_raises(self):
+        with pytest.raises(SyntaxError):
+            compile_expression("response.X(")
+        with pytest.raises(SyntaxError):
+            compile_expression("response.X(")
+
+
+class TestResultInvariantHoisting:
+    """Hoisted evaluation must give exactly the same answers as evaluating the expression as written."""
+
+    DEPENDENCY_SHAPES = {"Rating": ["brand", "product"], "Base": ["region"]}
+    ENTITY_INSTANCE_ARRAYS = [[1, 2, 3], [10, 20]]
+    DEPENDENCY_ANSWERS = {
+        "Rating": [[1, 10, None, 4], [2, 20, None, 0], [3, 10, None, 9]],
+        "Base": [[5, None, None, 1]],
+    }
+
+    @pytest.mark.parametrize(
+        "expression",
+        [
+            "max(response.Rating(brand=result.brand, product=result.product), default=None) if any(1 for r in response.Base()) else None",
+            "max(response.Rating(brand=result.brand, product=result.product), default=None) if any(1 for r in response.Base(region=7)) else None",
+            "result.brand if result.product == 10 and any(response.Base(region=[5])) else None",
+            "sum(v for v in response.Rating() if v > result.brand)",
+            "len(response.Rating())",
+            "None",
+        ],
+    )
+    def test_same_answers_as_unhoisted(self, expression):
+        args = (["brand", "product"], self.ENTITY_INSTANCE_ARRAYS, self.DEPENDENCY_SHAPES, self.DEPENDENCY_ANSWERS)
+        assert hoist_result_invariants(expression) is not None
+
+        unhoisted = _evaluate_expression_for_response.CompiledExpression(
+            expression, eval(f"lambda response, result, invariant_values: {expression}")
+        )
+        (entity_names, entity_instance_arrays, dependency_shapes, dependency_answers) = (
+            _evaluate_expression_for_response.normalize_inputs(*args)
+        )
+        expected = _evaluate_expression_for_response.evaluate_compiled_expression_for_response(
+            unhoisted, entity_names, entity_instance_arrays, dependency_shapes, dependency_answers
+        )
+
+        assert evaluate_expression_core_for_response(1, expression, *args) == expected
+
+    def test_base_evaluated_once_per_respondent(self, monkeypatch):
+        calls = count_answer_lookups(monkeypatch, lambda question_variable, kwargs: question_variable.entity_types)
+        evaluate_expression_core_for_response(
+            1,
+            "max(response.Rating(brand=result.brand, product=result.product), default=None) if any(1 for r in response.Base()) else None",
+            ["brand", "product"], self.ENTITY_INSTANCE_ARRAYS, self.DEPENDENCY_SHAPES, self.DEPENDENCY_ANSWERS,
+        )
+
+        assert calls.count(["region"]) == 1
+        assert calls.count(["brand", "product"]) == 6
+
+    def test_false_base_skips_entity_combinations(self, monkeypatch):
+        calls = count_answer_lookups(monkeypatch, lambda question_variable, kwargs: question_variable.entity_types)
+        answers = evaluate_expression_core_for_response(
+            1,
+            "max(response.Rating(brand=result.brand, product=result.product), default=None) if any(1 for r in response.Base(region=6)) else None",
+            ["brand", "product"], self.ENTITY_INSTANCE_ARRAYS, self.DEPENDENCY_SHAPES, self.DEPENDENCY_ANSWERS,
+        )
+
+        assert answers == []
+        assert calls == [["region"]]
+
+    def test_invariant_not_evaluated_without_entity_combinations(self, monkeypatch):
+        calls = count_answer_lookups(monkeypatch, lambda question_variable, kwargs: question_variable.entity_types)
+        answers = evaluate_expression_core_for_response(
+            1, "len(response.Rating())",
+            ["brand", "product"], [[1, 2, 3], []], self.DEPENDENCY_SHAPES, self.DEPENDENCY_ANSWERS,
+        )
+
+        assert answers == []
+        assert calls == []
+
+
+class TestAnsweredEntityCombinations:
+    """Only iterating answered entity instances must give exactly the same answers as iterating all of them."""
+
+    DEPENDENCY_SHAPES = {"Rating": ["brand", "product"]}
+    ENTITY_INSTANCE_ARRAYS = [list(range(1, 51)), [10, 20, 30]]
+    DEPENDENCY_ANSWERS = {"Rating": [[3, 10, None, 4], [3, 20, None, 0], [40, 30, None, 9]]}
+
+    @pytest.mark.parametrize(
+        "expression",
+        [
+            "max(response.Rating(brand=result.brand, product=result.product), default=None)",
+            "max((v for v in response.Rating(brand=[result.brand]) if v > 0), default=None) if result.product != 20 else None",
+            "min(response.Rating(brand=result.brand, product=[10, 30]), default=None)",
+        ],
+    )
+    def test_same_answers_as_all_combinations(self, expression):
+        args = (["brand", "product"], self.ENTITY_INSTANCE_ARRAYS, self.DEPENDENCY_SHAPES, self.DEPENDENCY_ANSWERS)
+        compiled = _evaluate_expression_for_response.compile_expression(expression)
+        assert compiled.required_answer_bindings
+
+        all_combinations = _evaluate_expression_for_response.CompiledExpression(
+            expression, eval(f"lambda response, result, invariant_values: {expression}")
+        )
+        (entity_names, entity_instance_arrays, dependency_shapes, dependency_answers) = (
+            _evaluate_expression_for_response.normalize_inputs(*args)
+        )
+        expected = _evaluate_expression_for_response.evaluate_compiled_expression_for_response(
+            all_combinations, entity_names, entity_instance_arrays, dependency_shapes, dependency_answers
+        )
+
+        assert evaluate_expression_core_for_response(1, expression, *args) == expected
+
+    def test_only_answered_combinations_evaluated(self, monkeypatch):
+        calls = count_answer_lookups(monkeypatch, lambda question_variable, kwargs: kwargs)
+        answers = evaluate_expression_core_for_response(
+            1, "max(response.Rating(brand=result.brand, product=result.product), default=None)",
+            ["brand", "product"], self.ENTITY_INSTANCE_ARRAYS, self.DEPENDENCY_SHAPES, self.DEPENDENCY_ANSWERS,
+        )
+
+        assert answers == [[3, 10, None, None, 4], [3, 20, None, None, 0], [40, 30, None, None, 9]]
+        # brands {3, 40} x products {10, 20, 30} rather than 50 x 3
+        assert len(calls) == 6
+
+
+class TestResultClass:
+
+    def test_cached_per_entity_names(self):
+        assert result_class(["brand", "product"]) is result_class(("brand", "product"))
+        assert result_class(["brand", "product"]) is not result_class(["product", "brand"])
+
+    def test_slotted(self):
+        result = result_class(["brand"])()
+        assert not hasattr(result, "__dict__")
+
+    def test_base_is_abstract(self):
+        with pytest.raises(TypeError):
+            Result()
+
+    def test_updated_in_place(self):
+        result = result_class(["brand", "product"])()
+
+        result.set_entity_combination((3, 10, None, None))
+        assert (result.brand, result.product) == (3, 10)
+
+        result.set_entity_combination((4, None, None, None))
+        assert result.brand == 4
+        with pytest.raises(AttributeError):
+            result.product
+
+    def test_repeated_entity_name_uses_last_non_none(self):
+        result = result_class(["brand", "brand"])()
+
+        result.set_entity_combination((3, 5, None, None))
+        assert result.brand == 5
+        result.set_entity_combination((3, None, None, None))
+        assert result.brand == 3
+
+    def test_entity_names_that_cannot_be_slots(self):
+        result = result_class(["brand name", "__private"])()
+        result.set_entity_combination((1, 2, None, None))
+
+        assert getattr(result, "brand name") == 1
+        assert getattr(result, "__private") == 2
+
+    def test_one_result_object_per_respondent(self, monkeypatch):
+        result_ids = set()
+        expression = "max(response.Rating(brand=result.brand), default=None)"
+        compiled = compile_expression(expression)
+        original_evaluate = compiled.evaluate
+
+        def recording_evaluate(response, result, invariant_values):
+            result_ids.add(id(result))
+            return original_evaluate(response, result, invariant_values)
+
+        monkeypatch.setattr(compiled, "evaluate", recording_evaluate)
+        answers = evaluate_expression_core_for_response(
+            1, expression, ["brand"], [[1, 2, 3]], {"Rating": ["brand"]},
+            {"Rating": [[1, None, None, 3], [2, None, None, 5], [3, None, None, 1]]},
+        )
+
+        assert answers == [[1, None, None, None, 3], [2, None, None, None, 5], [3, None, None, None, 1]]
+        assert len(result_ids) == 1
+
+
+class TestEvaluateExpressionsForResponses:
+    """Evaluating several variables against one shared Response must give the same answers as evaluating each separately."""
+
+    DEPENDENCY_SHAPES = {"Rating": ["brand"], "Base": ["region"]}
+    EXPRESSIONS = [
+        ["Max_rating", "max(response.Rating(brand=result.brand), default=None)", ["brand"], [[1, 2]]],
+        ["Any_rating", "any(response.Rating())", [], []],
+        ["Based_rating", "max(response.Rating(brand=result.brand), default=None) if any(1 for r in response.Base(region=3)) else None", ["brand"], [[1, 2]]],
+    ]
+    ANSWERS_BY_RESPONSE = {
+        1: {"Rating": [[1, None, None, 3], [2, None, None, 5]], "Base": [[3, None, None, 1]]},
+        2: {"Rating": [], "Base": []},
+        3: {"Rating": [[2, None, None, 4]], "Base": [[4, None, None, 1]]},
+    }
+
+    def separately(self):
+        return {
+            variable_identifier: dict(evaluate_expression_core_for_responses(
+                expression, entity_names, entity_instance_arrays, self.DEPENDENCY_SHAPES,
+                list(self.ANSWERS_BY_RESPONSE), list(self.ANSWERS_BY_RESPONSE.values()),
+            ))
+            for variable_identifier, expression, entity_names, entity_instance_arrays in self.EXPRESSIONS
+        }
+
+    def test_single_respondent_matches_separate_evaluation(self):
+        separately = self.separately()
+        for response_id, dependency_answers in self.ANSWERS_BY_RESPONSE.items():
+            together = dict(evaluate_expressions_core_for_response(
+                response_id, self.EXPRESSIONS, self.DEPENDENCY_SHAPES, dependency_answers
+            ))
+            assert together == {
+                variable_identifier: answers[response_id]
+                for variable_identifier, answers in separately.items() if response_id in answers
+            }
+
+    def test_many_respondents_match_separate_evaluation(self):
+        answers_by_variable, error_message_by_variable = evaluate_expressions_core_for_responses(
+            self.EXPRESSIONS, self.DEPENDENCY_SHAPES, list(self.ANSWERS_BY_RESPONSE), list(self.ANSWERS_BY_RESPONSE.values())
+        )
+
+        assert error_message_by_variable == {}
+        assert {variable: dict(answers) for variable, answers in answers_by_variable.items()} == self.separately()
+
+    def test_one_response_object_per_respondent(self, monkeypatch):
+        responses = []
+        original_init = _evaluate_expression_for_response.Response.__init__
+
+        def counting_init(self, *args):
+            responses.append(self)
+            original_init(self, *args)
+
+        monkeypatch.setattr(_evaluate_expression_for_response.Response, "__init__", counting_init)
+        evaluate_expressions_core_for_responses(
+            self.EXPRESSIONS, self.DEPENDENCY_SHAPES, list(self.ANSWERS_BY_RESPONSE), list(self.ANSWERS_BY_RESPONSE.values())
+        )
+
+        assert len(responses) == len(self.ANSWERS_BY_RESPONSE)
+
+    def test_failing_variable_does_not_affect_others(self):
+        expressions = self.EXPRESSIONS + [
+            ["Broken_syntax", "response.Rating(", [], []],
+            ["Broken_for_respondent_2", "1 // len(response.Base(region=3))", [], []],
+        ]
+        answers_by_variable, error_message_by_variable = evaluate_expressions_core_for_responses(
+            expressions, self.DEPENDENCY_SHAPES, list(self.ANSWERS_BY_RESPONSE), list(self.ANSWERS_BY_RESPONSE.values())
+        )
+
+        assert set(error_message_by_variable) == {"Broken_syntax", "Broken_for_respondent_2"}
+        assert error_message_by_variable["Broken_for_respondent_2"].startswith("response_id 2: ZeroDivisionError")
+        assert {variable: dict(answers) for variable, answers in answers_by_variable.items()} == self.separately()
+
+    def test_vectorized_handler(self):
+        respondent_rows = [
+            [81, response_id, answers, None, None, None, None, None]
+            for response_id, answers in self.ANSWERS_BY_RESPONSE.items()
+        ]
+        variable_rows = [
+            [81, None, None, variable_identifier, expression, entity_names, entity_instance_arrays, self.DEPENDENCY_SHAPES]
+            for variable_identifier, expression, entity_names, entity_instance_arrays in self.EXPRESSIONS + [["Broken", "response.X(", [], []]]
+        ]
+        result = EvaluateExpressionsForResponses().end_partition(pandas.DataFrame(variable_rows[:1] + respondent_rows + variable_rows[1:]))
+
+        assert list(result.columns) == ["response_set_id", "variable_identifier", "response_id", "answer_array", "error_message"]
+        assert set(result["response_set_id"]) == {81}
+        rows = result[result["error_message"].isna()]
+        assert {
+            variable: {int(row.response_id): row.answer_array for row in group.itertuples()}
+            for variable, group in rows.groupby("variable_identifier")
+        } == self.separately()
+        errors = result[result["error_message"].notna()]
+        assert errors["variable_identifier"].tolist() == ["Broken"]
+
+
+    def test_answer_rows_handler(self):
+        respondent_rows = [
+            [81, response_id, answers, None, None, None, None, None]
+            for response_id, answers in self.ANSWERS_BY_RESPONSE.items()
+        ]
+        variable_rows = [
+            [81, None, None, variable_identifier, expression, entity_names, entity_instance_arrays, self.DEPENDENCY_SHAPES]
+            for variable_identifier, expression, entity_names, entity_instance_arrays in self.EXPRESSIONS + [["Broken", "response.X(", [], []]]
+        ]
+        result = EvaluateExpressionsAnswerRowsForResponses().end_partition(pandas.DataFrame(variable_rows[:1] + respondent_rows + variable_rows[1:]))
+
+        assert list(result.columns) == [
+            "response_set_id", "variable_identifier", "response_id",
+            "asked_entity_id_1", "asked_entity_id_2", "asked_entity_id_3", "answer_value", "error_message",
+        ]
+        rows = result[result["error_message"].isna()].astype(object).where(result.notna(), None)
+        assert sorted(
+            (row.variable_identifier, row.response_id, row.asked_entity_id_1, row.asked_entity_id_2, row.asked_entity_id_3, row.answer_value)
+            for row in rows.itertuples()
+        ) == sorted(
+            (variable_identifier, *row)
+            for variable_identifier, answers in self.separately().items()
+            for row in answer_rows(answers.items())
+        )
+        errors = result[result["error_message"].notna()]
+        assert errors["variable_identifier"].tolist() == ["Broken"]
+        assert errors[["response_id", "answer_value"]].isna().all().all()
+
+
+class TestAnswerRows:
+    """Typed rows must be what the lateral flatten and `::integer` casts in _uncached_derived_answers give."""
+
+    @pytest.mark.parametrize("value, expected", [
+        (2.5, 3), (-2.5, -3), (2.4999, 2), (3, 3), (True, 1), (False, 0), (None, None), (float("nan"), None),
+    ])
+    def test_rounds_half_away_from_zero_like_snowflake(self, value, expected):
+        assert snowflake_integer(value) == expected
+
+    def test_one_row_per_answer_without_answer_entity(self):
+        rows = list(answer_rows([(1, [[1, None, None, 9, 4.5], [2, None, None, None, 0.2]]), (2, [[None, None, None, None, True]])]))
+
+        assert rows == [(1, 1, None, None, 5), (1, 2, None, None, 0), (2, None, None, None, 1)]
+
+
+class TestEvaluationStats:
+    """Instrumentation must count what was done without changing any answers."""
+
+    EXPRESSION = "max(response.Rating(brand=result.brand, product=result.product), default=None) if any(1 for r in response.Base()) else None"
+    DEPENDENCY_SHAPES = {"Rating": ["brand", "product"], "Base": ["region"]}
+    ENTITY_INSTANCE_ARRAYS = [list(range(1, 51)), [10, 20, 30]]
+    ANSWERS_BY_RESPONSE = {
+        1: {"Rating": [[3, 10, None, 4], [3, 20, None, 0], [40, 30, None, 9]], "Base": [[1, None, None, 1]]},
+        # Not in the base
+        2: {"Rating": [[3, 10, None, 4]], "Base": []},
+    }
+
+    def evaluate(self, stats):
+        return dict(evaluate_expression_core_for_responses(
+            self.EXPRESSION, ["brand", "product"], self.ENTITY_INSTANCE_ARRAYS, self.DEPENDENCY_SHAPES,
+            list(self.ANSWERS_BY_RESPONSE), list(self.ANSWERS_BY_RESPONSE.values()), stats,
+        ))
+
+    def test_same_answers(self):
+        assert self.evaluate(EvaluationStats()) == self.evaluate(None)
+
+    def test_counts(self):
+        stats = EvaluationStats()
+        self.evaluate(stats)
+
+        assert stats.respondents == 2
+        assert stats.guarded_respondents == 1
+        # brands {3, 40} x products {10, 20, 30}
+        assert stats.combinations_tried == 6
+        assert stats.combinations_emitted == 3
+        assert stats.sorted_index_builds + stats.nested_dict_builds == 1
+        assert stats.index_lookups == 6
+
+    def test_phases(self):
+        stats = EvaluationStats()
+        self.evaluate(stats)
+        as_dict = stats.to_dict()
+
+        assert set(as_dict["phase_seconds"]) == set(PHASES)
+        assert all(seconds >= 0 for seconds in as_dict["phase_seconds"].values())
+        assert as_dict["phase_seconds"]["evaluate_expression"] > 0
+        assert json.loads(json.dumps(as_dict)) == as_dict
+
+    def test_result_independent_expression(self):
+        stats = EvaluationStats()
+        answers = evaluate_expression_core_for_response(
+            1, "max(response.Rating(), default=None)", ["brand"], [[1, 2, 3]], self.DEPENDENCY_SHAPES,
+            self.ANSWERS_BY_RESPONSE[1], stats,
+        )
+
+        assert len(answers) == 3
+        assert (stats.combinations_tried, stats.combinations_emitted) == (1, 3)
+
+    def test_merge(self):
+        first, second = EvaluationStats(), EvaluationStats()
+        self.evaluate(first)
+        self.evaluate(second)
+        combined = EvaluationStats().merge(first).merge(second)
+
+        assert combined.respondents == 4
+        assert combined.combinations_tried == 12
+        assert combined.phase_seconds["compile"] == pytest.approx(first.phase_seconds["compile"] + second.phase_seconds["compile"])
+
+    def test_vectorized_handler(self):
+        rows = [
+            [81, "Max_rating", response_id, self.EXPRESSION, ["brand", "product"], self.ENTITY_INSTANCE_ARRAYS, self.DEPENDENCY_SHAPES, answers]
+            for response_id, answers in self.ANSWERS_BY_RESPONSE.items()
+        ]
+        result = EvaluateExpressionStatsForResponses().end_partition(pandas.DataFrame(rows))
+
+        assert list(result.columns) == ["response_set_id", "variable_identifier", "evaluation_stats"]
+        assert len(result) == 1
+        assert result["evaluation_stats"].iloc[0]["combinations_emitted"] == 3
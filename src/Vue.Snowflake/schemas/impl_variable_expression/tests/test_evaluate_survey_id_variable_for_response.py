@@ -0,0 +1,130 @@
+"""
+Pytest tests for evaluating survey ID variables, one respondent at a time, in batches and as a static mapping.
+"""
+
+import random
+import sys
+from pathlib import Path
+
+# Add the functions directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+
+import pandas
+import pytest
+import _evaluate_survey_id_variable_for_response
+from _evaluate_survey_id_variable_for_response import (
+    evaluate_survey_id_variable_for_response,
+    evaluate_survey_id_variable_for_responses,
+    evaluate_survey_id_variable_for_responses_batch,
+    survey_id_mapping_rows,
+)
+
+
+def survey_group(entity_id, survey_ids):
+    # As serialized by C#, with the properties the mapping doesn't need
+    return {
+        "ToEntityInstanceName": f"Group {entity_id}",
+        "ToEntityInstanceId": entity_id,
+        "Component": {"discriminator": "SurveyIdVariableComponent", "SurveyIds": survey_ids},
+    }
+
+
+DEFINITION = {
+    "Groups": [
+        survey_group(1, [100, 101]),
+        survey_group(2, [102]),
+        # Overlapping with the first group
+        survey_group(3, [101, 103]),
+    ]
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    _evaluate_survey_id_variable_for_response.clear_survey_id_lookup_cache()
+
+
+class TestEvaluateSurveyIdVariableForResponse:
+
+    def test_matching_group(self):
+        assert evaluate_survey_id_variable_for_response(1, 102, DEFINITION, None) == [[None, None, None, 2, 2]]
+
+    def test_overlapping_groups_in_definition_order(self):
+        assert evaluate_survey_id_variable_for_response(1, 101, DEFINITION, None) == [
+            [None, None, None, 1, 1], [None, None, None, 3, 3]
+        ]
+
+    def test_requested_groups(self):
+        assert evaluate_survey_id_variable_for_response(1, 101, DEFINITION, [3]) == [[None, None, None, 3, 3]]
+
+    def test_no_matching_group(self):
+        assert evaluate_survey_id_variable_for_response(1, 999, DEFINITION, None) is None
+
+    def test_invalid_groups_skipped(self):
+        definition = {"Groups": [{"ToEntityInstanceName": "No id", "Component": {"SurveyIds": [100]}}, survey_group(2, [100])]}
+
+        assert evaluate_survey_id_variable_for_response(1, 100, definition, None) == [[None, None, None, 2, 2]]
+
+    def test_definition_parsed_once(self, monkeypatch):
+        parses = []
+        original = _evaluate_survey_id_variable_for_response._survey_id_lookup_cache._parse
+        monkeypatch.setattr(
+            _evaluate_survey_id_variable_for_response._survey_id_lookup_cache, "_parse",
+            lambda definition: parses.append(1) or original(definition),
+        )
+
+        for response_id in range(10):
+            evaluate_survey_id_variable_for_response(response_id, 100 + response_id % 4, {"Groups": list(DEFINITION["Groups"])}, None)
+
+        assert len(parses) == 1
+
+
+class TestEvaluateSurveyIdVariableForResponsesBatch:
+
+    @pytest.mark.parametrize("requested", [None, [1, 2]])
+    def test_same_as_one_at_a_time(self, requested):
+        rng = random.Random(0)
+        survey_ids = [rng.choice([99, 100, 101, 102, 103, None]) for _ in range(200)]
+
+        expected = [
+            evaluate_survey_id_variable_for_response(response_id, survey_id, DEFINITION, requested)
+            for response_id, survey_id in enumerate(survey_ids)
+        ]
+
+        assert evaluate_survey_id_variable_for_responses_batch(
+            range(len(survey_ids)), survey_ids, [DEFINITION] * len(survey_ids), [requested] * len(survey_ids)
+        ) == expected
+
+    def test_mixed_definitions(self):
+        other = {"Groups": [survey_group(7, [100])]}
+
+        assert evaluate_survey_id_variable_for_responses_batch(
+            range(4), [100, 100, 100, 100], [DEFINITION, other, {}, DEFINITION], [None] * 4
+        ) == [[[None, None, None, 1, 1]], [[None, None, None, 7, 7]], None, [[None, None, None, 1, 1]]]
+
+    def test_vectorized_handler(self):
+        df = pandas.DataFrame({
+            "response_id": [1, 2, 3],
+            # Nulls make pandas store the survey IDs as floats
+            "response_survey_id": [102.0, None, 103.0],
+            "definition": [DEFINITION] * 3,
+            "requested_survey_group_entity_ids": [None] * 3,
+        })
+
+        assert list(evaluate_survey_id_variable_for_responses(df)) == [
+            [[None, None, None, 2, 2]], None, [[None, None, None, 3, 3]]
+        ]
+
+
+class TestSurveyIdMappingRows:
+
+    def test_rows(self):
+        assert sorted(survey_id_mapping_rows(DEFINITION)) == [(100, 1), (101, 1), (101, 3), (102, 2), (103, 3)]
+
+    def test_same_answers_as_evaluating(self):
+        rows = survey_id_mapping_rows(DEFINITION)
+
+        for survey_id in [99, 100, 101, 102, 103]:
+            # As _uncached_survey_id_variable_answer_arrays joins the mapping to respondents
+            joined = [[None, None, None, group_id, group_id] for mapped_survey_id, group_id in rows if mapped_survey_id == survey_id]
+            assert (joined or None) == evaluate_survey_id_variable_for_response(1, survey_id, DEFINITION, None)
@@ -0,0 +1,176 @@
+"""
+Pytest tests for the expression plan cache and its fast paths.
+Fast paths must give exactly the same answers as evaluating the expression with eval.
+"""
+
+import random
+import sys
+from pathlib import Path
+
+# Add the functions directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+
+import pytest
+import _evaluate_expression_for_response
+from _build_metric_variable_expression import build_metric_variable_expression
+from _expression_plan_cache import ExpressionPlanCache, expression_fast_path
+
+DEPENDENCY_SHAPES = {"Rating": ["brand", "product"], "Base": ["brand"], "Region": ["region"]}
+ENTITY_NAMES = ["brand", "product"]
+ENTITY_INSTANCE_ARRAYS = [[1, 2, 3, 4], [10, 20, 30]]
+
+
+def random_respondents(count=50, seed=0, values=(0, 1, 4, 5, 9)):
+    rng = random.Random(seed)
+    combinations = [(brand, product) for brand in ENTITY_INSTANCE_ARRAYS[0] for product in ENTITY_INSTANCE_ARRAYS[1]]
+    for _ in range(count):
+        rated = sorted(rng.sample(combinations, rng.randint(0, 6)))
+        yield {
+            "Rating": [[brand, product, None, rng.choice(values)] for brand, product in rated],
+            "Base": [[brand, None, None, 1] for brand in sorted({brand for brand, _ in rated}) if rng.random() < 0.7],
+            "Region": [[rng.randint(1, 3), None, None, 1]],
+        }
+
+
+def evaluate_with_eval(expression, dependency_answers):
+    (entity_names, entity_instance_arrays, dependency_shapes, dependency_answers) = (
+        _evaluate_expression_for_response.normalize_inputs(
+            ENTITY_NAMES, ENTITY_INSTANCE_ARRAYS, DEPENDENCY_SHAPES, dependency_answers
+        )
+    )
+    with_eval = _evaluate_expression_for_response.CompiledExpression(
+        expression, eval(f"lambda response, result, invariant_values: {expression}")
+    )
+    return _evaluate_expression_for_response.evaluate_compiled_expression_for_response(
+        with_eval, entity_names, entity_instance_arrays, dependency_shapes, dependency_answers
+    )
+
+
+def evaluate_compiled(expression, dependency_answers):
+    """As the UDTF evaluates it, which may use a fast path"""
+    return _evaluate_expression_for_response.evaluate_expression_core_for_response(
+        1, expression, ENTITY_NAMES, ENTITY_INSTANCE_ARRAYS, DEPENDENCY_SHAPES, dependency_answers
+    )
+
+
+def evaluate_both_ways(expression, dependency_answers):
+    return evaluate_with_eval(expression, dependency_answers), evaluate_compiled(expression, dependency_answers)
+
+
+def outcome(evaluate):
+    """The answers, or the exception raised, so errors can be compared too"""
+    try:
+        return evaluate()
+    except Exception as e:
+        return type(e), str(e)
+
+
+class TestFastPaths:
+
+    @pytest.mark.parametrize(
+        "expression, fast_path",
+        [
+            ("any(response.Rating(brand=result.brand))", "any"),
+            ("any(response.Rating(brand=[result.brand], product=result.product))", "any"),
+            ("max(response.Rating(product=result.product, brand=result.brand), default=None)", "max"),
+            ("min(response.Rating(brand=result.brand, product=[10, 30]), default=None)", "min"),
+            ("max(response.Rating(brand=result.brand, product=20), default=None)", "max"),
+            (build_metric_variable_expression("Base", None, ["brand"], "Rating", None, ENTITY_NAMES, "avg"), "max_if_exists"),
+            (build_metric_variable_expression("Base", None, ["brand"], "Rating", None, ["brand"], "yn"), "any_if_exists"),
+            # Base is hoisted out, leaving just the primary
+            ("max(response.Rating(brand=result.brand), default=None) if any(1 for r in response.Region(region=2)) else None", "max"),
+        ],
+    )
+    def test_same_answers_as_eval(self, expression, fast_path):
+        assert expression_fast_path(expression) == fast_path
+        for dependency_answers in random_respondents():
+            expected, actual = evaluate_both_ways(expression, dependency_answers)
+            assert actual == expected
+
+    @pytest.mark.parametrize(
+        "expression",
+        [
+            "max(response.Rating(brand=result.brand))",
+            "max(response.Rating(brand=result.brand), default=0)",
+            "sum(response.Rating(brand=result.brand))",
+            "any(v for v in response.Rating(brand=result.brand) if v in (4, 5))",
+            "any(response.Rating(brand=[result.brand, 3]))",
+            "max(response.Rating(brand=result.brand), default=None) if any(0 for r in response.Base(brand=result.brand)) else None",
+            "result.brand if any(response.Rating(brand=result.brand)) else None",
+        ],
+    )
+    def test_generic_fallback(self, expression):
+        for dependency_answers in random_respondents(10):
+            try:
+                expected, actual = evaluate_both_ways(expression, dependency_answers)
+            except ValueError:
+                continue  # e.g. max() of no answers raises either way
+            assert actual == expected
+
+    @pytest.mark.parametrize("true_vals", [None, "4|5", "0|1", "9|0|10", "1>4", "0>6"])
+    @pytest.mark.parametrize("calc_type", ["avg", "yn", "nps"])
+    @pytest.mark.parametrize("base_variable, base_expression", [("Base", None), (None, "any(1 for r in response.Region(region=2))")])
+    def test_metrics_same_answers_as_eval(self, true_vals, calc_type, base_variable, base_expression):
+        expression = build_metric_variable_expression(
+            base_variable, base_expression, ["brand"], "Rating", true_vals, ENTITY_NAMES, calc_type
+        )
+        assert expression_fast_path(expression) is not None
+
+        for values in [(0, 1, 4, 5, 6, 9, 10), (0, 4, None)]:
+            for dependency_answers in random_respondents(values=values):
+                expected = outcome(lambda: evaluate_with_eval(expression, dependency_answers))
+                actual = outcome(lambda: evaluate_compiled(expression, dependency_answers))
+                assert actual == expected
+
+    def test_fast_path_names(self):
+        avg = build_metric_variable_expression("Base", None, ["brand"], "Rating", "4|5", ["brand"], "avg")
+        nps = build_metric_variable_expression(None, "any(1 for r in response.Region(region=2))", [], "Rating", None, ["brand"], "nps")
+
+        assert expression_fast_path(avg) == "max_true_values_if_exists"
+        assert expression_fast_path(nps) == "max_scored"
+
+    def test_single_true_value_is_generic(self):
+        # `v in (7)` is `v in 7`, which eval raises TypeError for, so this is left to eval
+        assert expression_fast_path(build_metric_variable_expression("Base", None, ["brand"], "Rating", "7", ["brand"], "yn")) is None
+
+    def test_no_fast_path(self):
+        assert expression_fast_path("sum(response.Rating(brand=result.brand))") is None
+        assert expression_fast_path("any(response.Rating(") is None
+        assert expression_fast_path("") is None
+
+    def test_missing_dependency_raises_like_eval(self):
+        with pytest.raises(AttributeError):
+            _evaluate_expression_for_response.evaluate_expression_core_for_response(
+                1, "any(response.Missing(brand=result.brand))", ["brand"], [[1]], DEPENDENCY_SHAPES, {}
+            )
+
+
+class TestExpressionPlanCache:
+
+    def test_shared_by_shape(self):
+        cache = ExpressionPlanCache(max_size=10)
+
+        first = cache.fast_evaluator("max(response.Rating(brand=result.brand), default=None)")
+        second = cache.fast_evaluator("max(response.Score(product=result.product), default=None)")
+
+        assert first is not None and second is not None
+        assert cache.stats()["shapes"] == [
+            {"shape": "max(response.v1(v1e1=result.entity1), default=None)", "fast_path": "max", "expression_count": 2}
+        ]
+        assert cache.stats()["hits"] == 1
+
+    def test_reports_generic_shapes(self):
+        cache = ExpressionPlanCache(max_size=10)
+
+        assert cache.fast_evaluator("sum(response.Rating(brand=result.brand))") is None
+        assert cache.fast_evaluator("any(response.Rating(brand=result.brand))") is not None
+        assert cache.fast_evaluator("any(response.Score(brand=result.brand))") is not None
+
+        assert [(shape["fast_path"], shape["expression_count"]) for shape in cache.stats()["shapes"]] == [("any", 2), (None, 1)]
+
+    def test_unparseable(self):
+        cache = ExpressionPlanCache(max_size=10)
+
+        assert cache.fast_evaluator("any(response.Rating(") is None
+        assert cache.plan("any(response.Rating(") is None
+        assert len(cache.stats()["shapes"]) == 0
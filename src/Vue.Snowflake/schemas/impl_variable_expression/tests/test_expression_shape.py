@@ -0,0 +1,77 @@
+"""
+Pytest tests for normalizing variable expressions to their shape.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the functions directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+
+import pytest
+from _expression_shape import extract_expression_shape, parameterize_expression
+
+
+class TestExtractExpressionShape:
+
+    @pytest.mark.parametrize(
+        "expression, shape",
+        [
+            ("response.age(entity=1)", "response.v1(v1e1=1)"),
+            ("response.age(entity=[1, 2, 3])", "response.v1(v1e1=[1, 1, 1])"),
+            ("sum(response.score(entity=result.brand))", "sum(response.v1(v1e1=result.entity1))"),
+            ("response.q1(entity=1) + response.q2(entity=1)", "response.v1(v1e1=1) + response.v2(v2e1=1)"),
+            ("response.q1(brand=1, category=2)", "response.v1(v1e1=1, v1e2=1)"),
+            ("result.brand == 1", "result.entity1 == 1"),
+            (
+                "response.score(entity=result.brand) if result.category == 1 else 0",
+                "response.v1(v1e1=result.entity2) if result.entity1 == 1 else 0",
+            ),
+        ],
+    )
+    def test_shapes(self, expression, shape):
+        assert extract_expression_shape(expression) == shape
+
+    def test_same_shape_for_different_names(self):
+        assert extract_expression_shape("any(response.Rating(brand=result.brand))") == extract_expression_shape(
+            "any(response.Score(product=result.product))"
+        )
+
+    def test_empty(self):
+        assert extract_expression_shape("") == ""
+
+    def test_syntax_error(self):
+        assert extract_expression_shape("any(response.Rating(").startswith("ERROR:")
+
+
+class TestParameterizeExpression:
+
+    def test_parameters(self):
+        shape = parameterize_expression("max(response.Rating(brand=result.brand, product=[10, 20]), default=None)")
+
+        assert shape.shape == "max(response.v1(v1e1=result.entity1, v1e2=[c1, c2]), default=None)"
+        assert shape.variables == {"v1": "Rating"}
+        assert shape.keywords == {"v1e1": "brand", "v1e2": "product"}
+        assert shape.result_entities == {"entity1": "brand"}
+        assert shape.constants == {"c1": 10, "c2": 20}
+
+    def test_constants_outside_response_calls(self):
+        shape = parameterize_expression("any(v for v in response.Rating() if v in (4, 5))")
+
+        assert shape.shape == "any((v for v in response.v1() if v in (c1, c2)))"
+        assert shape.constants == {"c1": 4, "c2": 5}
+
+    def test_none_and_booleans_are_structure(self):
+        assert parameterize_expression("max(response.Rating(), default=None) or True").shape == (
+            "max(response.v1(), default=None) or True"
+        )
+
+    def test_differing_constants_share_shape(self):
+        assert parameterize_expression("response.Rating(brand=1)").shape == parameterize_expression("response.Score(product=7)").shape
+
+    def test_differing_constant_count(self):
+        assert parameterize_expression("response.Rating(brand=[1])").shape != parameterize_expression("response.Rating(brand=[1, 2])").shape
+
+    @pytest.mark.parametrize("expression", ["", "any(response.Rating(", "c1 + response.Rating()"])
+    def test_unparameterizable(self, expression):
+        assert parameterize_expression(expression) is None
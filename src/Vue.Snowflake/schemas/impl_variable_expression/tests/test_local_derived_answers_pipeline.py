@@ -0,0 +1,265 @@
+"""
+Pytest tests for the local derived variable answers pipeline.
+The calculation is tested directly; reading and writing Parquet needs duckdb, so that's skipped without it.
+"""
+
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add this directory to the path so we can import the pipeline script (which adds the functions directory itself)
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pandas
+import pytest
+from local_derived_answers_pipeline import (
+    MANIFEST_NAME,
+    DerivedVariable,
+    calculate_derived_answers,
+    derived_variable_from_row,
+    evaluate_level,
+    is_calculated,
+    run_pipeline,
+    variables_to_exclude,
+)
+
+
+def expression_variable(variable_identifier, python_expression, dependency_entity_types, entity_identifiers=(), entity_instance_arrays=(),
+                        variable_type='expression'):
+    return DerivedVariable(
+        variable_identifier=variable_identifier,
+        variable_type=variable_type,
+        python_expression=python_expression,
+        entity_identifiers=list(entity_identifiers),
+        entity_instance_arrays=list(entity_instance_arrays),
+        dependency_variable_identifiers=list(dependency_entity_types),
+        dependency_entity_types=dependency_entity_types,
+        definition=None,
+    )
+
+
+def grouped_variable(variable_identifier, variable_type, groups):
+    return DerivedVariable(
+        variable_identifier=variable_identifier,
+        variable_type=variable_type,
+        python_expression=None,
+        entity_identifiers=[],
+        entity_instance_arrays=[],
+        dependency_variable_identifiers=[],
+        dependency_entity_types={},
+        definition={"Groups": groups},
+    )
+
+
+WAVES = grouped_variable("Wave", "data_wave", [
+    {"ToEntityInstanceId": 1, "Component": {"MinDate": "2024-01-01T00:00:00Z", "MaxDate": "2024-01-31T23:59:59Z"}},
+    {"ToEntityInstanceId": 2, "Component": {"MinDate": "2024-02-01T00:00:00Z", "MaxDate": "2024-02-29T23:59:59Z"}},
+])
+SURVEYS = grouped_variable("Survey_group", "survey_id", [
+    {"ToEntityInstanceId": 7, "Component": {"SurveyIds": [100]}},
+])
+MAX_RATING = expression_variable(
+    "Max_rating", "max(response.Rating(brand=result.brand), default=None)", {"Rating": ["brand"]}, ["brand"], [[1, 2]]
+)
+# Filtered metrics have a python_expression too, and are evaluated just like expression variables
+FILTERED_MAX_RATING = expression_variable(
+    "Max_rating_filtered_metric", MAX_RATING.python_expression, {"Rating": ["brand"]}, ["brand"], [[1, 2]], variable_type="filtered_metric"
+)
+AVERAGE_RATING = expression_variable("Average_rating", "sum(response.Rating()) / 2", {"Rating": ["brand"]})
+# Depends on another derived variable being calculated
+HIGH_MAX_RATING = expression_variable(
+    "High_max_rating", "max((r for r in response.Max_rating(brand=result.brand) if r >= 4), default=None)", {"Max_rating": ["brand"]}, ["brand"], [[1, 2]]
+)
+
+RESPONSE_IDS = [1, 2, 3]
+SURVEY_IDS = [100, 200, 100]
+SURVEY_COMPLETED = [datetime(2024, 1, 15), datetime(2024, 2, 10), None]
+
+
+def dependency_answers():
+    return [
+        {"Rating": [[1, None, None, 3], [2, None, None, 5]], "Max_rating": []},
+        {"Rating": [[2, None, None, 2]], "Max_rating": []},
+        {"Rating": [], "Max_rating": []},
+    ]
+
+
+def rows_by_variable(rows):
+    by_variable = {}
+    for response_id, variable_identifier, *answer in rows:
+        by_variable.setdefault(variable_identifier, []).append((response_id, *answer))
+    return by_variable
+
+
+class TestDerivedVariableFromRow:
+
+    def test_parses_json_variant_columns(self):
+        variable = derived_variable_from_row({
+            "variable_identifier": "Max_rating",
+            "variable_type": "expression",
+            "python_expression": MAX_RATING.python_expression,
+            "definition": None,
+            "entity_identifiers": json.dumps(["brand"]),
+            "entity_instance_arrays": json.dumps([[1, 2]]),
+            "dependency_variable_identifiers": json.dumps(["Rating"]),
+            "dependency_entity_types": json.dumps({"Rating": ["brand"]}),
+        })
+
+        assert variable == MAX_RATING
+
+
+class TestIsCalculated:
+
+    def test_every_variable_with_a_python_expression(self):
+        assert [is_calculated(variable) for variable in (MAX_RATING, FILTERED_MAX_RATING, WAVES, SURVEYS)] == [True] * 4
+
+    def test_not_without_a_python_expression(self):
+        assert not is_calculated(MAX_RATING._replace(python_expression=None))
+        assert not is_calculated(FILTERED_MAX_RATING._replace(python_expression=None))
+
+
+class TestEvaluateLevel:
+
+    def test_every_variable_type(self):
+        answers_by_variable, error_message_by_variable = evaluate_level(
+            [MAX_RATING, FILTERED_MAX_RATING, WAVES, SURVEYS], {"Rating": ["brand"]}, RESPONSE_IDS, SURVEY_IDS, SURVEY_COMPLETED,
+            dependency_answers()
+        )
+
+        assert error_message_by_variable == {}
+        assert answers_by_variable == {
+            "Max_rating": [(1, [[1, None, None, None, 3], [2, None, None, None, 5]]), (2, [[2, None, None, None, 2]])],
+            "Max_rating_filtered_metric": [(1, [[1, None, None, None, 3], [2, None, None, None, 5]]), (2, [[2, None, None, None, 2]])],
+            "Wave": [(1, [[None, None, None, 1, 1]]), (2, [[None, None, None, 2, 2]])],
+            "Survey_group": [(1, [[None, None, None, 7, 7]]), (3, [[None, None, None, 7, 7]])],
+        }
+
+
+class TestCalculateDerivedAnswers:
+
+    def test_later_levels_use_earlier_answers(self):
+        rows, error_message_by_variable = calculate_derived_answers(
+            [[MAX_RATING, WAVES], [HIGH_MAX_RATING]], RESPONSE_IDS, SURVEY_IDS, SURVEY_COMPLETED, dependency_answers()
+        )
+
+        assert error_message_by_variable == {}
+        assert rows_by_variable(rows)["High_max_rating"] == [(1, 2, None, None, 5)]
+
+    def test_rows_are_cast_like_derived_answers(self):
+        rows, _ = calculate_derived_answers(
+            [[AVERAGE_RATING, WAVES]], RESPONSE_IDS, SURVEY_IDS, SURVEY_COMPLETED, dependency_answers()
+        )
+
+        assert rows_by_variable(rows) == {
+            # 1.0 and 4.0 from true division, as integers
+            "Average_rating": [(1, None, None, None, 4), (2, None, None, None, 1), (3, None, None, None, 0)],
+            "Wave": [(1, None, None, None, 1), (2, None, None, None, 2)],
+        }
+
+    def test_failing_variable_reported_without_stopping_others(self):
+        broken = expression_variable("Broken", "1 // len(response.Rating())", {"Rating": ["brand"]})
+
+        rows, error_message_by_variable = calculate_derived_answers(
+            [[broken, MAX_RATING]], RESPONSE_IDS, SURVEY_IDS, SURVEY_COMPLETED, dependency_answers()
+        )
+
+        assert list(error_message_by_variable) == ["Broken"]
+        assert error_message_by_variable["Broken"].startswith("response_id 3: ZeroDivisionError")
+        assert set(rows_by_variable(rows)) == {"Max_rating"}
+
+
+class TestVariablesToExclude:
+
+    def test_dependents_of_failed_variables_excluded(self):
+        excluded = variables_to_exclude({"Max_rating": "error"}, [MAX_RATING, AVERAGE_RATING, HIGH_MAX_RATING, WAVES])
+
+        assert excluded == {"Max_rating", "High_max_rating"}
+
+    def test_nothing_excluded_without_errors(self):
+        assert variables_to_exclude({}, [MAX_RATING, HIGH_MAX_RATING]) == set()
+
+
+class TestRunPipeline:
+
+    @pytest.fixture
+    def extract_dir(self, tmp_path):
+        duckdb = pytest.importorskip("duckdb")
+        tables = {
+            "variable_answers": pandas.DataFrame({
+                "response_set_id": [81, 81, 81, 81],
+                "response_id": [1, 1, 2, 2],
+                "variable_identifier": ["Rating", "Rating", "Rating", "Max_rating"],
+                "asked_entity_id_1": [2, 1, 2, 2],
+                "asked_entity_id_2": pandas.array([None] * 4, dtype="Int64"),
+                "asked_entity_id_3": pandas.array([None] * 4, dtype="Int64"),
+                # A stale Max_rating answer, which is recalculated rather than used
+                "answer_value": [5, 3, 2, 9],
+            }),
+            "derived_variables_with_shapes": pandas.DataFrame({
+                "response_set_id": [81, 81],
+                "variable_identifier": ["Max_rating", "High_max_rating"],
+                "variable_type": ["expression", "expression"],
+                "python_expression": [MAX_RATING.python_expression, HIGH_MAX_RATING.python_expression],
+                "definition": [None, None],
+                "entity_identifiers": [json.dumps(["brand"])] * 2,
+                "entity_instance_arrays": [json.dumps([[1, 2]])] * 2,
+                "dependency_variable_identifiers": [json.dumps(["Rating"]), json.dumps(["Max_rating"])],
+                "dependency_entity_types": [json.dumps({"Rating": ["brand"]}), json.dumps({"Max_rating": ["brand"]})],
+            }),
+            "responses": pandas.DataFrame({
+                "response_set_id": [81, 81, 81],
+                "response_id": RESPONSE_IDS,
+                "survey_id": SURVEY_IDS,
+                "survey_completed": pandas.to_datetime(["2024-01-15", "2024-02-10", None]).date,
+            }),
+        }
+        with duckdb.connect() as connection:
+            for name, frame in tables.items():
+                (tmp_path / name).mkdir()
+                connection.register(name, frame)
+                connection.execute(f"copy {name} to '{tmp_path / name / 'data.parquet'}' (format parquet)")
+        return tmp_path
+
+    def test_writes_derived_variable_answers(self, extract_dir, tmp_path):
+        duckdb = pytest.importorskip("duckdb")
+        output_dir = tmp_path / "output"
+
+        summary = run_pipeline(extract_dir, output_dir, 81, workers=2, respondents_per_partition=2)
+
+        assert summary["partitions"] == 2
+        assert summary["excluded_variables"] == []
+        with duckdb.connect() as connection:
+            rows = connection.execute(f"""
+                select response_id, variable_identifier, asked_entity_id_1, answer_value
+                from read_parquet('{output_dir / 'part-*.parquet'}')
+                order by all
+            """).fetchall()
+            manifest = connection.execute(f"select * from read_parquet('{output_dir / MANIFEST_NAME}') order by all").fetchall()
+        assert rows == [
+            (1, "High_max_rating", 2, 5), (1, "Max_rating", 1, 3), (1, "Max_rating", 2, 5), (2, "Max_rating", 2, 2),
+        ]
+        assert manifest == [(81, "High_max_rating"), (81, "Max_rating")]
+
+    def test_manifest_leaves_out_excluded_variables(self, extract_dir, tmp_path):
+        duckdb = pytest.importorskip("duckdb")
+        shapes_path = extract_dir / "derived_variables_with_shapes" / "data.parquet"
+        with duckdb.connect() as connection:
+            connection.execute(f"""
+                copy (
+                    select * replace (
+                        if(variable_identifier = 'High_max_rating', '1 // len(response.Max_rating())', python_expression) as python_expression
+                    )
+                    from read_parquet('{shapes_path}')
+                ) to '{tmp_path / 'shapes.parquet'}' (format parquet)
+            """)
+        (tmp_path / "shapes.parquet").replace(shapes_path)
+        output_dir = tmp_path / "output"
+
+        summary = run_pipeline(extract_dir, output_dir, 81, workers=1)
+
+        assert summary["excluded_variables"] == ["High_max_rating"]
+        assert summary["calculated_variables"] == ["Max_rating"]
+        with duckdb.connect() as connection:
+            manifest = connection.execute(f"select * from read_parquet('{output_dir / MANIFEST_NAME}')").fetchall()
+        assert manifest == [(81, "Max_rating")]
@@ -0,0 +1,85 @@
+"""
+Pytest tests for LruCache covering eviction order and counters.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the functions directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+
+import pytest
+from _lru_cache import LruCache
+
+
+class TestLruCache:
+
+    def test_creates_once_per_key(self):
+        cache = LruCache(max_size=2)
+        calls = []
+
+        def create():
+            calls.append(1)
+            return 'value'
+
+        assert cache.get_or_create('a', create) == 'value'
+        assert cache.get_or_create('a', create) == 'value'
+        assert len(calls) == 1
+        assert cache.stats() == {"size": 1, "max_size": 2, "hits": 1, "misses": 1, "evictions": 0}
+
+    def test_evicts_least_recently_used(self):
+        cache = LruCache(max_size=2)
+        cache.get_or_create('a', lambda: 1)
+        cache.get_or_create('b', lambda: 2)
+        cache.get_or_create('a', lambda: 1)  # 'b' is now least recently used
+        cache.get_or_create('c', lambda: 3)
+
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+        assert cache.evictions == 1
+
+    def test_resize_evicts_down_to_new_limit(self):
+        cache = LruCache(max_size=3)
+        for key in 'abc':
+            cache.get_or_create(key, lambda: key)
+
+        cache.resize(1)
+
+        assert len(cache) == 1
+        assert 'c' in cache
+        assert cache.evictions == 2
+
+    def test_values_least_recently_used_first(self):
+        cache = LruCache(max_size=3)
+        for key in 'abc':
+            cache.get_or_create(key, lambda: key.upper())
+        cache.get_or_create('a', lambda: 'A')
+
+        assert cache.values() == ['B', 'C', 'A']
+
+    def test_failed_create_is_not_cached(self):
+        cache = LruCache(max_size=2)
+
+        def create():
+            raise SyntaxError("bad expression")
+
+        with pytest.raises(SyntaxError):
+            cache.get_or_create('a', create)
+
+        assert 'a' not in cache
+        assert cache.misses == 1
+
+    def test_clear_resets_counters(self):
+        cache = LruCache(max_size=1)
+        cache.get_or_create('a', lambda: 1)
+        cache.get_or_create('b', lambda: 2)
+
+        cache.clear()
+
+        assert cache.stats() == {"size": 0, "max_size": 1, "hits": 0, "misses": 0, "evictions": 0}
+
+    @pytest.mark.parametrize("max_size", [0, -1])
+    def test_invalid_size(self, max_size):
+        with pytest.raises(ValueError, match="max_size must be at least 1"):
+            LruCache(max_size=max_size)
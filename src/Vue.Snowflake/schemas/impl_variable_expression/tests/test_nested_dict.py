@@ -1,5 +1,5 @@
 """
-Pytest tests for NestedDict class covering boundary cases and typical usage.
+Pytest tests for NestedDict and SortedIndex classes covering boundary cases and typical usage.
 """
 
 import sys
@@ -9,7 +9,10 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
 
 import pytest
-from _nested_dict import NestedDict
+from array import array
+from itertools import product
+
+from _nested_dict import NestedDict, SortedIndex
 
 
 class TestNestedDictBasicUsage:
@@ -299,3 +302,57 @@ class TestNestedDictRealWorldScenarios:
         
         # Get all Q2 responses
         assert nd[[1, 2], ['Q2'], ['A', 'B']] == [4, 5]
+
+
+class TestSortedIndex:
+    """SortedIndex must return exactly what NestedDict would for the same sorted items."""
+
+    ITEMS = sorted([
+        [brand, product, (brand * 7 + product) % 5]
+        for brand, product in product([1, 2, 3, 5, 8], [10, 20, 30])
+        if (brand + product) % 3
+    ] + [[2, 20, 9], [2, 20, 1]])
+
+    def sorted_index(self, depth):
+        return SortedIndex(
+            [array('i', [item[i] for item in self.ITEMS]) for i in range(depth)],
+            array('i', [item[-1] for item in self.ITEMS]),
+        )
+
+    @pytest.mark.parametrize("key_values", [
+        [[1]],
+        [[2, 1]],
+        [[4, 9]],
+        [[8, 2, 2, 5]],
+        [[None, 'x', 3]],
+    ])
+    def test_one_dimension_matches_nested_dict(self, key_values):
+        assert self.sorted_index(1)[key_values] == NestedDict(self.ITEMS, key_indices=[0])[key_values]
+
+    @pytest.mark.parametrize("key_values", [
+        [[2], [20]],
+        [[3, 1], [30, 10, 20]],
+        [[1, 2, 3, 5, 8], [20]],
+        [[4], [10]],
+        [[2], [15, 25]],
+    ])
+    def test_two_dimensions_matches_nested_dict(self, key_values):
+        assert self.sorted_index(2)[key_values] == NestedDict(self.ITEMS, key_indices=[0, 1])[key_values]
+
+    def test_no_keys_returns_all_values(self):
+        assert self.sorted_index(0)[[]] == [item[-1] for item in self.ITEMS]
+
+    def test_wrong_dimension_count(self):
+        with pytest.raises(ValueError, match="Expected 2 key dimensions, got 1"):
+            self.sorted_index(2)[[[1]]]
+
+    def test_get_method(self):
+        index = self.sorted_index(2)
+        assert index.get([[2], [20]]) == NestedDict(self.ITEMS, key_indices=[0, 1]).get([[2], [20]])
+        assert index.get([[4], [10]], default='missing') == 'missing'
+        assert index.get([[1]], default='wrong') == 'wrong'
+
+    def test_len(self):
+        assert len(self.sorted_index(1)) == len(NestedDict(self.ITEMS, key_indices=[0]))
+        assert len(SortedIndex([[]], [])) == 0
+
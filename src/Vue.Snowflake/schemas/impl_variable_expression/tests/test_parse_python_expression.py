@@ -0,0 +1,98 @@
+"""
+Pytest tests for parsing variable expressions and hoisting their result-independent parts.
+"""
+
+import ast
+import sys
+from pathlib import Path
+
+# Add the functions directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+
+import pytest
+from _parse_python_expression import hoist_result_invariants, parse_expression, required_answer_bindings
+
+
+class TestParseExpression:
+
+    def test_collects_dependencies(self):
+        parsed = parse_expression("max(response.Rating(brand=result.brand, product=result.product), default=None)")
+        assert parsed == {
+            "result_entity_identifiers": ["brand", "product"],
+            "dependency_variable_identifiers": ["Rating"],
+        }
+
+    def test_empty_expression(self):
+        assert parse_expression("  ")["error"] == "Empty expression"
+
+
+class TestHoistResultInvariants:
+
+    def test_metric_base_becomes_guard(self):
+        hoisted = hoist_result_invariants(
+            "max(response.Rating(brand=result.brand), default=None) if any(1 for r in response.Base()) else None"
+        )
+        assert hoisted.expression == "max(response.Rating(brand=result.brand), default=None)"
+        assert hoisted.invariant_expressions == ["any((1 for r in response.Base()))"]
+        assert hoisted.guard_index == 0
+        assert hoisted.depends_on_result
+
+    def test_base_depending_on_result_is_not_hoisted(self):
+        expression = "max(response.Rating(brand=result.brand), default=None) if any(1 for r in response.Base(brand=result.brand)) else None"
+        hoisted = hoist_result_invariants(expression)
+        assert hoisted.invariant_expressions == []
+        assert hoisted.guard_index is None
+        assert ast.dump(ast.parse(hoisted.expression, mode='eval')) == ast.dump(ast.parse(expression, mode='eval'))
+
+    def test_hoists_within_condition(self):
+        hoisted = hoist_result_invariants("result.seg if result.seg == 1 and any(a >= 0 for a in response.Seg(s=[1])) else None")
+        assert hoisted.expression == "result.seg if result.seg == 1 and _invariant(0) else None"
+        assert hoisted.invariant_expressions == ["any((a >= 0 for a in response.Seg(s=[1])))"]
+        assert hoisted.guard_index is None
+
+    def test_comprehension_variables_are_not_invariant(self):
+        hoisted = hoist_result_invariants("sum(v for v in response.Score() if v == result.brand)")
+        # Only the iterable is the same every time, the condition depends on v
+        assert hoisted.expression == "sum((v for v in _invariant(0) if v == result.brand))"
+        assert hoisted.invariant_expressions == ["response.Score()"]
+
+    def test_single_use_iterators_are_not_hoisted(self):
+        hoisted = hoist_result_invariants("sum(v for v in map(abs, response.Score()) if v > result.brand)")
+        assert "map(abs, _invariant(0))" in hoisted.expression
+        assert hoisted.invariant_expressions == ["response.Score()"]
+
+    def test_result_independent_expression(self):
+        hoisted = hoist_result_invariants("max(response.Age(), default=None)")
+        assert hoisted.expression == "_invariant(0)"
+        assert not hoisted.depends_on_result
+
+    def test_invariant_name_avoids_clashes(self):
+        hoisted = hoist_result_invariants("max(_invariant for _invariant in response.Age()) if result.brand else None")
+        assert hoisted.invariant_name == "_invariant_"
+
+    @pytest.mark.parametrize("expression", ["response.X(", "(y := response.X()) and result.brand"])
+    def test_unanalysable_expressions(self, expression):
+        assert hoist_result_invariants(expression) is None
+
+
+class TestRequiredAnswerBindings:
+
+    @pytest.mark.parametrize(
+        "expression, expected",
+        [
+            ("max(response.Rating(brand=result.brand), default=None)", [("Rating", [("brand", "brand")])]),
+            ("min(response.Rating(brand=[result.brand], product=3), default=None)", [("Rating", [("brand", "brand")])]),
+            (
+                "max((v for v in response.Rating(brand=result.b, product=result.p) if v in (1, 2)), default=None) if True else None",
+                [("Rating", [("brand", "b"), ("product", "p")])],
+            ),
+            # any/max without default aren't None when nothing is answered
+            ("any(response.Rating(brand=result.brand))", []),
+            ("max(response.Rating(brand=result.brand))", []),
+            ("max(response.Rating(brand=result.brand), default=0)", []),
+            ("max(response.Rating(brand=result.brand), default=None) or 0", []),
+            ("max(response.Rating(product=3), default=None)", []),
+        ],
+    )
+    def test_bindings(self, expression, expected):
+        assert required_answer_bindings(ast.parse(expression, mode='eval').body) == expected
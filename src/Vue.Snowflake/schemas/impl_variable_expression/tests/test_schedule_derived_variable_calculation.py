@@ -0,0 +1,252 @@
+"""
+Pytest tests for scheduling derived variable calculation by dependency level.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# Add the functions directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+
+import pytest
+from _schedule_derived_variable_calculation import (
+    batch_python_variables,
+    calculate_derived_variables_by_level,
+    dependency_levels,
+    run_levels,
+)
+
+
+class TestDependencyLevels:
+
+    def test_independent_variables_share_a_level(self):
+        assert dependency_levels(["b", "a", "c"], [("a", "Age"), ("b", "Gender")]) == [["a", "b", "c"]]
+
+    def test_diamond(self):
+        mappings = [("b", "a"), ("c", "a"), ("d", "b"), ("d", "c")]
+        assert dependency_levels(["a", "b", "c", "d"], mappings) == [["a"], ["b", "c"], ["d"]]
+
+    def test_level_is_after_longest_dependency_chain(self):
+        mappings = [("b", "a"), ("c", "b"), ("c", "a")]
+        assert dependency_levels(["a", "b", "c"], mappings) == [["a"], ["b"], ["c"]]
+
+    def test_dependencies_outside_the_set_are_ignored(self):
+        # e.g. already calculated derived variables when only calculating uncalculated ones
+        assert dependency_levels(["b"], [("b", "a")]) == [["b"]]
+
+    def test_empty(self):
+        assert dependency_levels([], []) == []
+
+    def test_cycle(self):
+        with pytest.raises(ValueError, match="a, b, c"):
+            dependency_levels(["a", "b", "c", "d"], [("a", "b"), ("b", "a"), ("c", "a")])
+
+
+class FakeJob:
+    def __init__(self, scheduler, variable_identifiers, polls_until_done):
+        self.scheduler = scheduler
+        self.variable_identifiers = variable_identifiers
+        self.polls_until_done = polls_until_done
+
+    def is_done(self):
+        self.polls_until_done -= 1
+        return self.polls_until_done < 0
+
+    def result(self):
+        self.scheduler.running.difference_update(self.variable_identifiers)
+        return {variable_identifier: f"Processed {variable_identifier}" for variable_identifier in self.variable_identifiers}
+
+
+class FakeScheduler:
+    def __init__(self, polls_until_done=2):
+        self.polls_until_done = polls_until_done
+        self.running = set()
+        self.max_running = 0
+        self.submitted = []
+
+    def submit(self, variable_identifiers):
+        self.running.update(variable_identifiers)
+        self.max_running = max(self.max_running, len(self.running))
+        self.submitted.extend(variable_identifiers)
+        return FakeJob(self, variable_identifiers, self.polls_until_done)
+
+
+class FailedJob:
+    def __init__(self, variable_identifiers):
+        self.variable_identifiers = variable_identifiers
+
+    def is_done(self):
+        return True
+
+    def result(self):
+        return {variable_identifier: "Error: failed" for variable_identifier in self.variable_identifiers}
+
+
+class TestRunLevels:
+
+    def test_concurrency_budget(self):
+        scheduler = FakeScheduler()
+        timings = run_levels([[f"v{i}" for i in range(10)]], scheduler.submit, max_concurrency=3, sleep=lambda _: None)
+
+        assert scheduler.max_running == 3
+        assert timings[0]["variable_count"] == 10
+        assert timings[0]["results"] == {f"v{i}": f"Processed v{i}" for i in range(10)}
+
+    def test_level_finishes_before_next_starts(self):
+        scheduler = FakeScheduler()
+        submitted_when_level_1_started = []
+        original_submit = scheduler.submit
+
+        def submit(variable_identifiers):
+            if "c" in variable_identifiers:
+                submitted_when_level_1_started.append(set(scheduler.running))
+            return original_submit(variable_identifiers)
+
+        run_levels([["a", "b"], ["c"]], submit, max_concurrency=8, sleep=lambda _: None)
+
+        assert scheduler.submitted == ["a", "b", "c"]
+        assert submitted_when_level_1_started == [set()]
+
+    def test_per_level_timing(self):
+        times = iter([0.0, 2.5, 10.0, 11.0])
+        timings = run_levels(
+            [["a"], ["b"]], FakeScheduler(polls_until_done=0).submit, clock=lambda: next(times), sleep=lambda _: None
+        )
+
+        assert [(timing["level"], timing["seconds"]) for timing in timings] == [(0, 2.5), (1, 1.0)]
+
+    def test_dependents_of_failures_skipped(self):
+        scheduler = FakeScheduler(polls_until_done=0)
+        submit = lambda variable_identifiers: (
+            FailedJob(variable_identifiers) if "a" in variable_identifiers else scheduler.submit(variable_identifiers)
+        )
+        dependencies = {"c": ["a"], "d": ["c"], "e": ["b"]}
+
+        timings = run_levels([["a", "b"], ["c", "e"], ["d"]], submit, sleep=lambda _: None, dependencies=dependencies)
+
+        assert scheduler.submitted == ["b", "e"]
+        assert [timing["skipped"] for timing in timings] == [{}, {"c": ["a"]}, {"d": ["c"]}]
+        assert timings[0]["results"]["a"] == "Error: failed"
+
+    def test_batches_share_a_job(self):
+        scheduler = FakeScheduler()
+        batches = []
+
+        def submit(variable_identifiers):
+            batches.append(variable_identifiers)
+            return scheduler.submit(variable_identifiers)
+
+        timings = run_levels(
+            [["a", "b", "c"]], submit, max_concurrency=1, sleep=lambda _: None,
+            batch=lambda level: [level[:2], level[2:]],
+        )
+
+        assert batches == [["a", "b"], ["c"]]
+        assert timings[0]["results"] == {"a": "Processed a", "b": "Processed b", "c": "Processed c"}
+
+    def test_invalid_concurrency(self):
+        with pytest.raises(ValueError):
+            run_levels([["a"]], FakeScheduler().submit, max_concurrency=0)
+
+
+class FakeAsyncJob:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def is_done(self):
+        return True
+
+    def result(self):
+        if isinstance(self.rows, Exception):
+            raise self.rows
+        return self.rows
+
+
+class FakeDataFrame:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def collect(self):
+        return self.rows
+
+    def collect_nowait(self):
+        return FakeAsyncJob(self.rows)
+
+
+class FakeSession:
+    def __init__(self, variables, mappings, failing, evaluated_in_python=()):
+        self.variables = variables
+        self.mappings = mappings
+        self.failing = failing
+        self.evaluated_in_python = set(evaluated_in_python)
+        self.calls = []
+        self.queries = []
+
+    def sql(self, query, params=None):
+        self.queries.append(query)
+        if "from impl_variable_expression.derived_variables" in query:
+            return FakeDataFrame([(v, v in self.evaluated_in_python) for v in self.variables])
+        if "_derived_variable_dependency_mappings" in query:
+            return FakeDataFrame(self.mappings)
+        if "_update_derived_variable_answers_for_variables" in query:
+            variable_identifiers = json.loads(params[1])
+            self.calls.append(variable_identifiers)
+            return FakeDataFrame([(json.dumps({
+                "rows_written": {v: 1 for v in variable_identifiers if v not in self.failing},
+                "errors": {v: "Division by zero" for v in variable_identifiers if v in self.failing},
+            }),)])
+        variable_identifier = params[1]
+        self.calls.append(variable_identifier)
+        if variable_identifier in self.failing:
+            return FakeDataFrame(RuntimeError("Warehouse suspended"))
+        return FakeDataFrame([("Processed 1 rows",)])
+
+
+class TestCalculateDerivedVariablesByLevel:
+
+    def test_calls_update_procedure_in_level_order(self):
+        session = FakeSession(["c", "b", "a"], [("c", "b"), ("b", "a"), ("a", "Age")], failing={"b"})
+
+        result = calculate_derived_variables_by_level(session, 81, max_concurrency=2)
+
+        # c depends on b, which failed, so isn't calculated
+        assert session.calls == ["a", "b"]
+        assert result["level_count"] == 3
+        assert [level["variable_count"] for level in result["levels"]] == [1, 1, 1]
+        assert result["errors"] == {"b": "Error: Warehouse suspended"}
+        assert result["skipped"] == {"c": ["b"]}
+        assert "results" not in result["levels"][0] and "skipped" not in result["levels"][0]
+
+    def test_only_uncalculated_needs_successful_finished_history(self):
+        session = FakeSession(["a"], [], failing=set())
+
+        calculate_derived_variables_by_level(session, 81)
+
+        variables_query = session.queries[0]
+        assert "calculation_end_time is not null and h.error_message is null" in variables_query
+
+    def test_batches_expressions_evaluated_in_python(self):
+        session = FakeSession(
+            ["a", "b", "c", "d", "e"], [("e", "a")], failing={"b"}, evaluated_in_python={"a", "b", "c", "e"}
+        )
+
+        result = calculate_derived_variables_by_level(session, 81, max_concurrency=1, variables_per_batch=2)
+
+        assert session.calls == [["a", "b"], "c", "d", "e"]
+        assert result["errors"] == {"b": "Error: Division by zero"}
+
+    def test_batching_disabled(self):
+        session = FakeSession(["a", "b"], [], failing=set(), evaluated_in_python={"a", "b"})
+
+        calculate_derived_variables_by_level(session, 81, max_concurrency=1, variables_per_batch=1)
+
+        assert session.calls == ["a", "b"]
+
+
+class TestBatchPythonVariables:
+
+    def test_python_variables_batched_and_others_alone(self):
+        batches = list(batch_python_variables(["a", "b", "c", "d"], {"a", "c", "d"}, 2))
+
+        assert batches == [["a", "c"], ["d"], ["b"]]
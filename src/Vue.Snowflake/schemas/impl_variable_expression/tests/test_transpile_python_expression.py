@@ -0,0 +1,146 @@
+"""
+Pytest tests for transpiling simple variable expressions to SQL.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the functions directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+
+import pytest
+from _build_metric_variable_expression import build_metric_variable_expression
+from _transpile_python_expression import (
+    AnswerTerm,
+    ExpressionTranspiler,
+    UnsupportedExpression,
+    transpile_python_expression,
+)
+
+ENTITY_IDENTIFIERS = ["brand", "product"]
+DEPENDENCY_ENTITY_TYPES = {"Rating": ["brand", "product"], "Base": ["region"], "Chosen_brand": ["brand"]}
+DEPENDENCY_ENTITY_COLUMNS = {
+    "Rating": ["asked_entity_id_1", "asked_entity_id_2"],
+    "Base": ["asked_entity_id_1"],
+    # Single choice: the brand is the answer
+    "Chosen_brand": ["answer_value"],
+}
+
+
+def transpile(expression, entity_identifiers=ENTITY_IDENTIFIERS):
+    return ExpressionTranspiler(entity_identifiers, DEPENDENCY_ENTITY_TYPES, DEPENDENCY_ENTITY_COLUMNS).transpile(expression)
+
+
+class TestSupportedShapes:
+
+    def test_any(self):
+        transpiled = transpile("any(response.Rating(brand=result.brand))")
+
+        assert transpiled.primary == AnswerTerm("Rating", (), (("asked_entity_id_1", 0),), (), "any")
+        assert transpiled.base is None
+
+    def test_max_with_constant_filter(self):
+        transpiled = transpile("max(response.Rating(brand=result.brand, product=[10, 20]), default=None)")
+
+        assert transpiled.primary == AnswerTerm(
+            "Rating", (("asked_entity_id_2", (10, 20)),), (("asked_entity_id_1", 0),), (), "max"
+        )
+
+    def test_true_value_range(self):
+        transpiled = transpile("min((v for v in response.Rating(product=result.product) if 1 <= v <= 5), default=None)")
+
+        assert transpiled.primary == AnswerTerm(
+            "Rating", (), (("asked_entity_id_2", 1),), ("1 <= va.answer_value and va.answer_value <= 5",), "min"
+        )
+
+    def test_true_value_list(self):
+        transpiled = transpile("any(v for v in response.Rating(brand=result.brand) if v in (4, 5))")
+
+        assert transpiled.primary.value_conditions == ("va.answer_value in (4, 5)",)
+        assert transpiled.primary.aggregate == "any"
+
+    def test_base(self):
+        transpiled = transpile(
+            "max(response.Rating(brand=result.brand), default=None) if any(1 for r in response.Chosen_brand(brand=result.brand)) else None"
+        )
+
+        assert transpiled.base == AnswerTerm("Chosen_brand", (), (("answer_value", 0),), (), "exists")
+
+    @pytest.mark.parametrize("calc_type, true_vals", [("avg", None), ("avg", "1>5"), ("yn", "4|5"), ("yn", None)])
+    def test_metric_expressions(self, calc_type, true_vals):
+        expression = build_metric_variable_expression(
+            "Base", None, ["region"], "Rating", true_vals, ["brand", "product"], calc_type
+        )
+
+        assert transpile_python_expression(
+            expression, ["region", "brand", "product"],
+            {**DEPENDENCY_ENTITY_TYPES, "Base": ["region"]}, DEPENDENCY_ENTITY_COLUMNS,
+        ) is not None
+
+
+class TestUnsupportedShapes:
+
+    @pytest.mark.parametrize(
+        "expression",
+        [
+            # Raises for respondents without answers
+            "max(response.Rating(brand=result.brand))",
+            "max(-1 if 0 <= v <= 6 else (1 if v in (9, 10) else 0) for v in response.Rating(brand=result.brand))",
+            # True for a None answer in Python, null in SQL
+            "any(v for v in response.Rating(brand=result.brand) if v != 3)",
+            "sum(response.Rating(brand=result.brand))",
+            "max(response.Rating(brand=result.brand), default=None) if result.product == 10 else None",
+            "max(response.Rating(brand=result.brand), default=None) if any(1 for r in response.Base()) else 0",
+            "any(response.Rating(result.brand))",
+            "any(response.Rating(region=result.brand))",
+            "any(response.Rating(brand=result.region))",
+            "any(response.Unknown(brand=result.brand))",
+            "any(response.Rating(brand='1; drop table x'))",
+            "any(v for v in response.Rating() if v in 5)",
+            "any(response.Rating(",
+        ],
+    )
+    def test_falls_back_to_python(self, expression):
+        with pytest.raises(UnsupportedExpression):
+            transpile(expression)
+        assert transpile_python_expression(
+            expression, ENTITY_IDENTIFIERS, DEPENDENCY_ENTITY_TYPES, DEPENDENCY_ENTITY_COLUMNS
+        ) is None
+
+    def test_too_many_result_entities(self):
+        with pytest.raises(UnsupportedExpression):
+            transpile("any(response.Base())", ["a", "b", "c", "d"])
+
+    def test_unknown_dependency_column(self):
+        assert transpile_python_expression(
+            "any(response.Base())", [], {"Base": ["region"]}, {"Base": ["response_id"]}
+        ) is None
+
+    def test_empty_expression(self):
+        assert transpile_python_expression("", [], {}, {}) is None
+
+
+class TestRenderedSql:
+
+    def test_output_columns_and_binds(self):
+        sql = transpile_python_expression(
+            "any(response.Rating(brand=result.brand)) if any(1 for r in response.Base(region=3)) else None",
+            ENTITY_IDENTIFIERS, DEPENDENCY_ENTITY_TYPES, DEPENDENCY_ENTITY_COLUMNS,
+        )
+
+        assert sql.count("?") == 2
+        assert "iff(coalesce(primary_answers.value, false), 1, 0) as answer_value" in sql
+        assert "where coalesce(base_answers.value, false)" in sql
+        assert "va.asked_entity_id_1 in (3)" in sql
+        assert "primary_answers.bound_0 = c.entity_id_1" in sql
+        for column in ["response_set_id", "variable_identifier", "response_id", "asked_entity_id_1", "asked_entity_id_2", "asked_entity_id_3"]:
+            assert f"{column}," in sql
+
+    def test_max_only_keeps_answered_combinations(self):
+        sql = transpile_python_expression(
+            "max(response.Rating(brand=result.brand), default=None)",
+            ENTITY_IDENTIFIERS, DEPENDENCY_ENTITY_TYPES, DEPENDENCY_ENTITY_COLUMNS,
+        )
+
+        assert sql.endswith("where primary_answers.value is not null")
+        assert "base_answers" not in sql
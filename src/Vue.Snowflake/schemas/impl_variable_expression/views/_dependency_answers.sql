@@ -5,7 +5,7 @@ select
     ddm.response_set_id,
     ddm.variable_identifier,
     r.response_id,
-    object_agg(ddm.dependency_variable_identifier, coalesce(vaa.answer_arrays, array_construct())) as answer_arrays_by_variable_identifier
+    object_agg(ddm.dependency_variable_identifier, coalesce(vaa.packed_answers, array_construct())) as answer_arrays_by_variable_identifier
 from impl_response_set.responses r
 inner join impl_variable_expression._derived_variable_dependency_mappings ddm on r.response_set_id = ddm.response_set_id
 left join impl_variable_expression._variable_answer_arrays vaa
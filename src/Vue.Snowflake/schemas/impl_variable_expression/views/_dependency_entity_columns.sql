@@ -0,0 +1,19 @@
+-- Which impl_response_set.variable_answers column each entity type of each dependency is stored in.
+-- In the same order as _variable_entity_types, which is how the python path lines entities up with answers.
+create or replace view impl_variable_expression._dependency_entity_columns as
+select
+    ddm.response_set_id,
+    ddm.variable_identifier,
+    object_agg(
+        ddm.dependency_variable_identifier,
+        array_construct_compact(
+            iff(v.asked_entity_type_identifier_1 is not null, 'asked_entity_id_1', null),
+            iff(v.asked_entity_type_identifier_2 is not null, 'asked_entity_id_2', null),
+            iff(v.asked_entity_type_identifier_3 is not null, 'asked_entity_id_3', null),
+            iff(v.answer_entity_type_identifier is not null, 'answer_value', null)
+        )
+    ) as dependency_entity_columns
+from impl_variable_expression._derived_variable_dependency_mappings ddm
+inner join impl_response_set.variables v
+    on v.response_set_id = ddm.response_set_id and v.variable_identifier = ddm.dependency_variable_identifier
+group by ddm.response_set_id, ddm.variable_identifier;
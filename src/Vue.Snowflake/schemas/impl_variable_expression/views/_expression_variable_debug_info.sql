@@ -1,11 +1,12 @@
-create or replace view impl_variable_expression._uncached_expression_variable_answer_arrays as
+create or replace view impl_variable_expression._expression_variable_debug_info as
 (
     select
         dv.response_set_id,
         dv.variable_identifier,
         da.response_id,
-        -- Optimised away when not requested. Can paste this into a json file and run debug_evaluate_expression_local.py to debug
+        -- Can paste this into a json file and run debug_evaluate_expression_local.py to debug
         object_construct(
+            'response_id', da.response_id,
             'python_expression', dv.python_expression,
             'entity_identifiers', dv.entity_identifiers,
             'entity_instance_arrays', dv.entity_instance_arrays,
@@ -14,8 +15,6 @@ create or replace view impl_variable_expression._uncached_expression_variable_an
             'variable_type', dv.variable_type,
             'definition', dv.definition
         ) as debug_info,
-        -- PERF: Approach chosen after careful performance comparison in:
-        -- https://app.shortcut.com/mig-global/story/101094/performance-test-different-variable-expression-evaluations
         impl_variable_expression._evaluate_expression_for_response(
             da.response_id,
             dv.python_expression,
@@ -1,11 +1,11 @@
 create or replace view impl_variable_expression._uncached_data_wave_variable_answer_arrays as
 (
-    -- Evaluate data wave variables (requires survey_complete_date)
+    -- Evaluate data wave variables (requires survey_complete_date), vectorized so each batch of respondents is one searchsorted
     select
         dv.response_set_id,
         dv.variable_identifier,
         da.response_id,
-        impl_variable_expression._evaluate_data_wave_variable_for_response(
+        impl_variable_expression._evaluate_data_wave_variable_for_responses(
             da.response_id,
             r.survey_completed,
             dv.definition,
@@ -11,6 +11,42 @@ select
             va.answer_value
         )
     ) within group (order by va.asked_entity_id_1, va.asked_entity_id_2, va.asked_entity_id_3, va.answer_value)
-        as answer_arrays
+        as answer_arrays,
+    -- PERF: The same answers packed into base64 little-endian int32s: a bitmask of the populated columns, then each populated column.
+    -- Far smaller than a VARIANT array per answer, and the evaluator decodes it without deserializing them (see AnswerColumns.from_packed).
+    -- Answers that don't fit in an int32 (or are -2^31, which stands for null) are shipped as answer_arrays instead.
+    iff(
+        max(greatest(
+            abs(coalesce(va.asked_entity_id_1, 0)),
+            abs(coalesce(va.asked_entity_id_2, 0)),
+            abs(coalesce(va.asked_entity_id_3, 0)),
+            abs(coalesce(va.answer_value, 0))
+        )) < 2147483648,
+        base64_encode(to_binary(
+            impl_variable_expression._int32_le_hex(
+                iff(count(va.asked_entity_id_1) > 0, 1, 0)
+                + iff(count(va.asked_entity_id_2) > 0, 2, 0)
+                + iff(count(va.asked_entity_id_3) > 0, 4, 0)
+                + iff(count(va.answer_value) > 0, 8, 0)
+            )
+            || iff(count(va.asked_entity_id_1) > 0, listagg(impl_variable_expression._int32_le_hex(va.asked_entity_id_1))
+                within group (order by va.asked_entity_id_1, va.asked_entity_id_2, va.asked_entity_id_3, va.answer_value), '')
+            || iff(count(va.asked_entity_id_2) > 0, listagg(impl_variable_expression._int32_le_hex(va.asked_entity_id_2))
+                within group (order by va.asked_entity_id_1, va.asked_entity_id_2, va.asked_entity_id_3, va.answer_value), '')
+            || iff(count(va.asked_entity_id_3) > 0, listagg(impl_variable_expression._int32_le_hex(va.asked_entity_id_3))
+                within group (order by va.asked_entity_id_1, va.asked_entity_id_2, va.asked_entity_id_3, va.answer_value), '')
+            || iff(count(va.answer_value) > 0, listagg(impl_variable_expression._int32_le_hex(va.answer_value))
+                within group (order by va.asked_entity_id_1, va.asked_entity_id_2, va.asked_entity_id_3, va.answer_value), ''),
+            'HEX'
+        ))::variant,
+        array_agg(
+            array_construct(
+                va.asked_entity_id_1,
+                va.asked_entity_id_2,
+                va.asked_entity_id_3,
+                va.answer_value
+            )
+        ) within group (order by va.asked_entity_id_1, va.asked_entity_id_2, va.asked_entity_id_3, va.answer_value)::variant
+    ) as packed_answers
 from impl_response_set.variable_answers va
 group by va.response_set_id, va.response_id, va.variable_identifier;
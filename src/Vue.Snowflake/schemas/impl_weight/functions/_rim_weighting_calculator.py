@@ -0,0 +1,543 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy
+import pandas
+
+try:
+    # Only available inside Snowflake's Python runtime
+    from _snowflake import vectorized
+except ImportError:
+    def vectorized(**kwargs):
+        return lambda func: func
+
+POINT_TOLERANCE = 0.00005
+MAX_ITERATIONS = 50
+DEFAULT_WEIGHT = 1.0
+# How much further than plain raking an extrapolation can go. Further is faster for schemes that have a solution,
+# but overshoots for schemes that don't, whose weights run away to 0 or infinity
+MAX_EXTRAPOLATION_STEP = 4.0
+
+
+def kahan_sum(values):
+    """
+    Kahan summation algorithm for improved floating point accuracy.
+    Reduces accumulated rounding errors when summing floating point numbers.
+    """
+    total = 0.0
+    compensation = 0.0
+
+    for value in values:
+        y = value - compensation
+        t = total + y
+        compensation = (t - total) - y
+        total = t
+
+    return total
+
+def get_key_part_for_field_group(quota_cell_key, dimension):
+    """
+    Extract the dimension value from quota cell key.
+    For colon-separated keys (e.g. "1:2:3"), use dimension as 1-based index
+    """
+    dimension_str = str(dimension)
+
+    parts = quota_cell_key.split(':')
+    try:
+        dim_index = int(dimension_str) - 1
+        if 0 <= dim_index < len(parts):
+            return parts[dim_index]
+    except (ValueError, IndexError):
+        parts = quota_cell_key.split('_')
+        try:
+            dim_index = parts.index(dimension_str)
+            if dim_index + 1 < len(parts):
+                return parts[dim_index + 1]
+        except ValueError:
+            pass
+    return "0"
+
+def _category_value(value):
+    """A key part or category as they're compared: as integers where both are, otherwise as strings"""
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return str(value)
+
+class QuotaCellKeyIndex:
+    """
+    Quota cell keys parsed once into a cells x dimensions matrix of integer category codes, so which cells are in each
+    category comes from grouping a column rather than parsing every key again for every category.
+    Keys are either positional ("1:2:3", dimensions numbered from 1) or named ("A_1_B_2"), see get_key_part_for_field_group.
+
+    Examples:
+        >>> index = QuotaCellKeyIndex(["A_1_B_1", "A_2_B_1", "A_1_B_2"], ["A", "B"])
+        >>> index.codes.tolist()
+        [[0, 0], [1, 0], [0, 1]]
+        >>> [cells.tolist() for cells, _ in index.category_cell_groups("B", {"1": 10, "2": 5, "3": 1})]
+        [[0, 1], [2]]
+    """
+    __slots__ = ('dimensions', 'codes', '_code_by_value', '_cells_by_code')
+
+    def __init__(self, quota_cell_keys: List[str], dimensions):
+        self.dimensions = list(dimensions)
+        self.codes = numpy.empty((len(quota_cell_keys), len(self.dimensions)), dtype=numpy.int32)
+        self._code_by_value = []
+        for column, dimension in enumerate(self.dimensions):
+            code_by_value = {}
+            value_by_key_part = {}
+            for row, quota_cell_key in enumerate(quota_cell_keys):
+                key_part = get_key_part_for_field_group(quota_cell_key, dimension)
+                value = value_by_key_part.get(key_part)
+                if value is None:
+                    value = value_by_key_part[key_part] = _category_value(key_part)
+                self.codes[row, column] = code_by_value.setdefault(value, len(code_by_value))
+            self._code_by_value.append(code_by_value)
+        self._cells_by_code = [None] * len(self.dimensions)
+
+    def cells_by_code(self, column: int) -> List[numpy.ndarray]:
+        """Indices of the cells with each code of a dimension, in cell order"""
+        if self._cells_by_code[column] is None:
+            codes = self.codes[:, column]
+            order = numpy.argsort(codes, kind='stable')
+            counts = numpy.bincount(codes, minlength=len(self._code_by_value[column]))
+            self._cells_by_code[column] = numpy.split(order, numpy.cumsum(counts)[:-1])
+        return self._cells_by_code[column]
+
+    def code_count(self, column: int) -> int:
+        """How many distinct categories the cells have in a dimension"""
+        return len(self._code_by_value[column])
+
+    def category_code(self, column: int, category) -> Optional[int]:
+        """The code of a category in a dimension, or None if no cell is in it"""
+        return self._code_by_value[column].get(_category_value(category))
+
+    def category_cell_groups(self, dimension, category_targets) -> List[Tuple[numpy.ndarray, float]]:
+        """(cell indices, target) of each of the dimension's categories that has any cells, in the categories' order"""
+        column = self.dimensions.index(dimension)
+        cells_by_code = self.cells_by_code(column)
+        groups = []
+        for category, target in category_targets.items():
+            code = self.category_code(column, category)
+            if code is not None:
+                groups.append((cells_by_code[code], float(target)))
+        return groups
+
+class RakingPass:
+    """
+    Categories of a dimension with no quota cells in common, so a raking step can adjust them all at once.
+    A sparse cell x category incidence matrix, stored as the category of each member cell since a cell is in at most one.
+    """
+    __slots__ = ('cell_indices', 'category_codes', 'targets')
+
+    def __init__(self, cell_indices: numpy.ndarray, category_codes: numpy.ndarray, targets: numpy.ndarray):
+        """
+        Args:
+            cell_indices: Indices of the quota cells in any of the categories
+            category_codes: Parallel to cell_indices, the position in targets of each cell's category
+            targets: Target sample size of each category
+        """
+        self.cell_indices = cell_indices
+        self.category_codes = category_codes
+        self.targets = targets
+
+    def adjust(self, sample_sizes: numpy.ndarray) -> None:
+        """Scale the sample sizes of each category's cells to its target, skipping categories with no sample"""
+        member_sample_sizes = sample_sizes[self.cell_indices]
+        totals = numpy.bincount(self.category_codes, weights=member_sample_sizes, minlength=len(self.targets))
+        factors = numpy.ones_like(totals)
+        numpy.divide(self.targets, totals, out=factors, where=totals != 0)
+        sample_sizes[self.cell_indices] = member_sample_sizes * factors[self.category_codes]
+
+def build_raking_passes(category_cell_groups: List[Tuple[Sequence[int], float]], cell_count: int) -> List[RakingPass]:
+    """
+    Group the (cell indices, target) of each category, in the order they're raked, into passes that give the same
+    result as adjusting each category in turn. Categories of a dimension never share cells, so there's usually one
+    pass per dimension, but a category sharing cells with an earlier one must come after it.
+    """
+    last_pass_of_cell = numpy.full(cell_count, -1)
+    passes: List[Tuple[List[numpy.ndarray], List[float]]] = []
+    for cell_indices, target in category_cell_groups:
+        cell_indices = numpy.asarray(cell_indices, dtype=numpy.intp)
+        pass_index = int(last_pass_of_cell[cell_indices].max()) + 1
+        last_pass_of_cell[cell_indices] = pass_index
+        if pass_index == len(passes):
+            passes.append(([], []))
+        category_cells, targets = passes[pass_index]
+        category_cells.append(cell_indices)
+        targets.append(target)
+
+    return [
+        RakingPass(
+            numpy.concatenate(category_cells),
+            numpy.repeat(numpy.arange(len(targets)), [len(cells) for cells in category_cells]),
+            numpy.array(targets, dtype=float),
+        )
+        for category_cells, targets in passes
+    ]
+
+def rake(
+    sample_sizes: numpy.ndarray,
+    raking_passes: List[RakingPass],
+    initial_weights: Optional[numpy.ndarray] = None,
+    accelerate: bool = False,
+    max_deviations: Optional[List[float]] = None,
+) -> Tuple[numpy.ndarray, bool, int]:
+    """
+    Iterative proportional fitting: adjust to each dimension's targets in turn until no weight moves by more than POINT_TOLERANCE.
+    Each iteration is a few array operations per dimension, rather than a Python loop over every category's cells.
+
+    Args:
+        sample_sizes: Original sample size of each quota cell
+        raking_passes: From build_raking_passes, for each dimension in turn
+        initial_weights: Weight of each quota cell to start from rather than DEFAULT_WEIGHT, see get_initial_weights
+        accelerate: Extrapolate from successive iterations, see _rake_accelerated
+        max_deviations: If given, the most any weight moved in each iteration is appended to it
+
+    Returns:
+        (weights, converged, iterations_performed)
+    """
+    original_sample_sizes = numpy.asarray(sample_sizes, dtype=float)
+    has_sample = original_sample_sizes != 0
+    weights = numpy.full(len(original_sample_sizes), DEFAULT_WEIGHT)
+    if initial_weights is not None:
+        weights[has_sample] = numpy.asarray(initial_weights, dtype=float)[has_sample]
+    if accelerate:
+        return _rake_accelerated(original_sample_sizes, has_sample, weights, raking_passes, max_deviations)
+    adjusted_sample_sizes = original_sample_sizes * weights
+
+    no_convergence = True
+    iterations_performed = 0
+    while no_convergence and iterations_performed <= MAX_ITERATIONS:
+        for raking_pass in raking_passes:
+            raking_pass.adjust(adjusted_sample_sizes)
+
+        new_weights = numpy.ones_like(weights)
+        numpy.divide(adjusted_sample_sizes, original_sample_sizes, out=new_weights, where=has_sample)
+
+        max_deviation = float(numpy.max(numpy.abs(new_weights - weights), initial=0.0))
+        if max_deviations is not None:
+            max_deviations.append(max_deviation)
+        no_convergence = max_deviation > POINT_TOLERANCE
+        weights = new_weights
+        iterations_performed += 1
+
+    return weights, not no_convergence, iterations_performed
+
+def _raking_iteration(weights, original_sample_sizes, has_sample, raking_passes) -> numpy.ndarray:
+    """The weights after adjusting the sample sizes, as weighted, to each dimension's targets in turn"""
+    adjusted_sample_sizes = original_sample_sizes * weights
+    for raking_pass in raking_passes:
+        raking_pass.adjust(adjusted_sample_sizes)
+
+    new_weights = numpy.ones_like(weights)
+    numpy.divide(adjusted_sample_sizes, original_sample_sizes, out=new_weights, where=has_sample)
+    return new_weights
+
+def extrapolate_weights(weights_0, weights_1, weights_2, has_sample) -> Optional[numpy.ndarray]:
+    """
+    SQUAREM extrapolation (a vector form of Aitken's delta-squared) from weights and the next two iterations' weights,
+    or None where it can't be made. It's of the log weights, which each iteration changes by a constant per category,
+    so the extrapolated weights are still a raking of the sample and rake to the same weights as plain raking does.
+    """
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        log_weights_0, log_weights_1, log_weights_2 = (numpy.log(weights[has_sample]) for weights in (weights_0, weights_1, weights_2))
+        first_difference = log_weights_1 - log_weights_0
+        second_difference = log_weights_2 - 2 * log_weights_1 + log_weights_0
+    if not (numpy.isfinite(first_difference).all() and numpy.isfinite(second_difference).all()):
+        return None
+    second_difference_norm = numpy.linalg.norm(second_difference)
+    if second_difference_norm == 0:
+        return None
+
+    # A step length of -1 gives weights_2, so never step back from it, and at most MAX_EXTRAPOLATION_STEP on
+    step_length = max(min(-numpy.linalg.norm(first_difference) / second_difference_norm, -1.0), -MAX_EXTRAPOLATION_STEP)
+    extrapolated = weights_2.copy()
+    with numpy.errstate(over='ignore', under='ignore'):
+        extrapolated[has_sample] = numpy.exp(
+            log_weights_0 - 2 * step_length * first_difference + step_length ** 2 * second_difference
+        )
+    if not numpy.isfinite(extrapolated).all():
+        return None
+    return extrapolated
+
+def _rake_accelerated(original_sample_sizes, has_sample, weights, raking_passes, max_deviations) -> Tuple[numpy.ndarray, bool, int]:
+    """
+    Raking that every two iterations extrapolates where they're heading (see extrapolate_weights) and rakes from there,
+    which converges in far fewer iterations for schemes where plain raking only creeps towards its targets.
+    An extrapolation is only kept if raking from it moves the weights less than the plain iteration before did.
+    Every raking iteration counts towards MAX_ITERATIONS, including those from extrapolations that weren't kept.
+    """
+    iterations_performed = 0
+
+    def iterate(from_weights):
+        nonlocal iterations_performed
+        new_weights = _raking_iteration(from_weights, original_sample_sizes, has_sample, raking_passes)
+        max_deviation = float(numpy.max(numpy.abs(new_weights - from_weights), initial=0.0))
+        if max_deviations is not None:
+            max_deviations.append(max_deviation)
+        iterations_performed += 1
+        return new_weights, max_deviation
+
+    max_deviation = numpy.inf
+    while max_deviation > POINT_TOLERANCE and iterations_performed <= MAX_ITERATIONS:
+        weights_1, max_deviation = iterate(weights)
+        if not max_deviation > POINT_TOLERANCE or iterations_performed > MAX_ITERATIONS:
+            weights = weights_1
+            break
+        weights_2, max_deviation = iterate(weights_1)
+        weights_0, weights = weights, weights_2
+        if not max_deviation > POINT_TOLERANCE or iterations_performed > MAX_ITERATIONS:
+            break
+
+        extrapolated = extrapolate_weights(weights_0, weights_1, weights_2, has_sample)
+        if extrapolated is None:
+            continue
+        weights_3, extrapolated_deviation = iterate(extrapolated)
+        if extrapolated_deviation < max_deviation:
+            weights, max_deviation = weights_3, extrapolated_deviation
+
+    return weights, not max_deviation > POINT_TOLERANCE, iterations_performed
+
+def get_category_factors(key_index: QuotaCellKeyIndex, rim_dimensions, weights, sample_sizes) -> Optional[Dict[str, Dict[str, float]]]:
+    """
+    A factor per category of each dimension, whose product over a quota cell's categories is its weight, for every cell
+    with sample and a positive weight. Raking only ever scales whole categories, so its weights are always such a
+    product, and get_initial_weights can rebuild them for a different set of cells. None if the weights aren't one.
+    """
+    columns = []
+    for column, dimension in enumerate(key_index.dimensions):
+        for category in rim_dimensions[dimension]:
+            code = key_index.category_code(column, category)
+            if code is not None:
+                columns.append((column, code, str(category)))
+
+    fitted = (sample_sizes != 0) & (weights > 0)
+    codes = key_index.codes[fitted]
+    incidence = numpy.zeros((len(codes), len(columns)))
+    for i, (column, code, _) in enumerate(columns):
+        incidence[:, i] = codes[:, column] == code
+    log_weights = numpy.log(weights[fitted])
+
+    # Only unique up to moving a constant between dimensions, which lstsq settles by taking the smallest factors
+    log_factors = numpy.linalg.lstsq(incidence, log_weights, rcond=None)[0]
+    if len(log_weights) and numpy.max(numpy.abs(incidence @ log_factors - log_weights)) > 1e-9:
+        return None
+
+    category_factors = {str(dimension): {} for dimension in key_index.dimensions}
+    for (column, _, category), log_factor in zip(columns, log_factors):
+        category_factors[str(key_index.dimensions[column])][category] = float(numpy.exp(log_factor))
+    return category_factors
+
+def get_initial_weights(key_index: QuotaCellKeyIndex, initial_factors) -> numpy.ndarray:
+    """
+    Each quota cell's weight to start raking from: the product of initial_factors (from get_category_factors) of its
+    categories, using 1 for any category without a positive factor. Still a product of category factors, whatever cells
+    there are now, so raking from it converges to the same weights as from DEFAULT_WEIGHT.
+    """
+    weights = numpy.full(len(key_index.codes), DEFAULT_WEIGHT)
+    for column, dimension in enumerate(key_index.dimensions):
+        factor_by_code = numpy.ones(key_index.code_count(column))
+        for category, factor in (initial_factors.get(str(dimension)) or {}).items():
+            code = key_index.category_code(column, category)
+            if code is not None and factor is not None and float(factor) > 0:
+                factor_by_code[code] = float(factor)
+        weights *= factor_by_code[key_index.codes[:, column]]
+    return weights
+
+def get_category_factors_of_weights(rim_dimensions, initial_weights) -> Optional[Dict[str, Dict[str, float]]]:
+    """
+    get_category_factors of weights keyed by quota_cell_key, e.g. a previous result's quota_details scale_factors.
+    Cells missing from them just have no say, so the factors still give every cell of a changed set of cells a weight
+    to start from, whereas the weights themselves would leave new cells at DEFAULT_WEIGHT, which raking can't converge
+    from to the same weights. None if there are no positive weights or they aren't a product of category factors.
+    """
+    keys = [key for key, weight in initial_weights.items() if weight is not None and float(weight) > 0]
+    if not keys:
+        return None
+    key_index = QuotaCellKeyIndex(keys, rim_dimensions)
+    weights = numpy.array([float(initial_weights[key]) for key in keys])
+    return get_category_factors(key_index, rim_dimensions, weights, numpy.ones(len(keys)))
+
+def calculate_efficiency(sample_sizes, weights, total_respondents):
+    """Calculate weighting efficiency score based on the C# implementation"""
+    sum_of_weights = kahan_sum((sample_sizes * weights).tolist())
+    sum_of_weights_squared = sum_of_weights ** 2
+    sum_of_squared_weights = kahan_sum((sample_sizes * weights ** 2).tolist())
+
+    if sum_of_squared_weights == 0:
+        return 0.0
+
+    return sum_of_weights_squared / total_respondents / sum_of_squared_weights
+
+def get_quota_details(quota_cells, weights, original_sample_sizes, total_sample_size):
+    """Generate detailed quota information"""
+    details = []
+
+    for i, cell in enumerate(quota_cells):
+        sample_size = float(original_sample_sizes[i])
+        weight = float(weights[i])
+        details.append({
+            "quota_cell_key": cell["quota_cell_key"],
+            "sample_size": sample_size,
+            "scale_factor": weight,
+            "target": (sample_size * weight) / total_sample_size if total_sample_size > 0 else 0.0
+        })
+    return details
+
+def generate_weighting_distribution(quota_cells, weights, sample_sizes):
+    """Generate weight distribution across buckets"""
+    bucket_factor = 0.1
+    number_of_buckets = 50
+    buckets = [0] * number_of_buckets
+
+    for i, weight in enumerate(weights):
+        weight = float(weight)
+        sample_size = float(sample_sizes[i])
+        bucket_index = int(weight / bucket_factor)
+        bucket_index = max(0, min(bucket_index, number_of_buckets - 1))
+        buckets[bucket_index] += int(sample_size)
+
+    return {
+        "bucket_factor": bucket_factor,
+        "number_of_buckets": number_of_buckets,
+        "buckets": buckets
+    }
+
+def calculate_rim_weights(
+    quota_cells,
+    rim_dimensions,
+    include_quota_details,
+    initial_factors=None,
+    accelerate=False,
+    include_trace=False,
+    include_factors=False,
+    initial_weights=None,
+) -> Dict[str, Any]:
+    """
+    Handler for impl_weight.rim_weighting_calculator.
+
+    Args:
+        quota_cells: Array of {"quota_cell_key": ..., "sample_size": ...}
+        rim_dimensions: Object mapping each dimension to an object of category to target sample size
+        include_quota_details: Whether to return quota_details per cell rather than weights_distribution
+        initial_factors: Optional object of dimension to category to factor, a previous result's category_factors, to start
+            raking from their product for each cell rather than DEFAULT_WEIGHT. The previous period's (see
+            impl_weight.save_converged_rim_factors) start close to this period's weights when little sample has changed,
+            so fewer iterations are required to reach the same weights.
+        accelerate: Whether to extrapolate from successive iterations (see _rake_accelerated), which for schemes that
+            converge slowly usually needs far fewer iterations to reach the same weights
+        include_trace: Whether to return max_deviations, the most any weight moved in each iteration. Steadily shrinking
+            means more iterations would converge, whereas stalling or growing means the targets can't all be met.
+        include_factors: Whether to return category_factors (see get_category_factors), e.g. to save with
+            impl_weight.save_converged_rim_factors as a later period's initial_factors
+        initial_weights: Optional object of quota_cell_key to weight to start raking from, e.g. a previous result's
+            quota_details scale factors, used when there are no initial_factors. Converted to category factors
+            (see get_category_factors_of_weights) so cells added since still start consistently, or ignored if they can't be.
+    """
+    if not quota_cells or len(quota_cells) == 0:
+        return {
+            "min_weight": 0.0,
+            "max_weight": 0.0,
+            "efficiency_score": 0.0,
+            "converged": False,
+            "iterations_required": 0,
+            "quota_details": None,
+            "weights_distribution": None,
+            **({"category_factors": None} if include_factors else {}),
+        }
+
+    original_sample_sizes = numpy.array([float(cell["sample_size"]) for cell in quota_cells])
+
+    key_index = QuotaCellKeyIndex([cell["quota_cell_key"] for cell in quota_cells], rim_dimensions or {})
+    raking_passes = []
+    for dimension, category_targets in (rim_dimensions or {}).items():
+        raking_passes.extend(build_raking_passes(key_index.category_cell_groups(dimension, category_targets), len(quota_cells)))
+
+    if not initial_factors and initial_weights:
+        initial_factors = get_category_factors_of_weights(rim_dimensions or {}, initial_weights)
+    starting_weights = get_initial_weights(key_index, initial_factors) if initial_factors else None
+    max_deviations = [] if include_trace else None
+    weights, converged, iterations_performed = rake(original_sample_sizes, raking_passes, starting_weights, bool(accelerate), max_deviations)
+
+    total_sample_size = kahan_sum(original_sample_sizes.tolist())
+    efficiency = calculate_efficiency(original_sample_sizes, weights, total_sample_size)
+
+    result = {
+        "min_weight": float(weights.min()),
+        "max_weight": float(weights.max()),
+        "efficiency_score": float(efficiency),
+        "converged": converged,
+        "iterations_required": iterations_performed,
+    }
+    if include_factors:
+        result["category_factors"] = get_category_factors(key_index, rim_dimensions or {}, weights, original_sample_sizes)
+    if include_trace:
+        result["max_deviations"] = max_deviations
+
+    if include_quota_details:
+        quota_details = get_quota_details(
+            quota_cells,
+            weights,
+            original_sample_sizes,
+            total_sample_size
+        )
+        result["quota_details"] = quota_details
+        result["weights_distribution"] = None
+    else:
+        weights_distribution = generate_weighting_distribution(
+            quota_cells,
+            weights,
+            original_sample_sizes
+        )
+        result["weights_distribution"] = weights_distribution
+        result["quota_details"] = None
+
+    return result
+
+def _calculate_rim_weights_for_problem(problem):
+    """calculate_rim_weights of a tuple of its arguments, for ProcessPoolExecutor.map"""
+    return calculate_rim_weights(*problem)
+
+def calculate_rim_weights_batch(problems: Iterable[Tuple[Any, ...]], workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    calculate_rim_weights of each tuple of its arguments, e.g. (quota_cells, rim_dimensions, include_quota_details), in order.
+    The problems are independent, so given more than one worker they're shared across a process pool.
+    """
+    problems = list(problems)
+    if not workers or workers <= 1 or len(problems) <= 1:
+        return [calculate_rim_weights(*problem) for problem in problems]
+
+    workers = min(workers, len(problems))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_calculate_rim_weights_for_problem, problems, chunksize=max(1, len(problems) // (workers * 4))))
+
+class RimWeightingCalculatorBatch:
+    """
+    Vectorized UDTF handler for impl_weight.rim_weighting_calculator_batch.
+    One input row per weighting problem keyed by (response_set_id, period), returning one row per problem with the
+    result rim_weighting_calculator would, so weighting many periods doesn't need a procedure call for each.
+    Snowflake already runs partitions in parallel, so a partition's problems are solved in turn.
+    """
+
+    @vectorized(input=pandas.DataFrame)
+    def end_partition(self, df):
+        # Columns are positional, matching the SQL function's argument order
+        (response_set_ids, periods, quota_cells, rim_dimensions, include_quota_details,
+         initial_factors, accelerate, include_trace, include_factors, initial_weights) = (df.iloc[:, i] for i in range(10))
+
+        results = calculate_rim_weights_batch(zip(
+            quota_cells,
+            rim_dimensions,
+            (bool(include) for include in include_quota_details),
+            (factors if isinstance(factors, dict) else None for factors in initial_factors),
+            (bool(value) for value in accelerate),
+            (bool(value) for value in include_trace),
+            (bool(value) for value in include_factors),
+            (weights if isinstance(weights, dict) else None for weights in initial_weights),
+        ))
+        return pandas.DataFrame({
+            'response_set_id': response_set_ids.to_numpy(),
+            'period': periods.to_numpy(),
+            'result': results,
+        })
@@ -0,0 +1,35 @@
+-- Vectorized UDTF for rim weighting many problems in one call, e.g. every period of every response set being reweighted
+-- One input row per problem keyed by (response_set_id, period), with the same arguments as impl_weight.rim_weighting_calculator,
+-- and one output row per problem whose result is what that procedure returns. Partition by response_set_id (or finer) to spread the work:
+--   select b.response_set_id, b.period, b.result
+--   from problems p,
+--       table(impl_weight.rim_weighting_calculator_batch(p.response_set_id, p.period, p.quota_cells, p.rim_dimensions, false)
+--           over (partition by p.response_set_id)) b;
+
+-- To stage the Python files (creates a zip bundle with all .py files in the directory):
+-- uv run stage_python.py dev schemas/impl_weight/functions/
+
+create or replace function impl_weight.rim_weighting_calculator_batch(
+    response_set_id integer,
+    period date,
+    quota_cells array,
+    rim_dimensions object,
+    include_quota_details boolean,
+    initial_factors object default null, -- dimension to category to factor to start raking from, see rim_weighting_calculator
+    accelerate boolean default false, -- extrapolate from successive iterations to converge in fewer
+    include_trace boolean default false, -- return max_deviations, the most any weight moved in each iteration
+    include_factors boolean default false, -- return category_factors, to save with impl_weight.save_converged_rim_factors
+    initial_weights object default null -- quota_cell_key to weight to start raking from, see rim_weighting_calculator
+)
+returns table (
+    response_set_id integer,
+    period date,
+    result object
+)
+language python
+immutable
+runtime_version = '3.13'
+packages = ('snowflake-snowpark-python', 'numpy', 'pandas')
+imports = ('@impl_weight.udf_stage/schemas/impl_weight/functions/functions_bundle.zip')
+handler = '_rim_weighting_calculator.RimWeightingCalculatorBatch'
+;
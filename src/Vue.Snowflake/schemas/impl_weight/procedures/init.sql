@@ -4,7 +4,12 @@ language sql
 as
 $$
 begin
-    
+
+    -- Place to put the python
+    create stage if not exists impl_weight.udf_stage
+        directory = ( enable = true )
+        encryption = ( type = 'snowflake_sse' );
+
     alter task impl_weight.incremental_update_cell_definitions resume;
 
     -- Ensure up to date data in the dynamic table before initial population
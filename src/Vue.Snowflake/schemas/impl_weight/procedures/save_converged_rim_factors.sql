@@ -0,0 +1,47 @@
+-- Saves the category_factors of a converged rim_weighting_calculator (or rim_weighting_calculator_batch) result, calculated
+-- with include_factors => true, to impl_weight.converged_rim_factors, replacing any for the same (response_set_id, period),
+-- to warm start later periods.
+create or replace procedure impl_weight.save_converged_rim_factors(
+    response_set_id integer,
+    period date,
+    result object
+)
+returns string
+language sql
+as
+$$
+declare
+    category_factors variant := result:category_factors;
+    iterations_required integer := result:iterations_required::integer;
+    saved_time timestamp_ntz := sysdate();
+begin
+    if (response_set_id is null or period is null) then
+        return 'No action taken: response_set_id and period must be provided';
+    end if;
+
+    if (not coalesce(result:converged::boolean, false) or category_factors is null or is_null_value(category_factors)) then
+        return 'No action taken: result must have converged and have category_factors (calculate it with include_factors => true)';
+    end if;
+
+    begin transaction;
+
+    delete from impl_weight.converged_rim_factors
+    where response_set_id = :response_set_id and period = :period;
+
+    insert into impl_weight.converged_rim_factors (response_set_id, period, dimension, category, factor, iterations_required, saved_at)
+    select
+        :response_set_id,
+        :period,
+        d.key,
+        c.key,
+        c.value::float,
+        :iterations_required,
+        :saved_time
+    from table(flatten(input => :category_factors)) d,
+        table(flatten(input => d.value)) c;
+
+    commit;
+
+    return 'done';
+end;
+$$;
@@ -0,0 +1,20 @@
+-- Converged rim weighting category factors per (response_set_id, period), saved by impl_weight.save_converged_rim_factors
+-- to warm start the next period's rim weighting. A cell's weight is the product of its categories' factors, so they still
+-- give a valid start when the quota cells change. e.g. initial_factors from the latest period before 2024-03-31:
+--   select object_agg(dimension, factors)
+--   from (
+--       select dimension, object_agg(category, factor::variant) as factors
+--       from impl_weight.converged_rim_factors
+--       where response_set_id = 81
+--         and period = (select max(period) from impl_weight.converged_rim_factors where response_set_id = 81 and period < '2024-03-31')
+--       group by dimension
+--   );
+create or alter table impl_weight.converged_rim_factors (
+    response_set_id integer,
+    period date,
+    dimension varchar,
+    category varchar,
+    factor float,
+    iterations_required integer,
+    saved_at timestamp_ntz
+);
@@ -0,0 +1,501 @@
+"""
+Pytest tests for the rim weighting calculator, imported directly rather than called through a Snowflake session
+as tests/weighting does, so they run anywhere.
+"""
+
+import math
+import random
+import sys
+from pathlib import Path
+
+# Add the functions directory to the path so we can import the module
+sys.path.insert(0, str(Path(__file__).parent.parent / "functions"))
+# Share the test cases with the Snowflake tests
+sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent / "tests" / "weighting"))
+
+import numpy
+import pandas
+import pytest
+from _rim_weighting_calculator import (
+    MAX_ITERATIONS,
+    POINT_TOLERANCE,
+    QuotaCellKeyIndex,
+    RimWeightingCalculatorBatch,
+    build_raking_passes,
+    calculate_rim_weights,
+    extrapolate_weights,
+    calculate_rim_weights_batch,
+    get_initial_weights,
+    get_key_part_for_field_group,
+    kahan_sum,
+    rake,
+)
+from rim_weighting_test_data_provider import SIMPLE_HAPPY_PATH, get_test_cases
+
+TEST_CASE_IDS = ["simple", "zero_sample_size", "many_dimensional"]
+
+
+def get_quota_cells_with_target(quota_cells_in_index_order, dimension_to_category_targets):
+    """The category membership QuotaCellKeyIndex replaced, parsing every cell's key for every category"""
+    dimension, category_targets = dimension_to_category_targets
+
+    result = []
+    for category, target in category_targets.items():
+        matching_cells = []
+        for cell_info in quota_cells_in_index_order:
+            cell, internal_index = cell_info
+            key_part = get_key_part_for_field_group(cell["quota_cell_key"], dimension)
+            try:
+                if int(key_part) == int(category):
+                    matching_cells.append((cell, internal_index))
+            except (ValueError, TypeError):
+                if key_part == str(category):
+                    matching_cells.append((cell, internal_index))
+
+        if matching_cells:
+            result.append((matching_cells, float(target)))
+
+    return result
+
+
+def reference_rim_weights(quota_cells, rim_dimensions):
+    """The raking loop the vectorized engine replaced, one category and cell at a time. Returns (weights, converged, iterations)"""
+    quota_cells_in_index_order = [(cell, i) for i, cell in enumerate(quota_cells)]
+    sample_sizes = [float(cell["sample_size"]) for cell in quota_cells]
+    original_sample_sizes = sample_sizes.copy()
+    weights = [1.0] * len(quota_cells)
+    quota_cells_with_targets = []
+    for dimension, category_targets in rim_dimensions.items():
+        quota_cells_with_targets.extend(get_quota_cells_with_target(quota_cells_in_index_order, (dimension, category_targets)))
+
+    no_convergence = True
+    iterations_performed = 0
+    while no_convergence and iterations_performed <= MAX_ITERATIONS:
+        for quota_cells_group, target in quota_cells_with_targets:
+            total_sample_in_category = kahan_sum(sample_sizes[cell[1]] for cell in quota_cells_group)
+            if total_sample_in_category == 0:
+                continue
+            factor = target / total_sample_in_category
+            for _, internal_index in quota_cells_group:
+                sample_sizes[internal_index] *= factor
+        new_weights = [
+            1.0 if original == 0 else adjusted / original
+            for adjusted, original in zip(sample_sizes, original_sample_sizes)
+        ]
+        no_convergence = any(abs(new - old) > POINT_TOLERANCE for new, old in zip(new_weights, weights))
+        weights = new_weights
+        iterations_performed += 1
+    return weights, not no_convergence, iterations_performed
+
+
+def random_problem(seed, dimensions=4, categories=4, zero_fraction=0.3):
+    """An interlocked scheme with every combination of categories as a cell, like SLOW_MANY_DIMENSIONAL_PATH"""
+    rng = random.Random(seed)
+    keys = [[]]
+    for _ in range(dimensions):
+        keys = [key + [category] for key in keys for category in range(1, categories + 1)]
+    quota_cells = [
+        {"quota_cell_key": ":".join(map(str, key)), "sample_size": 0 if rng.random() < zero_fraction else rng.randint(1, 50)}
+        for key in keys
+    ]
+    total = sum(cell["sample_size"] for cell in quota_cells)
+    rim_dimensions = {}
+    for dimension in range(1, dimensions + 1):
+        shares = [rng.random() + 0.2 for _ in range(categories)]
+        rim_dimensions[str(dimension)] = {category: total * share / sum(shares) for category, share in enumerate(shares, 1)}
+    return quota_cells, rim_dimensions
+
+
+def solvable_problem(seed, zero_fraction=0.8):
+    """Like random_problem, but with targets some positive weighting of the sample meets, so raking always has a solution"""
+    rng = random.Random(seed)
+    quota_cells, rim_dimensions = random_problem(seed, categories=3, zero_fraction=zero_fraction)
+    weighted_sample_sizes = [cell["sample_size"] * math.exp(rng.gauss(0, 1)) for cell in quota_cells]
+    for dimension, category_targets in rim_dimensions.items():
+        for category in category_targets:
+            category_targets[category] = sum(
+                weighted for cell, weighted in zip(quota_cells, weighted_sample_sizes)
+                if get_key_part_for_field_group(cell["quota_cell_key"], dimension) == str(category)
+            )
+    return quota_cells, rim_dimensions
+
+
+def next_period(quota_cells, seed):
+    """The same scheme with a little more sample in each cell that had any, like a rolling period a few days on"""
+    rng = random.Random(seed)
+    return [dict(cell, sample_size=cell["sample_size"] + rng.randint(0, 3)) if cell["sample_size"] else cell for cell in quota_cells]
+
+
+def weights_by_key(result):
+    return {detail["quota_cell_key"]: detail["scale_factor"] for detail in result["quota_details"]}
+
+
+class TestCalculateRimWeights:
+
+    @pytest.mark.parametrize("test_case", get_test_cases(), ids=TEST_CASE_IDS)
+    def test_matches_expected_results(self, test_case):
+        result = calculate_rim_weights(test_case["quota_cells"], test_case["rim_dimensions"], True)
+
+        expected = test_case["expected"]
+        for measure in ("min_weight", "max_weight", "efficiency_score"):
+            assert result[measure] == pytest.approx(expected[measure], abs=POINT_TOLERANCE)
+        assert result["converged"] == expected["converged"]
+        assert result["iterations_required"] == expected["iterations_required"]
+
+    @pytest.mark.parametrize("test_case", get_test_cases(), ids=TEST_CASE_IDS)
+    def test_same_weights_as_reference(self, test_case):
+        result = calculate_rim_weights(test_case["quota_cells"], test_case["rim_dimensions"], True)
+        weights, converged, iterations = reference_rim_weights(test_case["quota_cells"], test_case["rim_dimensions"])
+
+        assert list(weights_by_key(result).values()) == pytest.approx(weights, abs=POINT_TOLERANCE)
+        assert (result["converged"], result["iterations_required"]) == (converged, iterations)
+
+    @pytest.mark.parametrize("seed", range(10))
+    def test_random_schemes_same_as_reference(self, seed):
+        quota_cells, rim_dimensions = random_problem(seed)
+
+        result = calculate_rim_weights(quota_cells, rim_dimensions, True)
+        weights, converged, iterations = reference_rim_weights(quota_cells, rim_dimensions)
+
+        assert list(weights_by_key(result).values()) == pytest.approx(weights, abs=POINT_TOLERANCE)
+        assert (result["converged"], result["iterations_required"]) == (converged, iterations)
+
+    def test_no_quota_cells(self):
+        result = calculate_rim_weights([], SIMPLE_HAPPY_PATH["rim_dimensions"], True)
+
+        assert result["converged"] is False and result["iterations_required"] == 0
+
+    def test_weights_distribution_without_quota_details(self):
+        result = calculate_rim_weights(SIMPLE_HAPPY_PATH["quota_cells"], SIMPLE_HAPPY_PATH["rim_dimensions"], False)
+
+        assert result["quota_details"] is None
+        assert sum(result["weights_distribution"]["buckets"]) == sum(cell["sample_size"] for cell in SIMPLE_HAPPY_PATH["quota_cells"])
+        assert all(isinstance(bucket, int) for bucket in result["weights_distribution"]["buckets"])
+
+    def test_result_is_plain_python(self):
+        # Returned to Snowflake as an object, so must not contain numpy types
+        result = calculate_rim_weights(SIMPLE_HAPPY_PATH["quota_cells"], SIMPLE_HAPPY_PATH["rim_dimensions"], True)
+
+        assert type(result["min_weight"]) is float and type(result["converged"]) is bool
+        assert all(type(detail["scale_factor"]) is float for detail in result["quota_details"])
+
+
+class TestInitialFactors:
+
+    def test_converged_factors_converge_immediately(self):
+        quota_cells, rim_dimensions = random_problem(0)
+        converged = calculate_rim_weights(quota_cells, rim_dimensions, True, include_factors=True)
+
+        result = calculate_rim_weights(quota_cells, rim_dimensions, True, converged["category_factors"])
+
+        assert result["converged"] and result["iterations_required"] == 1
+        assert list(weights_by_key(result).values()) == pytest.approx(list(weights_by_key(converged).values()), abs=POINT_TOLERANCE)
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_previous_period_same_weights_in_fewer_iterations(self, seed):
+        quota_cells, rim_dimensions = random_problem(seed)
+        previous = calculate_rim_weights(quota_cells, rim_dimensions, True, include_factors=True)
+        quota_cells = next_period(quota_cells, seed)
+
+        cold = calculate_rim_weights(quota_cells, rim_dimensions, True)
+        warm = calculate_rim_weights(quota_cells, rim_dimensions, True, previous["category_factors"])
+
+        assert warm["converged"]
+        assert warm["iterations_required"] < cold["iterations_required"]
+        assert list(weights_by_key(warm).values()) == pytest.approx(list(weights_by_key(cold).values()), abs=POINT_TOLERANCE)
+
+    def test_new_cells_same_weights_as_cold_start(self):
+        rim_dimensions = {"1": {"1": 50, "2": 50}, "2": {"1": 40, "2": 60}}
+        previous = calculate_rim_weights(
+            [{"quota_cell_key": key, "sample_size": sample_size} for key, sample_size in (("1:1", 20), ("1:2", 30), ("2:1", 25))],
+            rim_dimensions,
+            True,
+            include_factors=True,
+        )
+        # 2:2 had no cell at all, so no weight to start from
+        quota_cells = [
+            {"quota_cell_key": key, "sample_size": sample_size} for key, sample_size in (("1:1", 22), ("1:2", 28), ("2:1", 24), ("2:2", 3))
+        ]
+
+        cold = calculate_rim_weights(quota_cells, rim_dimensions, True)
+        warm = calculate_rim_weights(quota_cells, rim_dimensions, True, previous["category_factors"])
+
+        assert warm["converged"] and warm["iterations_required"] <= cold["iterations_required"]
+        assert list(weights_by_key(warm).values()) == pytest.approx(list(weights_by_key(cold).values()), abs=POINT_TOLERANCE)
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_changed_cells_same_weights_as_cold_start(self, seed):
+        # Cells gaining and losing all their sample between periods
+        quota_cells, rim_dimensions = random_problem(seed)
+        previous = calculate_rim_weights(quota_cells, rim_dimensions, True, include_factors=True)
+        quota_cells = [
+            dict(cell, sample_size=0 if cell["sample_size"] and i % 7 == 0 else cell["sample_size"] or (5 if i % 5 == 0 else 0))
+            for i, cell in enumerate(quota_cells)
+        ]
+
+        cold = calculate_rim_weights(quota_cells, rim_dimensions, True)
+        warm = calculate_rim_weights(quota_cells, rim_dimensions, True, previous["category_factors"])
+
+        assert warm["converged"] == cold["converged"]
+        assert list(weights_by_key(warm).values()) == pytest.approx(list(weights_by_key(cold).values()), abs=2 * POINT_TOLERANCE)
+
+    @pytest.mark.parametrize("test_case", get_test_cases(), ids=TEST_CASE_IDS)
+    def test_factors_multiply_to_weights(self, test_case):
+        result = calculate_rim_weights(test_case["quota_cells"], test_case["rim_dimensions"], True, include_factors=True)
+
+        for cell, detail in zip(test_case["quota_cells"], result["quota_details"]):
+            if cell["sample_size"]:
+                product = math.prod(
+                    result["category_factors"][dimension].get(get_key_part_for_field_group(cell["quota_cell_key"], dimension), 1.0)
+                    for dimension in test_case["rim_dimensions"]
+                )
+                assert product == pytest.approx(detail["scale_factor"], rel=1e-9)
+
+    def test_factors_only_when_asked_for(self):
+        result = calculate_rim_weights(SIMPLE_HAPPY_PATH["quota_cells"], SIMPLE_HAPPY_PATH["rim_dimensions"], True)
+
+        assert "category_factors" not in result
+        assert "category_factors" not in calculate_rim_weights([], SIMPLE_HAPPY_PATH["rim_dimensions"], True)
+
+    def test_initial_weights_by_cell_when_cells_change(self):
+        rim_dimensions = {"1": {"1": 50, "2": 50}, "2": {"1": 40, "2": 60}}
+        previous = calculate_rim_weights(
+            [{"quota_cell_key": key, "sample_size": sample_size} for key, sample_size in (("1:1", 20), ("1:2", 30), ("2:1", 25))],
+            rim_dimensions,
+            True,
+            include_factors=True,
+        )
+        quota_cells = [
+            {"quota_cell_key": key, "sample_size": sample_size} for key, sample_size in (("1:1", 22), ("1:2", 28), ("2:1", 24), ("2:2", 3))
+        ]
+
+        cold = calculate_rim_weights(quota_cells, rim_dimensions, True)
+        by_factors = calculate_rim_weights(quota_cells, rim_dimensions, True, previous["category_factors"])
+        by_weights = calculate_rim_weights(quota_cells, rim_dimensions, True, initial_weights=weights_by_key(previous))
+
+        assert by_weights == by_factors
+        assert list(weights_by_key(by_weights).values()) == pytest.approx(list(weights_by_key(cold).values()), abs=POINT_TOLERANCE)
+
+    def test_initial_weights_not_a_product_start_cold(self):
+        quota_cells, rim_dimensions = SIMPLE_HAPPY_PATH["quota_cells"], SIMPLE_HAPPY_PATH["rim_dimensions"]
+        initial_weights = {cell["quota_cell_key"]: 1.0 + i for i, cell in enumerate(quota_cells)}
+
+        assert calculate_rim_weights(quota_cells, rim_dimensions, True, initial_weights=initial_weights) == (
+            calculate_rim_weights(quota_cells, rim_dimensions, True)
+        )
+
+    def test_missing_and_unusable_factors_are_one(self):
+        key_index = QuotaCellKeyIndex(["1:1", "1:2", "2:1", "2:2"], ["1", "2"])
+
+        weights = get_initial_weights(key_index, {"1": {"1": 2.0, "2": 0, "3": 4.0}, "2": {"2": 3.0, "1": None}})
+
+        assert weights.tolist() == [2.0, 6.0, 1.0, 3.0]
+
+    def test_cells_without_sample_keep_default_weight(self):
+        weights, _, _ = rake(numpy.array([0.0, 2.0]), build_raking_passes([([0, 1], 4.0)], 2), numpy.array([3.0, 1.5]))
+
+        assert weights.tolist() == [1.0, 2.0]
+
+
+class TestAcceleratedRaking:
+
+    @pytest.mark.parametrize("test_case", get_test_cases(), ids=TEST_CASE_IDS)
+    def test_matches_expected_results(self, test_case):
+        result = calculate_rim_weights(test_case["quota_cells"], test_case["rim_dimensions"], True, accelerate=True)
+
+        expected = test_case["expected"]
+        for measure in ("min_weight", "max_weight", "efficiency_score"):
+            assert result[measure] == pytest.approx(expected[measure], abs=POINT_TOLERANCE)
+        assert result["converged"] and result["iterations_required"] <= expected["iterations_required"]
+
+    @pytest.mark.parametrize("seed", range(10))
+    def test_same_weights_in_no_more_iterations(self, seed):
+        quota_cells, rim_dimensions = solvable_problem(seed)
+
+        plain = calculate_rim_weights(quota_cells, rim_dimensions, True)
+        accelerated = calculate_rim_weights(quota_cells, rim_dimensions, True, accelerate=True)
+
+        assert accelerated["converged"] >= plain["converged"]
+        assert accelerated["iterations_required"] <= plain["iterations_required"]
+        if plain["converged"]:
+            assert list(weights_by_key(accelerated).values()) == pytest.approx(list(weights_by_key(plain).values()), abs=20 * POINT_TOLERANCE)
+
+    def test_converges_where_plain_raking_hits_max_iterations(self):
+        quota_cells, rim_dimensions = solvable_problem(7)
+
+        plain = calculate_rim_weights(quota_cells, rim_dimensions, False)
+        accelerated = calculate_rim_weights(quota_cells, rim_dimensions, False, accelerate=True)
+
+        assert not plain["converged"] and plain["iterations_required"] == MAX_ITERATIONS + 1
+        assert accelerated["converged"] and accelerated["iterations_required"] <= MAX_ITERATIONS // 2 + 5
+
+    def test_weights_of_zero_not_extrapolated(self):
+        has_sample = numpy.array([True, True])
+
+        assert extrapolate_weights(numpy.array([1.0, 1.0]), numpy.array([0.5, 0.0]), numpy.array([0.4, 0.0]), has_sample) is None
+
+    def test_extrapolates_geometric_convergence_to_its_limit(self):
+        # Log weights halving their distance to 0 each iteration, which a single extrapolation reaches
+        limit = numpy.array([2.0, 0.5, 1.0])
+        weights = [limit * numpy.exp(numpy.array([1.0, -2.0, 0.0]) * 0.5 ** i) for i in range(3)]
+
+        extrapolated = extrapolate_weights(*weights, numpy.array([True, True, False]))
+
+        assert extrapolated.tolist() == pytest.approx(limit.tolist())
+
+
+class TestTrace:
+
+    def test_max_deviation_of_each_iteration(self):
+        result = calculate_rim_weights(SIMPLE_HAPPY_PATH["quota_cells"], SIMPLE_HAPPY_PATH["rim_dimensions"], False, include_trace=True)
+
+        assert len(result["max_deviations"]) == result["iterations_required"]
+        assert result["max_deviations"][-1] <= POINT_TOLERANCE < min(result["max_deviations"][:-1])
+        assert all(type(deviation) is float for deviation in result["max_deviations"])
+
+    def test_accelerated_iterations_all_traced(self):
+        quota_cells, rim_dimensions = solvable_problem(7)
+
+        result = calculate_rim_weights(quota_cells, rim_dimensions, False, accelerate=True, include_trace=True)
+
+        assert len(result["max_deviations"]) == result["iterations_required"]
+        assert result["max_deviations"][-1] <= POINT_TOLERANCE
+
+    def test_not_traced_by_default(self):
+        result = calculate_rim_weights(SIMPLE_HAPPY_PATH["quota_cells"], SIMPLE_HAPPY_PATH["rim_dimensions"], False)
+
+        assert "max_deviations" not in result
+
+
+class TestCalculateRimWeightsBatch:
+
+    @staticmethod
+    def problems():
+        return [(case["quota_cells"], case["rim_dimensions"], True) for case in get_test_cases()] + [
+            (*random_problem(seed, dimensions=3), seed % 2 == 0) for seed in range(5)
+        ]
+
+    def test_same_as_one_at_a_time(self):
+        problems = self.problems()
+
+        assert calculate_rim_weights_batch(problems) == [calculate_rim_weights(*problem) for problem in problems]
+
+    def test_process_pool_same_as_one_at_a_time(self):
+        problems = self.problems()
+
+        assert calculate_rim_weights_batch(problems, workers=2) == calculate_rim_weights_batch(problems)
+
+    def test_udtf_returns_a_row_per_problem(self):
+        problems = self.problems()[:3]
+        df = pandas.DataFrame({
+            "RESPONSE_SET_ID": [81, 81, 82],
+            "PERIOD": pandas.to_datetime(["2024-01-31", "2024-02-29", "2024-01-31"]).date,
+            "QUOTA_CELLS": [quota_cells for quota_cells, _, _ in problems],
+            "RIM_DIMENSIONS": [rim_dimensions for _, rim_dimensions, _ in problems],
+            "INCLUDE_QUOTA_DETAILS": [True, False, None],
+            "INITIAL_FACTORS": [None, {"1": {"1": 2.0}}, None],
+            "ACCELERATE": [False, False, True],
+            "INCLUDE_TRACE": [False, True, False],
+            "INCLUDE_FACTORS": [True, False, False],
+            "INITIAL_WEIGHTS": [None, None, weights_by_key(calculate_rim_weights(problems[2][0], problems[2][1], True))],
+        })
+
+        result = RimWeightingCalculatorBatch().end_partition(df)
+
+        assert list(result.columns) == ["response_set_id", "period", "result"]
+        assert result["response_set_id"].tolist() == [81, 81, 82]
+        assert result["period"].tolist() == df["PERIOD"].tolist()
+        assert result["result"].tolist() == [
+            calculate_rim_weights(problems[0][0], problems[0][1], True, include_factors=True),
+            calculate_rim_weights(problems[1][0], problems[1][1], False, {"1": {"1": 2.0}}, include_trace=True),
+            calculate_rim_weights(
+                problems[2][0], problems[2][1], False, accelerate=True, initial_weights=df["INITIAL_WEIGHTS"][2]
+            ),
+        ]
+
+
+class TestQuotaCellKeyIndex:
+
+    @staticmethod
+    def assert_same_groups_as_reference(quota_cell_keys, rim_dimensions):
+        quota_cells_in_index_order = [({"quota_cell_key": key}, i) for i, key in enumerate(quota_cell_keys)]
+        index = QuotaCellKeyIndex(quota_cell_keys, rim_dimensions)
+        for dimension, category_targets in rim_dimensions.items():
+            expected = [
+                ([i for _, i in cells], target)
+                for cells, target in get_quota_cells_with_target(quota_cells_in_index_order, (dimension, category_targets))
+            ]
+            actual = [(cells.tolist(), target) for cells, target in index.category_cell_groups(dimension, category_targets)]
+            assert actual == expected
+
+    @pytest.mark.parametrize("test_case", get_test_cases(), ids=TEST_CASE_IDS)
+    def test_same_groups_as_reference(self, test_case):
+        self.assert_same_groups_as_reference([cell["quota_cell_key"] for cell in test_case["quota_cells"]], test_case["rim_dimensions"])
+
+    def test_named_keys(self):
+        keys = ["Age_1_Gender_2", "Age_2_Gender_1", "Age_10_Gender_1", "Gender_2"]
+
+        self.assert_same_groups_as_reference(keys, {"Age": {1: 5.0, "2": 3.0, "10": 1.0, "0": 1.0}, "Gender": {"1": 4.0, 2: 6.0}})
+
+    def test_categories_compared_as_integers_where_possible(self):
+        keys = ["01:a", "1:b", "2:a", "x:01"]
+
+        self.assert_same_groups_as_reference(keys, {"1": {"1": 1.0, "x": 2.0, "01": 3.0, 3: 4.0}, "2": {"a": 1.0, 1: 2.0, "b": 3.0}})
+
+    def test_missing_key_parts_are_category_zero(self):
+        keys = ["1:2", "1", "2:1:3"]
+
+        self.assert_same_groups_as_reference(keys, {"2": {"0": 1.0, "1": 2.0, "2": 3.0}, "3": {0: 1.0, 3: 2.0}, "Other": {"0": 1.0}})
+
+    def test_one_code_per_distinct_category(self):
+        index = QuotaCellKeyIndex(["1:1", "2:1", "01:2", "2:2"], ["1", "2"])
+
+        assert index.codes.tolist() == [[0, 0], [1, 0], [0, 1], [1, 1]]
+
+
+class TestBuildRakingPasses:
+
+    def test_disjoint_categories_in_one_pass(self):
+        passes = build_raking_passes([([0, 2], 10.0), ([1], 5.0)], 3)
+
+        assert len(passes) == 1
+        assert passes[0].cell_indices.tolist() == [0, 2, 1]
+        assert passes[0].category_codes.tolist() == [0, 0, 1]
+
+    def test_overlapping_categories_adjusted_in_order(self):
+        # Cell 1 is in both categories, so the second must see the first's adjustment, as adjusting one at a time does
+        groups = [([0, 1], 10.0), ([1, 2], 30.0), ([3], 4.0)]
+        passes = build_raking_passes(groups, 4)
+
+        sample_sizes = numpy.array([1.0, 1.0, 2.0, 1.0])
+        for raking_pass in passes:
+            raking_pass.adjust(sample_sizes)
+
+        expected = [1.0, 1.0, 2.0, 1.0]
+        for cells, target in groups:
+            factor = target / sum(expected[cell] for cell in cells)
+            for cell in cells:
+                expected[cell] *= factor
+        assert len(passes) == 2
+        assert sample_sizes.tolist() == pytest.approx(expected)
+
+    def test_categories_without_sample_unchanged(self):
+        (raking_pass,) = build_raking_passes([([0], 10.0), ([1], 5.0)], 2)
+        sample_sizes = numpy.array([0.0, 2.0])
+
+        raking_pass.adjust(sample_sizes)
+
+        assert sample_sizes.tolist() == [0.0, 5.0]
+
+
+class TestRake:
+
+    def test_stops_at_max_iterations(self):
+        # A 2x2 scheme without sample in one corner only approaches its targets as the opposite corner's weight tends to 0
+        rows = build_raking_passes([([0, 1], 10.0), ([2], 10.0)], 3)
+        columns = build_raking_passes([([0, 2], 10.0), ([1], 10.0)], 3)
+
+        _, converged, iterations = rake(numpy.array([1.0, 1.0, 1.0]), rows + columns)
+
+        assert not converged
+        assert iterations == MAX_ITERATIONS + 1
@@ -53,10 +53,12 @@ def load_json_file(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+TEST_DATA_DIRECTORY = os.path.join(os.path.dirname(__file__), "test-weighting-data")
+
 def create_slow_many_dimensional_test_data():
-    quota_cells_file = "./tests/weighting/test-weighting-data/cell-sample-sizes.json"
-    rim_dimensions_file = "./tests/weighting/test-weighting-data/rim-weighting-scheme.json"
-    expected_file = "./tests/weighting/test-weighting-data/weighting-results.json"
+    quota_cells_file = os.path.join(TEST_DATA_DIRECTORY, "cell-sample-sizes.json")
+    rim_dimensions_file = os.path.join(TEST_DATA_DIRECTORY, "rim-weighting-scheme.json")
+    expected_file = os.path.join(TEST_DATA_DIRECTORY, "weighting-results.json")
     
     cell_sample_sizes = load_json_file(quota_cells_file)
     rim_dimensions_data = load_json_file(rim_dimensions_file)
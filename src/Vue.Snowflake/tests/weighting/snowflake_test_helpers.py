@@ -1,4 +1,7 @@
 import os
+import tempfile
+import zipfile
+from pathlib import Path
 
 _db_checked = False
 
@@ -33,3 +36,30 @@ def deploy_snowflake_sql_object(session, object_name, sql_relative_path, env_fla
                     print(f"Error deploying {object_name}: {e}")
         else:
             print(f"{object_name} SQL file not found at: {sql_file}")
+
+
+def stage_python_bundle(session, functions_relative_path, env_flag="SNOWFLAKE_DEPLOY_TEST_OBJECTS"):
+    """
+    Stage a schema's functions directory as the zip bundle its Python UDFs and procedures import, if the environment flag is set.
+    Same layout as `uv run stage_python.py <connection> schemas/<schema>/functions/`, but through the test session,
+    e.g. @impl_weight.udf_stage/schemas/impl_weight/functions/functions_bundle.zip
+    Args:
+        session: Snowflake session object
+        functions_relative_path: Path of the functions directory relative to the project root, e.g. "schemas/impl_weight/functions"
+        env_flag: Environment variable name to control deployment
+    """
+    if os.environ.get(env_flag, "False") != "True":
+        return
+    functions_dir = Path(__file__).parent.parent.parent / functions_relative_path
+    schema = Path(functions_relative_path).parts[1]
+    session.sql(f"CREATE SCHEMA IF NOT EXISTS {schema}").collect()
+    session.sql(f"CREATE STAGE IF NOT EXISTS {schema}.udf_stage").collect()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_path = Path(temp_dir) / f"{functions_dir.name}_bundle.zip"
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
+            for py_file in functions_dir.rglob("*.py"):
+                zipf.write(py_file, arcname=py_file.relative_to(functions_dir))
+        stage_dir = f"@{schema}.udf_stage/{Path(functions_relative_path).as_posix()}/"
+        print(f"Staging {zip_path.name} to {stage_dir}")
+        session.file.put(str(zip_path), stage_dir, auto_compress=False, overwrite=True)
@@ -3,7 +3,7 @@ from rim_weighting_test_data_provider import get_test_cases
 import json
 import os
 from conftest import session
-from snowflake_test_helpers import deploy_snowflake_sql_object
+from snowflake_test_helpers import deploy_snowflake_sql_object, stage_python_bundle
 
 TOLERANCE = 0.00005
 
@@ -16,11 +16,18 @@ def load_json_file(path):
 
 @pytest.fixture(scope="session", autouse=True)
 def deploy_rim_weighting_calculator(session):
+    # The procedure and table function import their handler from the staged functions bundle
+    stage_python_bundle(session, "schemas/impl_weight/functions")
     deploy_snowflake_sql_object(
         session,
         object_name="rim_weighting_calculator",
         sql_relative_path="../../schemas/impl_weight/procedures/rim_weighting_calculator.sql"
     )
+    deploy_snowflake_sql_object(
+        session,
+        object_name="rim_weighting_calculator_batch",
+        sql_relative_path="../../schemas/impl_weight/functions/rim_weighting_calculator_batch.sql"
+    )
 
 def run_rim_weighting_test(session, quota_cells, rim_dimensions, expected):
     result = json.loads(session.call("rim_weighting_calculator", quota_cells, rim_dimensions, True))
@@ -38,3 +45,26 @@ def test_rim_weighting_calculator(session, test_case):
     expected = test_case["expected"]
 
     run_rim_weighting_test(session, quota_cells, rim_dimensions, expected)
+
+@pytest.mark.parametrize("test_case", get_test_cases())
+def test_rim_weighting_calculator_batch(session, test_case):
+    rows = session.sql(
+        """
+        select b.response_set_id, b.period, b.result
+        from (select 81 as response_set_id, '2024-01-31'::date as period, parse_json(?) as quota_cells, parse_json(?) as rim_dimensions) p,
+            table(impl_weight.rim_weighting_calculator_batch(
+                p.response_set_id, p.period, p.quota_cells::array, p.rim_dimensions::object, true
+            ) over (partition by p.response_set_id)) b
+        """,
+        params=[json.dumps(test_case["quota_cells"]), json.dumps(test_case["rim_dimensions"])],
+    ).collect()
+
+    assert len(rows) == 1
+    assert rows[0][0] == 81
+    result = json.loads(rows[0][2])
+    expected = test_case["expected"]
+    assert approx_equal(result['min_weight'], expected['min_weight'])
+    assert approx_equal(result['max_weight'], expected['max_weight'])
+    assert approx_equal(result['efficiency_score'], expected['efficiency_score'])
+    assert result['converged'] == expected['converged']
+    assert result['iterations_required'] == expected['iterations_required']